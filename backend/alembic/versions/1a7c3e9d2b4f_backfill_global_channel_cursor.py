@@ -0,0 +1,39 @@
+"""backfill forward collection cursor on global channels
+
+Revision ID: 1a7c3e9d2b4f
+Revises: f9a4b3c5d8e7
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1a7c3e9d2b4f'
+down_revision: Union[str, None] = 'f9a4b3c5d8e7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # last_message_id становится forward cursor (min_id) коллектора:
+    # выставляем его в максимальный уже собранный tg_message_id канала
+    op.execute("""
+        UPDATE global_channels AS gc
+        SET last_message_id = sub.max_tg_message_id
+        FROM (
+            SELECT channel_id, MAX(tg_message_id) AS max_tg_message_id
+            FROM global_messages
+            GROUP BY channel_id
+        ) AS sub
+        WHERE gc.id = sub.channel_id
+          AND (gc.last_message_id IS NULL OR gc.last_message_id < sub.max_tg_message_id)
+    """)
+
+
+def downgrade() -> None:
+    # Данные cursor'а совместимы с предыдущей версией - откатывать нечего
+    pass
@@ -0,0 +1,32 @@
+"""add adaptive polling schedule to global channels
+
+Revision ID: 2b8d4f0a3c5e
+Revises: 1a7c3e9d2b4f
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2b8d4f0a3c5e'
+down_revision: Union[str, None] = '1a7c3e9d2b4f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('global_channels', sa.Column('message_rate', sa.Float(), nullable=True))
+    op.add_column('global_channels', sa.Column('poll_interval_seconds', sa.Integer(), nullable=True))
+    op.add_column('global_channels', sa.Column('next_poll_at', sa.DateTime(), nullable=True))
+    op.create_index('ix_global_channels_next_poll_at', 'global_channels', ['next_poll_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_global_channels_next_poll_at', table_name='global_channels')
+    op.drop_column('global_channels', 'next_poll_at')
+    op.drop_column('global_channels', 'poll_interval_seconds')
+    op.drop_column('global_channels', 'message_rate')
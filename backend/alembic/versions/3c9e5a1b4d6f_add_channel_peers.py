@@ -0,0 +1,38 @@
+"""add channel peer cache
+
+Revision ID: 3c9e5a1b4d6f
+Revises: 2b8d4f0a3c5e
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c9e5a1b4d6f'
+down_revision: Union[str, None] = '2b8d4f0a3c5e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('channel_peers',
+        sa.Column('id', sa.UUID(), nullable=False),
+        sa.Column('channel_id', sa.UUID(), nullable=False),
+        sa.Column('telegram_account_id', sa.UUID(), nullable=False),
+        sa.Column('peer_type', sa.String(length=20), nullable=False),
+        sa.Column('peer_id', sa.BigInteger(), nullable=False),
+        sa.Column('access_hash', sa.BigInteger(), nullable=True),
+        sa.Column('resolved_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['channel_id'], ['global_channels.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['telegram_account_id'], ['telegram_accounts.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('channel_id', 'telegram_account_id', name='uq_channel_peer_channel_account')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('channel_peers')
@@ -0,0 +1,32 @@
+"""add channel failure tracking (circuit breaker) to global channels
+
+Revision ID: 4d0f6b2c5e7a
+Revises: 3c9e5a1b4d6f
+Create Date: 2026-10-17 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4d0f6b2c5e7a'
+down_revision: Union[str, None] = '3c9e5a1b4d6f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('global_channels', sa.Column('consecutive_failures', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('global_channels', sa.Column('last_error', sa.Text(), nullable=True))
+    op.add_column('global_channels', sa.Column('last_failure_at', sa.DateTime(), nullable=True))
+    op.add_column('global_channels', sa.Column('quarantined_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('global_channels', 'quarantined_at')
+    op.drop_column('global_channels', 'last_failure_at')
+    op.drop_column('global_channels', 'last_error')
+    op.drop_column('global_channels', 'consecutive_failures')
@@ -0,0 +1,40 @@
+"""add shared message analysis cache
+
+Revision ID: 5e1a7c3d9f2b
+Revises: 4d0f6b2c5e7a
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e1a7c3d9f2b'
+down_revision: Union[str, None] = '4d0f6b2c5e7a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('message_analysis',
+        sa.Column('id', sa.UUID(), nullable=False),
+        sa.Column('prompt_hash', sa.String(length=64), nullable=False),
+        sa.Column('global_message_id', sa.UUID(), nullable=False),
+        sa.Column('model', sa.String(length=100), nullable=False),
+        sa.Column('is_match', sa.Boolean(), nullable=False),
+        sa.Column('confidence', sa.Float(), nullable=False),
+        sa.Column('reasoning', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['global_message_id'], ['global_messages.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('prompt_hash', 'global_message_id', 'model', name='uq_message_analysis_prompt_message_model')
+    )
+    op.create_index('ix_message_analysis_global_message_id', 'message_analysis', ['global_message_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_message_analysis_global_message_id', table_name='message_analysis')
+    op.drop_table('message_analysis')
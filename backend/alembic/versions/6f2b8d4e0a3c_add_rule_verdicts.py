@@ -0,0 +1,42 @@
+"""add rule verdicts and rule prompt version
+
+Revision ID: 6f2b8d4e0a3c
+Revises: 5e1a7c3d9f2b
+Create Date: 2026-10-17 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6f2b8d4e0a3c'
+down_revision: Union[str, None] = '5e1a7c3d9f2b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('rules', sa.Column('prompt_version', sa.Integer(), server_default='1', nullable=False))
+
+    op.create_table('rule_verdicts',
+        sa.Column('id', sa.UUID(), nullable=False),
+        sa.Column('rule_id', sa.UUID(), nullable=False),
+        sa.Column('global_message_id', sa.UUID(), nullable=False),
+        sa.Column('prompt_version', sa.Integer(), nullable=False),
+        sa.Column('is_match', sa.Boolean(), nullable=False),
+        sa.Column('confidence', sa.Float(), nullable=False),
+        sa.Column('reasoning', sa.Text(), nullable=True),
+        sa.Column('analyzed_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['rule_id'], ['rules.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['global_message_id'], ['global_messages.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('rule_id', 'global_message_id', name='uq_rule_verdict_rule_message')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('rule_verdicts')
+    op.drop_column('rules', 'prompt_version')
@@ -0,0 +1,28 @@
+"""add rule prefilter and prefilter skip counter
+
+Revision ID: 7a3c9e5f1b4d
+Revises: 6f2b8d4e0a3c
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7a3c9e5f1b4d'
+down_revision: Union[str, None] = '6f2b8d4e0a3c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('rules', sa.Column('prefilter', sa.JSON(), nullable=True))
+    op.add_column('rule_analysis_progress', sa.Column('messages_prefiltered', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('rule_analysis_progress', 'messages_prefiltered')
+    op.drop_column('rules', 'prefilter')
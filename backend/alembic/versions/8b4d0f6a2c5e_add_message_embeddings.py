@@ -0,0 +1,36 @@
+"""add message embeddings for semantic prefilter
+
+Revision ID: 8b4d0f6a2c5e
+Revises: 7a3c9e5f1b4d
+Create Date: 2026-10-17 17:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b4d0f6a2c5e'
+down_revision: Union[str, None] = '7a3c9e5f1b4d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('message_embeddings',
+        sa.Column('id', sa.UUID(), nullable=False),
+        sa.Column('global_message_id', sa.UUID(), nullable=False),
+        sa.Column('model', sa.String(length=255), nullable=False),
+        sa.Column('dimensions', sa.Integer(), nullable=False),
+        sa.Column('vector', sa.LargeBinary(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['global_message_id'], ['global_messages.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('global_message_id', 'model', name='uq_message_embedding_message_model')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('message_embeddings')
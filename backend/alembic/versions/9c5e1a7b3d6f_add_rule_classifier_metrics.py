@@ -0,0 +1,30 @@
+"""add distilled rule classifier metrics
+
+Revision ID: 9c5e1a7b3d6f
+Revises: 8b4d0f6a2c5e
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c5e1a7b3d6f'
+down_revision: Union[str, None] = '8b4d0f6a2c5e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('rules', sa.Column('classifier_samples', sa.Integer(), nullable=True))
+    op.add_column('rules', sa.Column('classifier_agreement', sa.Float(), nullable=True))
+    op.add_column('rules', sa.Column('classifier_trained_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('rules', 'classifier_trained_at')
+    op.drop_column('rules', 'classifier_agreement')
+    op.drop_column('rules', 'classifier_samples')
@@ -0,0 +1,26 @@
+"""add extracted entities to message analysis
+
+Revision ID: ad6f2b8c4e7a
+Revises: 9c5e1a7b3d6f
+Create Date: 2026-10-17 19:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'ad6f2b8c4e7a'
+down_revision: Union[str, None] = '9c5e1a7b3d6f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('message_analysis', sa.Column('entities', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('message_analysis', 'entities')
@@ -0,0 +1,44 @@
+"""add composite (sent_at, tg_message_id) cursor to rule analysis progress
+
+Revision ID: be7a3c9d5f8b
+Revises: ad6f2b8c4e7a
+Create Date: 2026-10-17 20:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'be7a3c9d5f8b'
+down_revision: Union[str, None] = 'ad6f2b8c4e7a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('rule_analysis_progress', sa.Column('last_sent_at', sa.DateTime(), nullable=True))
+    op.add_column('rule_analysis_progress', sa.Column('last_tg_message_id', sa.BigInteger(), nullable=True))
+
+    # Cursor существующих записей - из последнего проанализированного сообщения
+    op.execute("""
+        UPDATE rule_analysis_progress AS p
+        SET last_sent_at = m.sent_at, last_tg_message_id = m.tg_message_id
+        FROM global_messages AS m
+        WHERE m.id = p.last_analyzed_message_id
+    """)
+
+    op.create_index(
+        'idx_global_messages_channel_position',
+        'global_messages',
+        ['channel_id', 'sent_at', 'tg_message_id'],
+        unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('idx_global_messages_channel_position', table_name='global_messages')
+    op.drop_column('rule_analysis_progress', 'last_tg_message_id')
+    op.drop_column('rule_analysis_progress', 'last_sent_at')
@@ -0,0 +1,26 @@
+"""add archive reason to leads
+
+Revision ID: d1a5c7e9f2b4
+Revises: cf8b4d0e6a9c
+Create Date: 2026-10-17 22:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd1a5c7e9f2b4'
+down_revision: Union[str, None] = 'cf8b4d0e6a9c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('leads', sa.Column('archive_reason', sa.String(length=50), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('leads', 'archive_reason')
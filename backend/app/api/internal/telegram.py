@@ -2,11 +2,17 @@
 Internal API для отправки Telegram уведомлений.
 Используется worker'ом для делегирования отправки уведомлений backend процессу.
 """
-from fastapi import APIRouter, HTTPException
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Header
 from pydantic import BaseModel
+from sqlalchemy.orm import Session
 from uuid import UUID
 from decimal import Decimal
 
+from app.database import get_db
+from app.models.notification_outbox import NotificationOutbox
 from app.services.telegram_bot_service import telegram_bot_service
 
 router = APIRouter()
@@ -25,13 +31,36 @@ class TelegramNotificationRequest(BaseModel):
 
 
 @router.post("/send-notification")
-async def send_telegram_notification(req: TelegramNotificationRequest):
+async def send_telegram_notification(
+    req: TelegramNotificationRequest,
+    idempotency_key: Optional[str] = Header(default=None),
+    db: Session = Depends(get_db),
+):
     """
     Internal endpoint: Worker → Backend для отправки Telegram уведомления.
 
     Этот endpoint вызывается из worker процесса, который не имеет доступа
     к telegram_bot_service (бот запускается только в backend процессе).
+
+    Idempotency-Key - ключ записи notification_outbox. Запись помечается отправляемой (sent_at)
+    в короткой транзакции до отправки: повтор dispatcher'а после таймаута или рестарта, в том числе
+    на другой реплике, получает duplicate. Строка не блокируется на время вызова Telegram;
+    при ошибке отправки отметка снимается, и dispatcher повторит доставку (если процесс упадет
+    во время отправки, уведомление не повторяется - at-most-once).
     """
+    claimed = False
+    if idempotency_key:
+        claimed = bool(db.query(NotificationOutbox).filter(
+            NotificationOutbox.idempotency_key == idempotency_key,
+            NotificationOutbox.sent_at == None
+        ).update({"sent_at": datetime.utcnow()}, synchronize_session=False))
+        db.commit()
+
+        if not claimed and db.query(NotificationOutbox.id).filter(
+            NotificationOutbox.idempotency_key == idempotency_key
+        ).first() is not None:
+            return {"status": "duplicate", "chat_id": req.chat_id, "lead_id": req.lead_id}
+
     try:
         # Создать минимальный Lead object для совместимости с telegram_bot_service
         class FakeLead:
@@ -52,10 +81,15 @@ async def send_telegram_notification(req: TelegramNotificationRequest):
             message_link=req.message_link
         )
 
-        return {"status": "sent", "chat_id": req.chat_id, "lead_id": req.lead_id}
-
     except Exception as e:
+        if claimed:
+            db.query(NotificationOutbox).filter(
+                NotificationOutbox.idempotency_key == idempotency_key
+            ).update({"sent_at": None}, synchronize_session=False)
+            db.commit()
         raise HTTPException(
             status_code=500,
             detail=f"Failed to send Telegram notification: {str(e)}"
         )
+
+    return {"status": "sent", "chat_id": req.chat_id, "lead_id": req.lead_id}
@@ -289,6 +289,10 @@ async def update_lead(
     for field, value in update_data.items():
         setattr(lead, field, value)
 
+    # Статус, выбранный пользователем, больше не считается системной архивацией
+    if "status" in update_data:
+        lead.archive_reason = None
+
     db.commit()
     db.refresh(lead)
 
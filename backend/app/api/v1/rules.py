@@ -5,7 +5,7 @@ import logging
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from sqlalchemy import func
-from typing import List, Optional
+from typing import Dict, List, Optional
 from uuid import UUID
 
 from app.api.deps import get_db, get_current_active_user, get_current_tenant
@@ -23,11 +23,25 @@ from app.schemas.rule import (
     RuleTestResponse,
 )
 from app.services.llm_service import llm_service
+from app.services.rule_verdict_service import rule_verdict_service
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
+def _count_prefiltered(rule_ids: List[UUID], db: Session) -> Dict[UUID, int]:
+    """Сколько сообщений префильтр каждого правила отсеял без LLM (по всем каналам), одним запросом."""
+    if not rule_ids:
+        return {}
+
+    return dict(db.query(
+        RuleAnalysisProgress.rule_id,
+        func.coalesce(func.sum(RuleAnalysisProgress.messages_prefiltered), 0)
+    ).filter(
+        RuleAnalysisProgress.rule_id.in_(rule_ids)
+    ).group_by(RuleAnalysisProgress.rule_id).all())
+
+
 @router.post("", response_model=RuleResponse, status_code=status.HTTP_201_CREATED)
 async def create_rule(
     rule_data: RuleCreate,
@@ -76,6 +90,7 @@ async def create_rule(
         channel_ids=rule_data.channel_ids,
         is_active=rule_data.is_active,
         schedule=rule_data.schedule or {"always": True},
+        prefilter=rule_data.prefilter.model_dump() if rule_data.prefilter else None,
     )
 
     db.add(rule)
@@ -109,11 +124,13 @@ async def list_rules(
     rules = query.order_by(Rule.created_at.desc()).all()
 
     # Добавляем leads_count для каждого правила
+    prefiltered = _count_prefiltered([rule.id for rule in rules], db)
     results = []
     for rule in rules:
         leads_count = db.query(func.count(Lead.id)).filter(Lead.rule_id == rule.id).scalar()
         rule_response = RuleResponse.model_validate(rule)
         rule_response.leads_count = leads_count
+        rule_response.messages_prefiltered = prefiltered.get(rule.id, 0)
         results.append(rule_response)
 
     return results
@@ -144,6 +161,7 @@ async def get_rule(
     leads_count = db.query(func.count(Lead.id)).filter(Lead.rule_id == rule.id).scalar()
     response = RuleResponse.model_validate(rule)
     response.leads_count = leads_count
+    response.messages_prefiltered = _count_prefiltered([rule.id], db).get(rule.id, 0)
 
     return response
 
@@ -161,8 +179,10 @@ async def update_rule(
 
     Все поля опциональны. Обновляются только переданные поля.
 
-    **ВАЖНО:** При изменении критических полей прогресс анализа сбрасывается:
-    - При изменении `prompt` или `threshold`: прогресс сбрасывается для ВСЕХ каналов
+    **ВАЖНО:** При изменении критических полей:
+    - При изменении `prompt`: прогресс сбрасывается для ВСЕХ каналов (повторный анализ LLM)
+    - При изменении только `threshold`: лиды пересчитываются по сохраненным вердиктам LLM
+      (новые лиды создаются, лиды в статусе new ниже порога архивируются) - без повторного анализа
     - При изменении `channel_ids`:
         * Для существующих каналов (которые были и остались): прогресс сохраняется
         * Для новых каналов: анализируется история (последние 5 дней, макс. 100 сообщений)
@@ -192,20 +212,22 @@ async def update_rule(
             )
 
     # Проверяем, изменились ли критические поля (prompt или threshold)
-    # При изменении prompt/threshold сбрасываем progress для переанализа ВСЕХ каналов
+    # При изменении prompt сбрасываем progress для переанализа ВСЕХ каналов
+    # При изменении threshold пересчитываем лиды по сохраненным вердиктам (confidence от threshold не зависит)
     # При изменении channel_ids progress НЕ сбрасывается:
     #   - Существующие каналы сохраняют progress
     #   - Удаленные каналы worker пропустит
     #   - Новые каналы worker создаст progress и проанализирует историю (5 дней)
     should_reset_progress = False
+    should_reapply_threshold = False
     update_data = rule_update.model_dump(exclude_unset=True)
 
     if "prompt" in update_data and update_data["prompt"] != rule.prompt:
         should_reset_progress = True
         logger.info(f"Rule {rule.id}: prompt changed, resetting progress for all channels")
-    if "threshold" in update_data and update_data["threshold"] != rule.threshold:
-        should_reset_progress = True
-        logger.info(f"Rule {rule.id}: threshold changed, resetting progress for all channels")
+    elif "threshold" in update_data and update_data["threshold"] != rule.threshold:
+        should_reapply_threshold = True
+        logger.info(f"Rule {rule.id}: threshold changed, re-evaluating stored verdicts")
 
     # Логируем изменение channel_ids, но НЕ сбрасываем progress
     if "channel_ids" in update_data and update_data["channel_ids"] != rule.channel_ids:
@@ -215,14 +237,22 @@ async def update_rule(
     for field, value in update_data.items():
         setattr(rule, field, value)
 
-    # Если изменился prompt, threshold или channel_ids - сбрасываем progress
+    # Если изменился prompt - новая версия промпта, сбрасываем progress
     # Worker переанализирует сообщения с новыми параметрами
     if should_reset_progress:
+        rule.prompt_version = (rule.prompt_version or 1) + 1
+        rule.classifier_samples = None
+        rule.classifier_agreement = None
+        rule.classifier_trained_at = None
         deleted_count = db.query(RuleAnalysisProgress).filter(
             RuleAnalysisProgress.rule_id == rule_id
         ).delete()
         logger.info(f"Deleted {deleted_count} progress records for rule {rule_id}")
 
+    # Если изменился только threshold - пересчитываем лиды SQL запросом
+    if should_reapply_threshold:
+        rule_verdict_service.apply_threshold(db, rule)
+
     # Один commit для всех изменений (исправлен race condition)
     db.commit()
     db.refresh(rule)
@@ -231,6 +261,7 @@ async def update_rule(
     leads_count = db.query(func.count(Lead.id)).filter(Lead.rule_id == rule.id).scalar()
     response = RuleResponse.model_validate(rule)
     response.leads_count = leads_count
+    response.messages_prefiltered = _count_prefiltered([rule.id], db).get(rule.id, 0)
 
     return response
 
@@ -296,9 +327,9 @@ async def test_rule(
             rule_description=rule.prompt
         )
 
-        # Извлекаем сущности если сообщение подходит
-        extracted_entities = None
-        if analysis["is_match"]:
+        # Сущности подходящего сообщения приходят в том же ответе LLM
+        extracted_entities = analysis.get("entities")
+        if analysis["is_match"] and not extracted_entities:
             extracted_entities = await llm_service.extract_entities(
                 message_text=test_request.message_text
             )
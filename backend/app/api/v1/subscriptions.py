@@ -66,6 +66,9 @@ async def create_subscription(
         )
         db.add(global_channel)
         db.flush()  # Получить ID
+    else:
+        # Канал мог не собираться (не было подписок/правил) - опросить в ближайший цикл
+        global_channel.next_poll_at = None
 
     # Проверить что подписка не существует
     existing = db.query(ChannelSubscription).filter(
@@ -111,6 +114,12 @@ async def create_subscription(
         "channel_username": subscription.channel.username,
         "channel_title": subscription.channel.title,
         "channel_type": subscription.channel.channel_type,
+        "channel_collection_status": subscription.channel.collection_status,
+        "channel_consecutive_failures": subscription.channel.consecutive_failures,
+        "channel_last_error": subscription.channel.last_error,
+        "channel_last_failure_at": subscription.channel.last_failure_at,
+        "channel_quarantined_at": subscription.channel.quarantined_at,
+        "channel_next_poll_at": subscription.channel.next_poll_at,
     }
 
     return SubscriptionResponse(**response_data)
@@ -146,6 +155,12 @@ async def list_subscriptions(
             "channel_username": sub.channel.username,
             "channel_title": sub.channel.title,
             "channel_type": sub.channel.channel_type,
+            "channel_collection_status": sub.channel.collection_status,
+            "channel_consecutive_failures": sub.channel.consecutive_failures,
+            "channel_last_error": sub.channel.last_error,
+            "channel_last_failure_at": sub.channel.last_failure_at,
+            "channel_quarantined_at": sub.channel.quarantined_at,
+            "channel_next_poll_at": sub.channel.next_poll_at,
         }
         results.append(SubscriptionResponse(**response_data))
 
@@ -188,6 +203,12 @@ async def get_subscription(
         "channel_username": subscription.channel.username,
         "channel_title": subscription.channel.title,
         "channel_type": subscription.channel.channel_type,
+        "channel_collection_status": subscription.channel.collection_status,
+        "channel_consecutive_failures": subscription.channel.consecutive_failures,
+        "channel_last_error": subscription.channel.last_error,
+        "channel_last_failure_at": subscription.channel.last_failure_at,
+        "channel_quarantined_at": subscription.channel.quarantined_at,
+        "channel_next_poll_at": subscription.channel.next_poll_at,
     }
 
     return SubscriptionResponse(**response_data)
@@ -241,6 +262,12 @@ async def update_subscription(
         "channel_username": subscription.channel.username,
         "channel_title": subscription.channel.title,
         "channel_type": subscription.channel.channel_type,
+        "channel_collection_status": subscription.channel.collection_status,
+        "channel_consecutive_failures": subscription.channel.consecutive_failures,
+        "channel_last_error": subscription.channel.last_error,
+        "channel_last_failure_at": subscription.channel.last_failure_at,
+        "channel_quarantined_at": subscription.channel.quarantined_at,
+        "channel_next_poll_at": subscription.channel.next_poll_at,
     }
 
     return SubscriptionResponse(**response_data)
@@ -142,7 +142,7 @@ async def get_telegram_account(
 
     # Get Telegram user info
     try:
-        telegram_user = await telegram_service.get_me(account.session_encrypted)
+        telegram_user = await telegram_service.get_me(account.session_encrypted, account_id=str(account.id))
 
         return TelegramAccountDetail(
             account=TelegramAccountResponse.model_validate(account),
@@ -180,6 +180,9 @@ async def delete_telegram_account(
     db.delete(account)
     db.commit()
 
+    # Close the pooled connection of the deleted account
+    await telegram_service.pool.discard(str(account_id))
+
     return None
 
 
@@ -209,7 +212,11 @@ async def get_telegram_dialogs(
         )
 
     try:
-        dialogs = await telegram_service.get_dialogs(account.session_encrypted, limit=limit)
+        dialogs = await telegram_service.get_dialogs(
+            account.session_encrypted,
+            limit=limit,
+            account_id=str(account.id)
+        )
         return [DialogInfo(**dialog) for dialog in dialogs]
     except Exception as e:
         raise HTTPException(
@@ -33,6 +33,35 @@ class Settings(BaseSettings):
     TELEGRAM_API_ID: int = 0  # Get from https://my.telegram.org
     TELEGRAM_API_HASH: str = ""  # Get from https://my.telegram.org
 
+    # Telegram client pool (long-lived MTProto connections per account)
+    TELEGRAM_POOL_MAX_CONCURRENT_REQUESTS: int = 4  # In-flight requests per client
+    TELEGRAM_POOL_IDLE_TIMEOUT_SECONDS: int = 600  # Disconnect clients unused for this long
+    TELEGRAM_POOL_EVICTION_INTERVAL_SECONDS: int = 60  # How often idle clients are checked
+    TELEGRAM_POOL_HEALTH_CHECK_INTERVAL_SECONDS: int = 60
+    TELEGRAM_POOL_RECONNECT_ATTEMPTS: int = 5
+    TELEGRAM_POOL_RECONNECT_BACKOFF_SECONDS: float = 1.0  # Base delay, doubled per attempt
+
+    # Global message collector
+    COLLECTOR_MAX_CONCURRENT_FETCHES: int = 16  # 1 = sequential collection
+    COLLECTOR_MAX_CONCURRENT_FETCHES_PER_ACCOUNT: int = 4
+    COLLECTOR_WRITE_QUEUE_SIZE: int = 64  # Fetched channels waiting for the DB writer
+    COLLECTOR_INITIAL_FETCH_LIMIT: int = 100  # Latest messages fetched for a new channel
+    COLLECTOR_MAX_CATCHUP_MESSAGES: int = 5000  # Per channel per pass
+    COLLECTOR_MIN_POLL_INTERVAL_SECONDS: int = 60
+    COLLECTOR_MAX_POLL_INTERVAL_SECONDS: int = 3600  # Quiet channels back off up to this
+    COLLECTOR_TARGET_MESSAGES_PER_POLL: float = 1.0  # Busy channels are polled about this often
+    COLLECTOR_RATE_SMOOTHING: float = 0.3  # EWMA weight of the latest observed rate
+    COLLECTOR_FAILURE_BACKOFF_BASE_SECONDS: int = 60  # Doubles with every consecutive channel failure
+    COLLECTOR_FAILURE_BACKOFF_MAX_SECONDS: int = 3600
+    COLLECTOR_QUARANTINE_AFTER_FAILURES: int = 5
+    COLLECTOR_QUARANTINE_PROBE_INTERVAL_SECONDS: int = 21600  # Probe fetch of a quarantined channel
+
+    # Realtime ingestion (Telethon NewMessage events, polling stays as fallback)
+    REALTIME_INGESTION_ENABLED: bool = False
+    REALTIME_SUPERVISE_INTERVAL_SECONDS: int = 30  # Reconnect check / subscription refresh
+    REALTIME_RESYNC_INTERVAL_SECONDS: int = 600  # Safety catch-up fetch of realtime channels
+    REALTIME_DISPATCH_DELAY_SECONDS: float = 2.0  # Batch new messages before rule processing
+
     # Encryption (Fernet key for Telegram sessions)
     ENCRYPTION_KEY: str = ""  # Generate using: Fernet.generate_key().decode()
 
@@ -41,6 +70,47 @@ class Settings(BaseSettings):
     LLM_API_KEY: str = ""
     LLM_MODEL: str = "gpt-4o-mini"
     LLM_TIMEOUT: int = 30
+    LLM_MULTI_RULE_MAX_RULES: int = 10  # Rules classified together in one request per message
+    LLM_BATCH_MAX_MESSAGES: int = 30  # Messages classified together against one rule
+    LLM_BATCH_MAX_INPUT_TOKENS: int = 6000  # Estimated prompt size limit of a batch request
+    LLM_MAX_OUTPUT_TOKENS: int = 16384  # Model response limit; caps batch size when every message matches
+    LLM_MAX_CONCURRENT_REQUESTS: int = 32  # LLM API calls in flight per process
+
+    # Rule processing
+    RULE_PROCESSOR_MAX_CONCURRENT_CHANNELS: int = 16  # Channels classified in parallel
+    RULE_PREFILTER_ENABLED: bool = True  # Skip the LLM for messages failing a rule's keyword/regex prefilter
+
+    # Worker pipeline: collected channels flow into classification without waiting for the whole cycle
+    PIPELINE_CLASSIFY_QUEUE_SIZE: int = 64  # Collected channels waiting for classification (backpressure on collection)
+    PIPELINE_CLASSIFY_WORKERS: int = 2  # Concurrent classification consumers (own DB session each)
+    PIPELINE_CLASSIFY_MAX_CHANNELS: int = 8  # Ready channels classified together by one consumer
+
+    # Semantic prefilter (optional: requires numpy and sentence-transformers)
+    EMBEDDING_PREFILTER_ENABLED: bool = False
+    EMBEDDING_MODEL_NAME: str = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"  # Runs on CPU
+    EMBEDDING_BATCH_SIZE: int = 64
+    EMBEDDING_SIMILARITY_FLOOR: float = 0.2  # Messages less similar to the rule prompt skip the LLM
+    EMBEDDING_LOAD_RETRY_SECONDS: int = 3600  # Prefilter is off this long after a failed model load
+
+    # Distilled per-rule classifier (optional: requires scikit-learn)
+    RULE_CLASSIFIER_ENABLED: bool = False
+    RULE_CLASSIFIER_MIN_SAMPLES: int = 300  # LLM-labelled messages required before training
+    RULE_CLASSIFIER_MIN_CLASS_SAMPLES: int = 20  # Minimum positives and negatives
+    RULE_CLASSIFIER_MAX_SAMPLES: int = 5000  # Most recent verdicts used for training
+    RULE_CLASSIFIER_NEGATIVE_THRESHOLD: float = 0.1  # Match probability below which the LLM is skipped
+    RULE_CLASSIFIER_MIN_AGREEMENT: float = 0.97  # Holdout agreement required to trust the fast path
+    RULE_CLASSIFIER_AUDIT_RATE: float = 0.05  # Share of fast-path rejections still sent to the LLM
+    RULE_CLASSIFIER_RETRAIN_INTERVAL_SECONDS: int = 21600
+
+    # Notification outbox (email / Telegram delivery)
+    NOTIFICATION_DISPATCH_INTERVAL_SECONDS: float = 5.0  # Outbox polling interval (new leads also wake the dispatcher)
+    NOTIFICATION_DISPATCH_BATCH_SIZE: int = 100  # Outbox rows claimed per pass
+    NOTIFICATION_DISPATCH_CONCURRENCY: int = 10  # Deliveries in flight
+    NOTIFICATION_MAX_ATTEMPTS: int = 8  # Then the row is marked failed
+    NOTIFICATION_RETRY_BASE_SECONDS: int = 30  # Exponential backoff between attempts
+    NOTIFICATION_RETRY_MAX_SECONDS: int = 3600
+    NOTIFICATION_LEASE_SECONDS: int = 300  # Claimed rows are retried by another dispatcher after this
+    NOTIFICATION_SEND_TIMEOUT_SECONDS: float = 60.0  # Per delivery; capped at half the lease
 
     # Email Settings
     SMTP_HOST: str = "smtp.gmail.com"
@@ -6,6 +6,7 @@ import logging
 from app.config import settings
 from app.workers import message_collector_worker
 from app.services.telegram_bot_service import telegram_bot_service
+from app.services.telegram_service import telegram_service
 
 logger = logging.getLogger(__name__)
 
@@ -19,6 +20,9 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info("Starting application...")
 
+    # Пул Telegram клиентов: периодически отключает неиспользуемые клиенты
+    telegram_service.pool.start()
+
     # Запускаем worker V2 для сбора и анализа сообщений
     # Интервал берем из переменной окружения (по умолчанию 1 минута)
     import os
@@ -34,6 +38,7 @@ async def lifespan(app: FastAPI):
     # Shutdown
     logger.info("Shutting down application...")
     message_collector_worker.stop()
+    await telegram_service.pool.close_all()
     await telegram_bot_service.stop_bot()
 
 
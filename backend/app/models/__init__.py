@@ -8,6 +8,11 @@ from app.models.global_channel import GlobalChannel
 from app.models.global_message import GlobalMessage
 from app.models.channel_subscription import ChannelSubscription
 from app.models.rule_analysis_progress import RuleAnalysisProgress
+from app.models.channel_peer import ChannelPeer
+from app.models.message_analysis import MessageAnalysis
+from app.models.rule_verdict import RuleVerdict
+from app.models.message_embedding import MessageEmbedding
+from app.models.notification_outbox import NotificationOutbox
 
 __all__ = [
     "Tenant",
@@ -20,4 +25,9 @@ __all__ = [
     "GlobalMessage",
     "ChannelSubscription",
     "RuleAnalysisProgress",
+    "ChannelPeer",
+    "MessageAnalysis",
+    "RuleVerdict",
+    "MessageEmbedding",
+    "NotificationOutbox",
 ]
@@ -0,0 +1,39 @@
+"""
+ChannelPeer model - кэш resolved peer (id + access_hash) канала для каждого Telegram аккаунта.
+access_hash у каналов свой для каждого аккаунта, поэтому ключ - пара (channel, account).
+"""
+from sqlalchemy import Column, String, BigInteger, DateTime, ForeignKey, UniqueConstraint
+from sqlalchemy.dialects.postgresql import UUID
+from datetime import datetime
+import uuid
+
+from app.database import Base
+
+
+class ChannelPeer(Base):
+    """
+    Resolved InputPeer глобального канала для конкретного Telegram аккаунта.
+    Позволяет делать GetHistory без ResolveUsername / get_entity на каждый fetch.
+    """
+    __tablename__ = "channel_peers"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+
+    # Связи
+    channel_id = Column(UUID(as_uuid=True), ForeignKey("global_channels.id", ondelete="CASCADE"), nullable=False)
+    telegram_account_id = Column(UUID(as_uuid=True), ForeignKey("telegram_accounts.id", ondelete="CASCADE"), nullable=False)
+
+    # InputPeer данные
+    peer_type = Column(String(20), nullable=False)  # 'channel', 'chat', 'user'
+    peer_id = Column(BigInteger, nullable=False)
+    access_hash = Column(BigInteger, nullable=True)  # NULL для обычных чатов
+
+    resolved_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    # Constraints - один peer для пары (channel, account)
+    __table_args__ = (
+        UniqueConstraint('channel_id', 'telegram_account_id', name='uq_channel_peer_channel_account'),
+    )
+
+    def __repr__(self):
+        return f"<ChannelPeer channel={self.channel_id} account={self.telegram_account_id}>"
@@ -2,7 +2,7 @@
 GlobalChannel model - глобальное хранилище каналов для всех tenants.
 Один канал = одна запись, независимо от количества пользователей.
 """
-from sqlalchemy import Column, String, BigInteger, Boolean, DateTime, Index
+from sqlalchemy import Column, String, Text, BigInteger, Integer, Float, Boolean, DateTime, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -29,10 +29,21 @@ class GlobalChannel(Base):
     channel_type = Column(String(50), nullable=True)  # 'channel', 'group', 'chat'
 
     # Технические поля для сбора сообщений
-    last_message_id = Column(BigInteger, nullable=True)  # Для offset_id
+    last_message_id = Column(BigInteger, nullable=True)  # Forward cursor: последний собранный tg_message_id (min_id)
     last_collected_at = Column(DateTime, nullable=True)
     is_active = Column(Boolean, default=True, nullable=False)
 
+    # Адаптивное расписание polling'а
+    message_rate = Column(Float, nullable=True)  # Сглаженная частота сообщений (в час)
+    poll_interval_seconds = Column(Integer, nullable=True)  # Текущий интервал polling'а
+    next_poll_at = Column(DateTime, nullable=True, index=True)  # NULL = опросить в ближайший цикл
+
+    # Circuit breaker: ошибки fetch канала (backoff, затем карантин с пробными запросами)
+    consecutive_failures = Column(Integer, default=0, server_default="0", nullable=False)
+    last_error = Column(Text, nullable=True)
+    last_failure_at = Column(DateTime, nullable=True)
+    quarantined_at = Column(DateTime, nullable=True)  # NOT NULL = канал в карантине
+
     # Timestamps
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
 
@@ -40,6 +51,15 @@ class GlobalChannel(Base):
     messages = relationship("GlobalMessage", back_populates="channel", cascade="all, delete-orphan")
     subscriptions = relationship("ChannelSubscription", back_populates="channel", cascade="all, delete-orphan")
 
+    @property
+    def collection_status(self) -> str:
+        """Состояние сбора: ok, failing (backoff после ошибок) или quarantined."""
+        if self.quarantined_at is not None:
+            return "quarantined"
+        if self.consecutive_failures:
+            return "failing"
+        return "ok"
+
     def __repr__(self):
         return f"<GlobalChannel {self.username or self.tg_id}>"
 
@@ -6,6 +6,7 @@ from sqlalchemy import Column, String, BigInteger, Text, DateTime, ForeignKey, U
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from datetime import datetime
+from typing import Optional
 import uuid
 
 from app.database import Base
@@ -45,6 +46,7 @@ class GlobalMessage(Base):
         UniqueConstraint('channel_id', 'tg_message_id', name='uq_global_messages_channel_tg_id'),
         Index('idx_global_messages_channel', 'channel_id'),
         Index('idx_global_messages_sent_at', 'sent_at'),
+        Index('idx_global_messages_channel_position', 'channel_id', 'sent_at', 'tg_message_id'),  # Cursor rule processor'а
     )
 
     def __repr__(self):
@@ -62,14 +64,21 @@ class GlobalMessage(Base):
         if not self.channel:
             return ""
 
-        # Публичный канал (есть username)
-        if self.channel.username:
-            return f"https://t.me/{self.channel.username}/{self.tg_message_id}"
+        return telegram_message_link(self.channel.username, self.channel.tg_id, self.tg_message_id)
 
-        # Приватный канал (только tg_id)
-        # Убираем префикс -100 из channel_id для формата t.me/c/
-        channel_id = str(abs(self.channel.tg_id))
-        if self.channel.tg_id < 0 and channel_id.startswith('100'):
-            channel_id = channel_id[3:]
 
-        return f"https://t.me/c/{channel_id}/{self.tg_message_id}"
+def telegram_message_link(username: Optional[str], channel_tg_id: int, tg_message_id: int) -> str:
+    """
+    Ссылка на сообщение по данным канала (без загрузки GlobalMessage / GlobalChannel).
+    """
+    # Публичный канал (есть username)
+    if username:
+        return f"https://t.me/{username}/{tg_message_id}"
+
+    # Приватный канал (только tg_id)
+    # Убираем префикс -100 из channel_id для формата t.me/c/
+    channel_id = str(abs(channel_tg_id))
+    if channel_tg_id < 0 and channel_id.startswith('100'):
+        channel_id = channel_id[3:]
+
+    return f"https://t.me/c/{channel_id}/{tg_message_id}"
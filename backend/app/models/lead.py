@@ -21,6 +21,7 @@ class Lead(Base):
     reasoning = Column(Text, nullable=True)  # LLM explanation
     extracted_entities = Column(JSON, nullable=True)  # Structured data from LLM
     status = Column(String(50), default="new", nullable=False)  # new, in_progress, processed, archived
+    archive_reason = Column(String(50), nullable=True)  # threshold = archived by the system, NULL = by a user
     assignee_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
@@ -0,0 +1,41 @@
+"""
+MessageAnalysis model - общий (для всех tenants) кэш результатов LLM анализа.
+Ключ - (нормализованный hash промпта, глобальное сообщение, модель LLM).
+"""
+from sqlalchemy import Column, String, Text, Float, Boolean, DateTime, ForeignKey, UniqueConstraint, JSON
+from sqlalchemy.dialects.postgresql import UUID
+from datetime import datetime
+import uuid
+
+from app.database import Base
+
+
+class MessageAnalysis(Base):
+    """
+    Результат классификации глобального сообщения по промпту правила.
+    Одинаковые (после нормализации) промпты разных tenants используют один результат.
+    """
+    __tablename__ = "message_analysis"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+
+    # Ключ кэша
+    prompt_hash = Column(String(64), nullable=False)  # sha256 нормализованного промпта
+    global_message_id = Column(UUID(as_uuid=True), ForeignKey("global_messages.id", ondelete="CASCADE"), nullable=False, index=True)
+    model = Column(String(100), nullable=False)
+
+    # Результат LLM
+    is_match = Column(Boolean, nullable=False)
+    confidence = Column(Float, nullable=False)
+    reasoning = Column(Text, nullable=True)
+    entities = Column(JSON, nullable=True)  # Извлеченные сущности (только для is_match)
+
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    # Constraints - один результат для (prompt, message, model)
+    __table_args__ = (
+        UniqueConstraint('prompt_hash', 'global_message_id', 'model', name='uq_message_analysis_prompt_message_model'),
+    )
+
+    def __repr__(self):
+        return f"<MessageAnalysis message={self.global_message_id} match={self.is_match}>"
@@ -0,0 +1,35 @@
+"""
+MessageEmbedding model - embedding текста глобального сообщения (для семантического префильтра).
+Вычисляется один раз на сообщение и модель, общий для всех tenants и правил.
+"""
+from sqlalchemy import Column, String, Integer, LargeBinary, DateTime, ForeignKey, UniqueConstraint
+from sqlalchemy.dialects.postgresql import UUID
+from datetime import datetime
+import uuid
+
+from app.database import Base
+
+
+class MessageEmbedding(Base):
+    """
+    Нормализованный вектор сообщения (float16, компактно: 384 измерения = 768 байт).
+    """
+    __tablename__ = "message_embeddings"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+
+    global_message_id = Column(UUID(as_uuid=True), ForeignKey("global_messages.id", ondelete="CASCADE"), nullable=False)
+    model = Column(String(255), nullable=False)
+
+    dimensions = Column(Integer, nullable=False)
+    vector = Column(LargeBinary, nullable=False)  # float16 bytes
+
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    # Constraints - один embedding для пары (message, model)
+    __table_args__ = (
+        UniqueConstraint('global_message_id', 'model', name='uq_message_embedding_message_model'),
+    )
+
+    def __repr__(self):
+        return f"<MessageEmbedding message={self.global_message_id} model={self.model}>"
@@ -0,0 +1,44 @@
+"""
+NotificationOutbox model - transactional outbox внешних уведомлений (email, Telegram).
+Записи создаются в той же транзакции, что и лид; доставляет их NotificationDispatcher.
+"""
+from sqlalchemy import Column, String, Text, Integer, DateTime, ForeignKey, JSON, Index
+from sqlalchemy.dialects.postgresql import UUID
+from datetime import datetime
+import uuid
+
+from app.database import Base
+
+
+class NotificationOutbox(Base):
+    """
+    Одна доставка одного уведомления по одному каналу.
+    idempotency_key гарантирует, что повторная запись (или повторная доставка) не создаст дубль.
+    """
+    __tablename__ = "notification_outbox"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    idempotency_key = Column(String(255), nullable=False, unique=True)  # new_lead:{lead_id}:{user_id}:{channel}
+
+    # Получатель и данные уведомления (snapshot на момент создания лида)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    lead_id = Column(UUID(as_uuid=True), ForeignKey("leads.id", ondelete="CASCADE"), nullable=True)
+    channel = Column(String(20), nullable=False)  # email, telegram
+    payload = Column(JSON, nullable=False)
+
+    # Доставка
+    status = Column(String(20), default="pending", nullable=False)  # pending, sent, failed, skipped
+    attempts = Column(Integer, default=0, nullable=False)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    locked_until = Column(DateTime, nullable=True)  # Lease dispatcher'а, взявшего запись
+    last_error = Column(Text, nullable=True)
+
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    sent_at = Column(DateTime, nullable=True)  # Ставит и endpoint получателя перед отправкой (dedupe по Idempotency-Key)
+
+    __table_args__ = (
+        Index('idx_notification_outbox_due', 'status', 'next_attempt_at'),
+    )
+
+    def __repr__(self):
+        return f"<NotificationOutbox {self.idempotency_key} status={self.status}>"
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Text, Numeric, Boolean, DateTime, ForeignKey, JSON, ARRAY
+from sqlalchemy import Column, String, Text, Integer, Numeric, Float, Boolean, DateTime, ForeignKey, JSON, ARRAY
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -18,10 +18,18 @@ class Rule(Base):
     name = Column(String(255), nullable=False)
     description = Column(Text, nullable=True)
     prompt = Column(Text, nullable=False)  # LLM system prompt with criteria
+    prompt_version = Column(Integer, default=1, server_default="1", nullable=False)  # Bumped on every prompt change
     threshold = Column(Numeric(3, 2), default=0.70, nullable=False)  # 0.00 to 1.00
     schedule = Column(JSON, default={"always": True})  # For future scheduling features
+    prefilter = Column(JSON, nullable=True)  # Keyword/regex prefilter before LLM (NULL = disabled)
     channel_ids = Column(ARRAY(UUID(as_uuid=True)), nullable=True)  # NULL = all channels (subscriptions)
     is_active = Column(Boolean, default=True, nullable=False)
+
+    # Локальный классификатор, обученный на вердиктах LLM (см. rule_classifier_service)
+    classifier_samples = Column(Integer, nullable=True)  # Размер обучающей выборки
+    classifier_agreement = Column(Float, nullable=True)  # Доля отсевов, совпавших с LLM/feedback на holdout
+    classifier_trained_at = Column(DateTime, nullable=True)
+
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
 
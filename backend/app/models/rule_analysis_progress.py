@@ -2,7 +2,7 @@
 RuleAnalysisProgress model - отслеживание прогресса анализа сообщений правилами.
 Хранит pointer на последнее проанализированное сообщение вместо всех проверок.
 """
-from sqlalchemy import Column, Integer, DateTime, ForeignKey, UniqueConstraint
+from sqlalchemy import Column, Integer, BigInteger, DateTime, ForeignKey, UniqueConstraint
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -28,9 +28,14 @@ class RuleAnalysisProgress(Base):
     last_analyzed_message_id = Column(UUID(as_uuid=True), ForeignKey("global_messages.id", ondelete="SET NULL"), nullable=True)
     last_analyzed_at = Column(DateTime, nullable=True)
 
+    # Cursor - позиция последнего сообщения (sent_at, tg_message_id), без lookup'а в global_messages
+    last_sent_at = Column(DateTime, nullable=True)
+    last_tg_message_id = Column(BigInteger, nullable=True)
+
     # Статистика
     messages_analyzed = Column(Integer, default=0, nullable=False)
     leads_created = Column(Integer, default=0, nullable=False)
+    messages_prefiltered = Column(Integer, default=0, server_default="0", nullable=False)  # Отсеяно префильтром без LLM
 
     # Relationships
     rule = relationship("Rule", back_populates="analysis_progress")
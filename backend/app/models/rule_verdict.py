@@ -0,0 +1,40 @@
+"""
+RuleVerdict model - результат LLM анализа сообщения правилом (для каждой пары rule, message).
+Позволяет пересчитать лиды при изменении threshold без повторных запросов к LLM.
+"""
+from sqlalchemy import Column, Integer, Text, Float, Boolean, DateTime, ForeignKey, UniqueConstraint
+from sqlalchemy.dialects.postgresql import UUID
+from datetime import datetime
+import uuid
+
+from app.database import Base
+
+
+class RuleVerdict(Base):
+    """
+    Вердикт LLM для пары (rule, global_message) - хранится независимо от threshold.
+    prompt_version показывает, для какой версии промпта правила получен вердикт.
+    """
+    __tablename__ = "rule_verdicts"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+
+    # Связи
+    rule_id = Column(UUID(as_uuid=True), ForeignKey("rules.id", ondelete="CASCADE"), nullable=False)
+    global_message_id = Column(UUID(as_uuid=True), ForeignKey("global_messages.id", ondelete="CASCADE"), nullable=False)
+
+    # Результат LLM
+    prompt_version = Column(Integer, nullable=False)
+    is_match = Column(Boolean, nullable=False)
+    confidence = Column(Float, nullable=False)
+    reasoning = Column(Text, nullable=True)
+
+    analyzed_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    # Constraints - один (последний) вердикт для пары (rule, message)
+    __table_args__ = (
+        UniqueConstraint('rule_id', 'global_message_id', name='uq_rule_verdict_rule_message'),
+    )
+
+    def __repr__(self):
+        return f"<RuleVerdict rule={self.rule_id} message={self.global_message_id} confidence={self.confidence}>"
@@ -43,6 +43,10 @@ class LeadResponse(BaseModel):
         description="Извлеченные сущности (контакты, ключевые слова, бюджет и т.д.)"
     )
     status: LeadStatus
+    archive_reason: Optional[str] = Field(
+        None,
+        description="Причина системной архивации (threshold); null - архивирован пользователем"
+    )
     assignee_id: Optional[UUID]
     created_at: datetime
     updated_at: datetime
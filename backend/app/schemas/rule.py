@@ -1,6 +1,8 @@
 """
 Pydantic schemas для Rules (правила мониторинга).
 """
+import re
+
 from pydantic import BaseModel, Field, field_validator
 from typing import Optional, List, Dict, Any
 from uuid import UUID
@@ -8,6 +10,35 @@ from datetime import datetime
 from decimal import Decimal
 
 
+class RulePrefilter(BaseModel):
+    """Лексический префильтр правила: сообщения, не прошедшие его, не отправляются в LLM."""
+    include_keywords: List[str] = Field(default_factory=list, description="Хотя бы одно слово/фраза должно встретиться")
+    exclude_keywords: List[str] = Field(default_factory=list, description="Сообщения с этими словами пропускаются")
+    include_patterns: List[str] = Field(default_factory=list, description="Regex: хотя бы один должен совпасть")
+    exclude_patterns: List[str] = Field(default_factory=list, description="Regex: сообщения с совпадением пропускаются")
+    derive_from_prompt: bool = Field(
+        default=False,
+        description="Вывести include_keywords из промпта, если они не заданы"
+    )
+    similarity_floor: Optional[float] = Field(
+        default=None,
+        ge=-1.0,
+        le=1.0,
+        description="Порог cosine similarity семантического префильтра (NULL = глобальный)"
+    )
+
+    @field_validator('include_patterns', 'exclude_patterns')
+    @classmethod
+    def validate_patterns(cls, v: List[str]) -> List[str]:
+        """Валидация regex паттернов."""
+        for pattern in v:
+            try:
+                re.compile(pattern)
+            except re.error as e:
+                raise ValueError(f"Invalid pattern '{pattern}': {e}")
+        return v
+
+
 class RuleBase(BaseModel):
     """Базовая схема для Rule."""
     name: str = Field(..., min_length=1, max_length=255, description="Название правила")
@@ -28,6 +59,10 @@ class RuleBase(BaseModel):
         default={"always": True},
         description="Расписание проверки (для будущих фич)"
     )
+    prefilter: Optional[RulePrefilter] = Field(
+        default=None,
+        description="Префильтр по ключевым словам/regex перед LLM. NULL = все сообщения идут в LLM"
+    )
 
     @field_validator('threshold')
     @classmethod
@@ -52,6 +87,7 @@ class RuleUpdate(BaseModel):
     channel_ids: Optional[List[UUID]] = None
     is_active: Optional[bool] = None
     schedule: Optional[Dict[str, Any]] = None
+    prefilter: Optional[RulePrefilter] = None
 
     @field_validator('threshold')
     @classmethod
@@ -66,11 +102,21 @@ class RuleResponse(RuleBase):
     """Схема для ответа с правилом."""
     id: UUID
     tenant_id: UUID
+    prompt_version: int = 1
     created_at: datetime
     updated_at: datetime
 
     # Дополнительная статистика (может быть добавлена позже)
     leads_count: Optional[int] = Field(default=0, description="Количество найденных лидов")
+    messages_prefiltered: Optional[int] = Field(default=0, description="Сообщений, отсеянных префильтром без LLM")
+
+    # Локальный классификатор правила (NULL - еще не обучен)
+    classifier_samples: Optional[int] = Field(default=None, description="Размер обучающей выборки классификатора")
+    classifier_agreement: Optional[float] = Field(
+        default=None,
+        description="Согласие отсевов классификатора с LLM на контрольной выборке"
+    )
+    classifier_trained_at: Optional[datetime] = None
 
     model_config = {"from_attributes": True}
 
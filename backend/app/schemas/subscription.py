@@ -40,6 +40,14 @@ class SubscriptionResponse(BaseModel):
     channel_title: Optional[str]
     channel_type: str
 
+    # Состояние сбора сообщений канала (circuit breaker)
+    channel_collection_status: str = Field(..., description="ok, failing или quarantined")
+    channel_consecutive_failures: int = 0
+    channel_last_error: Optional[str] = None
+    channel_last_failure_at: Optional[datetime] = None
+    channel_quarantined_at: Optional[datetime] = None
+    channel_next_poll_at: Optional[datetime] = None
+
     model_config = {"from_attributes": True}
 
 
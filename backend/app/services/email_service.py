@@ -1,3 +1,5 @@
+import logging
+
 import aiosmtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
@@ -5,6 +7,22 @@ from typing import List, Optional
 
 from app.config import settings
 
+logger = logging.getLogger(__name__)
+
+
+class EmailNotConfiguredError(Exception):
+    """SMTP is not configured (no host or sender address)."""
+
+
+def is_permanent_email_error(error: Exception) -> bool:
+    """
+    Whether retrying the same email cannot succeed: missing SMTP config, 5xx SMTP replies
+    (bad credentials, rejected sender or recipient) or refused recipients.
+    """
+    if isinstance(error, (EmailNotConfiguredError, aiosmtplib.SMTPRecipientsRefused, aiosmtplib.SMTPNotSupported)):
+        return True
+    return isinstance(error, aiosmtplib.SMTPResponseException) and 500 <= error.code < 600
+
 
 class EmailService:
     """
@@ -19,12 +37,19 @@ class EmailService:
         self.from_email = settings.SMTP_FROM_EMAIL
         self.from_name = settings.SMTP_FROM_NAME
 
+    @property
+    def is_configured(self) -> bool:
+        """SMTP host and sender address are set."""
+        return bool(self.smtp_host and self.from_email)
+
     async def send_email(
         self,
         to_email: str,
         subject: str,
         html_content: str,
         text_content: Optional[str] = None,
+        message_id: Optional[str] = None,
+        raise_errors: bool = False,
     ) -> bool:
         """
         Send an email.
@@ -34,15 +59,23 @@ class EmailService:
             subject: Email subject
             html_content: HTML content of the email
             text_content: Optional plain text content
+            message_id: Optional stable Message-ID header (lets clients drop duplicate retries)
+            raise_errors: Raise the failure (EmailNotConfiguredError, aiosmtplib errors)
+                instead of returning False, so the caller can decide whether to retry
 
         Returns:
             True if email was sent successfully, False otherwise
         """
         try:
+            if not self.is_configured:
+                raise EmailNotConfiguredError("SMTP_HOST / SMTP_FROM_EMAIL are not set")
+
             message = MIMEMultipart("alternative")
             message["From"] = f"{self.from_name} <{self.from_email}>"
             message["To"] = to_email
             message["Subject"] = subject
+            if message_id:
+                message["Message-ID"] = message_id
 
             # Add plain text part if provided
             if text_content:
@@ -65,7 +98,9 @@ class EmailService:
 
             return True
         except Exception as e:
-            print(f"Failed to send email to {to_email}: {e}")
+            if raise_errors:
+                raise
+            logger.error(f"Failed to send email to {to_email}: {type(e).__name__}: {e}")
             return False
 
     async def send_verification_email(self, to_email: str, verification_token: str) -> bool:
@@ -244,6 +279,8 @@ class EmailService:
         rule_name: str,
         source_title: str,
         message_preview: str,
+        message_id: Optional[str] = None,
+        raise_errors: bool = False,
     ) -> bool:
         """
         Send notification about a new lead.
@@ -257,6 +294,8 @@ class EmailService:
             rule_name: Rule name
             source_title: Source title
             message_preview: Message text preview
+            message_id: Optional stable Message-ID header
+            raise_errors: Raise the failure instead of returning False (see send_email)
 
         Returns:
             True if email was sent successfully
@@ -338,7 +377,9 @@ class EmailService:
         View in Dashboard: {dashboard_url}/dashboard/leads?highlight={lead_id}
         """
 
-        return await self.send_email(to_email, subject, html_content, text_content)
+        return await self.send_email(
+            to_email, subject, html_content, text_content, message_id=message_id, raise_errors=raise_errors
+        )
 
     async def send_lead_status_change_notification(
         self,
@@ -0,0 +1,188 @@
+"""
+Embedding Service - семантический префильтр на локальной CPU модели (sentence-transformers).
+Сообщения и промпты правил переводятся в нормализованные векторы,
+в LLM идут только сообщения с cosine similarity к правилу не ниже порога.
+
+Зависимости опциональны (numpy, sentence-transformers): без них префильтр выключается.
+"""
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Iterable
+from uuid import UUID
+
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.message_embedding import MessageEmbedding
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - опциональная зависимость
+    np = None
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingService:
+    """
+    - Модель загружается лениво при первом использовании (в отдельном потоке);
+      после ошибки загрузки префильтр выключается на load_retry_interval (без пакета - навсегда)
+    - Embeddings сообщений хранятся в message_embeddings (один раз на сообщение и модель)
+    - Векторы промптов кэшируются в памяти по hash промпта
+    - Scoring: матрица сообщений (n x d) @ матрица правил (d x r) - один вызов NumPy на пачку
+    """
+
+    def __init__(
+        self,
+        enabled: bool = settings.EMBEDDING_PREFILTER_ENABLED,
+        model_name: str = settings.EMBEDDING_MODEL_NAME,
+        batch_size: int = settings.EMBEDDING_BATCH_SIZE,
+        similarity_floor: float = settings.EMBEDDING_SIMILARITY_FLOOR,
+        load_retry_interval: float = settings.EMBEDDING_LOAD_RETRY_SECONDS,
+    ):
+        self.enabled = enabled
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.similarity_floor = similarity_floor
+        self.load_retry_interval = load_retry_interval
+
+        self._model = None
+        self._model_lock = asyncio.Lock()
+        self._unavailable = False
+        self._load_retry_at = 0.0  # time.monotonic(), до которого модель не загружается после ошибки
+        self._prompt_vectors: Dict[str, Any] = {}  # prompt_hash -> np.ndarray
+
+    @property
+    def is_available(self) -> bool:
+        """Префильтр включен, зависимости установлены и модель не в паузе после ошибки загрузки."""
+        return (
+            self.enabled
+            and not self._unavailable
+            and np is not None
+            and time.monotonic() >= self._load_retry_at
+        )
+
+    async def _get_model(self):
+        """Загружает модель (CPU) при первом обращении."""
+        if self._model is not None:
+            return self._model
+
+        async with self._model_lock:
+            if self._model is None:
+                # Ожидавшие lock окна не повторяют только что неудавшуюся загрузку
+                if time.monotonic() < self._load_retry_at:
+                    raise RuntimeError(f"Embedding model {self.model_name} failed to load recently")
+
+                try:
+                    from sentence_transformers import SentenceTransformer
+                except ImportError:
+                    logger.warning(
+                        "sentence-transformers is not installed, embedding prefilter disabled"
+                    )
+                    self._unavailable = True
+                    raise
+
+                logger.info(f"Loading embedding model {self.model_name} (CPU)")
+                try:
+                    self._model = await asyncio.to_thread(SentenceTransformer, self.model_name, device="cpu")
+                except Exception as e:
+                    # Неверное имя модели, ошибка загрузки, нехватка памяти - не повторять на каждой пачке
+                    self._load_retry_at = time.monotonic() + self.load_retry_interval
+                    logger.error(
+                        f"Failed to load embedding model {self.model_name}, embedding prefilter disabled "
+                        f"for {self.load_retry_interval}s: {type(e).__name__}: {str(e)}"
+                    )
+                    raise
+
+        return self._model
+
+    async def encode(self, texts: List[str]) -> "np.ndarray":
+        """
+        Нормализованные embeddings текстов (float32, n x d). Вычисление - вне event loop.
+        """
+        model = await self._get_model()
+        vectors = await asyncio.to_thread(
+            model.encode,
+            texts,
+            batch_size=self.batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+        return vectors.astype(np.float32)
+
+    async def prompt_matrix(self, targets: List[Dict[str, Any]]) -> "np.ndarray":
+        """
+        Матрица векторов промптов правил (r x d) в порядке targets.
+        """
+        missing = {
+            target["prompt_hash"]: target["prompt"]
+            for target in targets
+            if target["prompt_hash"] not in self._prompt_vectors
+        }
+        if missing:
+            vectors = await self.encode(list(missing.values()))
+            for prompt_hash, vector in zip(missing.keys(), vectors):
+                self._prompt_vectors[prompt_hash] = vector
+
+        return np.stack([self._prompt_vectors[target["prompt_hash"]] for target in targets])
+
+    def load(self, db: Session, message_ids: Iterable[UUID]) -> Dict[UUID, "np.ndarray"]:
+        """
+        Сохраненные embeddings сообщений (одним запросом).
+        """
+        message_ids = list(set(message_ids))
+        if not message_ids:
+            return {}
+
+        rows = db.query(
+            MessageEmbedding.global_message_id,
+            MessageEmbedding.vector
+        ).filter(
+            MessageEmbedding.model == self.model_name,
+            MessageEmbedding.global_message_id.in_(message_ids)
+        ).all()
+
+        return {
+            message_id: np.frombuffer(vector, dtype=np.float16).astype(np.float32)
+            for message_id, vector in rows
+        }
+
+    def store(self, db: Session, vectors: Dict[UUID, "np.ndarray"]):
+        """
+        Сохраняет embeddings сообщений (ON CONFLICT DO NOTHING). Commit выполняет вызывающий код.
+        """
+        if not vectors:
+            return
+
+        now = datetime.utcnow()
+        stmt = pg_insert(MessageEmbedding).values([
+            {
+                "id": uuid.uuid4(),
+                "global_message_id": message_id,
+                "model": self.model_name,
+                "dimensions": int(vector.shape[0]),
+                "vector": vector.astype(np.float16).tobytes(),
+                "created_at": now,
+            }
+            for message_id, vector in vectors.items()
+        ]).on_conflict_do_nothing(constraint="uq_message_embedding_message_model")
+        db.execute(stmt)
+
+    @staticmethod
+    def similarity(message_matrix: "np.ndarray", prompt_matrix: "np.ndarray") -> "np.ndarray":
+        """Cosine similarity (векторы нормализованы): n x r."""
+        return message_matrix @ prompt_matrix.T
+
+    def floor_for(self, target: Dict[str, Any]) -> float:
+        """Порог similarity правила (Rule.prefilter.similarity_floor или глобальный)."""
+        floor = (target.get("prefilter") or {}).get("similarity_floor")
+        return self.similarity_floor if floor is None else float(floor)
+
+
+# Глобальный экземпляр сервиса
+embedding_service = EmbeddingService()
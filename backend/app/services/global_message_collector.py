@@ -2,29 +2,143 @@
 Global Message Collector Service - собирает сообщения из глобальных каналов.
 Один канал = один fetch запрос, независимо от количества tenants.
 """
+import asyncio
 import logging
-from typing import Dict, Any
-from datetime import datetime
+import uuid
+from collections import defaultdict
+from typing import Dict, Any, List, Optional, Iterable
+from uuid import UUID
+from datetime import datetime, timedelta
+from sqlalchemy import exists, func, or_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
-from sqlalchemy.exc import IntegrityError
+from telethon import errors
 
+from app.config import settings
+from app.models.channel_peer import ChannelPeer
+from app.models.channel_subscription import ChannelSubscription
 from app.models.global_channel import GlobalChannel
 from app.models.global_message import GlobalMessage
+from app.models.rule import Rule
 from app.models.telegram_account import TelegramAccount
+from app.models.tenant import Tenant
+from app.services.telegram_account_scheduler import telegram_account_scheduler, account_status_for_error
 from app.services.telegram_service import telegram_service
 
 logger = logging.getLogger(__name__)
 
+# Максимум строк в одном INSERT (лимит параметров PostgreSQL - 65535)
+INSERT_BATCH_SIZE = 1000
+
+
+def monitored_channel_filter():
+    """
+    Условие для запросов по GlobalChannel: у канала есть активная подписка,
+    и у tenant'а этой подписки есть активное правило, применимое к каналу
+    (channel_ids правила пустой/NULL или содержит канал).
+    Вычисляется на каждый запрос, поэтому всегда отражает текущие подписки и правила.
+    """
+    return exists().where(
+        ChannelSubscription.channel_id == GlobalChannel.id,
+        ChannelSubscription.is_active == True,
+        Tenant.id == ChannelSubscription.tenant_id,
+        Tenant.deleted_at == None,
+        Rule.tenant_id == ChannelSubscription.tenant_id,
+        Rule.is_active == True,
+        or_(
+            Rule.channel_ids == None,
+            func.cardinality(Rule.channel_ids) == 0,
+            Rule.channel_ids.any(GlobalChannel.id)
+        )
+    )
+
+
+def channel_available_filter(now: datetime):
+    """
+    Условие для запросов по GlobalChannel: канал не находится в backoff/карантине
+    после ошибок fetch (или ему уже пора на пробный запрос).
+    """
+    return or_(
+        GlobalChannel.consecutive_failures == 0,
+        GlobalChannel.next_poll_at == None,
+        GlobalChannel.next_poll_at <= now
+    )
+
+
+def is_channel_error(error: Exception) -> bool:
+    """
+    Ошибка fetch вызвана самим каналом (приватный, удален, неверный username...),
+    а не аккаунтом, FloodWait или сетью - только такие ошибки считает circuit breaker.
+    """
+    if isinstance(error, (errors.FloodWaitError, errors.ServerError, OSError, asyncio.TimeoutError)):
+        return False
+    return account_status_for_error(error) is None
+
 
 class GlobalMessageCollector:
     """
     Сервис для сбора сообщений из глобальных каналов.
     Собирает сообщения ОДИН раз для всей системы, независимо от tenants.
+
+    Конкурентный режим:
+    - Fetch из Telegram выполняется параллельно (общий лимит + лимит на аккаунт)
+    - Результаты через очередь попадают в ОДИН DB writer (Session не потокобезопасна)
+
+    Circuit breaker:
+    - После ошибки канала следующий опрос откладывается экспоненциально
+    - После quarantine_after_failures ошибок подряд канал уходит в карантин
+      и опрашивается пробным запросом раз в quarantine_probe_interval
+    - Первый успешный fetch сбрасывает счетчик ошибок и карантин
     """
 
-    async def collect_global_messages(self, db: Session) -> Dict[str, Any]:
+    def __init__(
+        self,
+        max_concurrent_fetches: int = settings.COLLECTOR_MAX_CONCURRENT_FETCHES,
+        max_concurrent_fetches_per_account: int = settings.COLLECTOR_MAX_CONCURRENT_FETCHES_PER_ACCOUNT,
+        write_queue_size: int = settings.COLLECTOR_WRITE_QUEUE_SIZE,
+        initial_fetch_limit: int = settings.COLLECTOR_INITIAL_FETCH_LIMIT,
+        max_catchup_messages: int = settings.COLLECTOR_MAX_CATCHUP_MESSAGES,
+        min_poll_interval: int = settings.COLLECTOR_MIN_POLL_INTERVAL_SECONDS,
+        max_poll_interval: int = settings.COLLECTOR_MAX_POLL_INTERVAL_SECONDS,
+        target_messages_per_poll: float = settings.COLLECTOR_TARGET_MESSAGES_PER_POLL,
+        rate_smoothing: float = settings.COLLECTOR_RATE_SMOOTHING,
+        failure_backoff_base: int = settings.COLLECTOR_FAILURE_BACKOFF_BASE_SECONDS,
+        failure_backoff_max: int = settings.COLLECTOR_FAILURE_BACKOFF_MAX_SECONDS,
+        quarantine_after_failures: int = settings.COLLECTOR_QUARANTINE_AFTER_FAILURES,
+        quarantine_probe_interval: int = settings.COLLECTOR_QUARANTINE_PROBE_INTERVAL_SECONDS,
+    ):
+        self.max_concurrent_fetches = max_concurrent_fetches
+        self.max_concurrent_fetches_per_account = max_concurrent_fetches_per_account
+        self.write_queue_size = write_queue_size
+        self.initial_fetch_limit = initial_fetch_limit
+        self.max_catchup_messages = max_catchup_messages
+        self.min_poll_interval = min_poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.target_messages_per_poll = target_messages_per_poll
+        self.rate_smoothing = rate_smoothing
+        self.failure_backoff_base = failure_backoff_base
+        self.failure_backoff_max = failure_backoff_max
+        self.quarantine_after_failures = quarantine_after_failures
+        self.quarantine_probe_interval = quarantine_probe_interval
+
+    async def collect_global_messages(
+        self,
+        db: Session,
+        channel_ids: Optional[Iterable[UUID]] = None,
+        exclude_channel_ids: Optional[Iterable[UUID]] = None,
+        collected_queue: Optional[asyncio.Queue] = None
+    ) -> Dict[str, Any]:
         """
-        Собирает сообщения из всех активных глобальных каналов.
+        Собирает сообщения из активных глобальных каналов, которым пора на опрос (next_poll_at).
+        Собираются только каналы, которые кому-то нужны (см. monitored_channel_filter).
+
+        Args:
+            db: Database session
+            channel_ids: Собрать только эти каналы, независимо от расписания
+                (например, catch-up после reconnect)
+            exclude_channel_ids: Пропустить эти каналы (например, уже получаемые в realtime)
+            collected_queue: Сюда передается channel_id каждого канала с новыми сообщениями
+                сразу после commit'а (следующий этап pipeline; полная очередь притормаживает сбор)
 
         Returns:
             Dict с статистикой:
@@ -34,12 +148,24 @@ class GlobalMessageCollector:
                 "errors": []
             }
         """
-        # Получить все активные глобальные каналы
-        channels = db.query(GlobalChannel).filter(
-            GlobalChannel.is_active == True
-        ).all()
+        # Получить активные глобальные каналы, которые мониторит хотя бы одно правило
+        query = db.query(GlobalChannel).filter(
+            GlobalChannel.is_active == True,
+            monitored_channel_filter()
+        )
+        if channel_ids is not None:
+            query = query.filter(GlobalChannel.id.in_(list(channel_ids)))
+        else:
+            # Только каналы, которым пора на опрос
+            query = query.filter(or_(
+                GlobalChannel.next_poll_at == None,
+                GlobalChannel.next_poll_at <= datetime.utcnow()
+            ))
+        if exclude_channel_ids:
+            query = query.filter(GlobalChannel.id.notin_(list(exclude_channel_ids)))
+        channels = query.all()
 
-        logger.info(f"Found {len(channels)} active global channels to process")
+        logger.info(f"Found {len(channels)} global channels due for collection")
 
         stats = {
             "channels_processed": 0,
@@ -47,124 +173,437 @@ class GlobalMessageCollector:
             "errors": []
         }
 
+        # Активные аккаунты и предпочтения подписок для распределения каналов
+        await telegram_account_scheduler.refresh(db)
+
+        # Кэш resolved peers каналов (по аккаунтам) - одним запросом
+        peers = self._load_peers([channel.id for channel in channels], db)
+
+        # Подготовить задания на fetch (все обращения к БД - здесь, до параллельной части)
+        jobs = []
         for channel in channels:
             try:
-                logger.info(f"Processing channel: {channel.username or channel.tg_id}")
+                job = self._prepare_job(channel, peers.get(channel.id, {}))
+            except Exception as e:
+                logger.error(f"Error preparing channel {channel.id}: {str(e)}", exc_info=True)
+                stats["errors"].append({
+                    "channel_id": str(channel.id),
+                    "error": str(e)
+                })
+                continue
 
-                # Получить последний message_id для offset
-                last_message = db.query(GlobalMessage).filter(
-                    GlobalMessage.channel_id == channel.id
-                ).order_by(GlobalMessage.tg_message_id.desc()).first()
+            if job is None:
+                if telegram_account_scheduler.has_accounts:
+                    error = "All Telegram accounts are rate-limited (FloodWait)"
+                else:
+                    error = "No active Telegram accounts"
+                logger.error(error)
+                stats["errors"].append({
+                    "channel_id": str(channel.id),
+                    "error": error
+                })
+                continue
 
-                offset_id = last_message.tg_message_id if last_message else 0
+            jobs.append(job)
 
-                # Получить любой активный Telegram аккаунт для fetch
-                # (не важно какой, главное что активный)
-                telegram_account = db.query(TelegramAccount).filter(
-                    TelegramAccount.status == "active"
-                ).first()
+        if jobs:
+            await self._run_pipeline(jobs, db, stats, collected_queue)
 
-                if not telegram_account:
-                    logger.error("No active Telegram accounts available")
-                    stats["errors"].append({
-                        "channel_id": str(channel.id),
-                        "error": "No active Telegram accounts"
-                    })
-                    continue
+        self._apply_account_status_changes(db)
 
-                # Fetch сообщений из Telegram (ОДИН раз для всех tenants!)
-                channel_identifier = f"@{channel.username}" if channel.username else channel.tg_id
+        logger.info(
+            f"Global message collection completed: "
+            f"processed {stats['channels_processed']} channels, "
+            f"collected {stats['messages_collected']} messages"
+        )
 
+        return stats
+
+    def _load_peers(self, channel_ids: List[UUID], db: Session) -> Dict[UUID, Dict[str, Dict[str, Any]]]:
+        """
+        Загружает кэш resolved peers для каналов.
+
+        Returns:
+            {channel_id: {account_id: {"peer_type", "peer_id", "access_hash"}}}
+        """
+        if not channel_ids:
+            return {}
+
+        peers = defaultdict(dict)
+        for cached in db.query(ChannelPeer).filter(ChannelPeer.channel_id.in_(channel_ids)).all():
+            peers[cached.channel_id][str(cached.telegram_account_id)] = {
+                "peer_type": cached.peer_type,
+                "peer_id": cached.peer_id,
+                "access_hash": cached.access_hash,
+            }
+        return peers
+
+    def _store_peer(self, channel_id: UUID, account_id: str, peer: Dict[str, Any], db: Session):
+        """
+        Сохраняет resolved peer канала для аккаунта (upsert). Commit выполняет вызывающий код.
+        """
+        stmt = pg_insert(ChannelPeer).values(
+            id=uuid.uuid4(),
+            channel_id=channel_id,
+            telegram_account_id=UUID(account_id),
+            resolved_at=datetime.utcnow(),
+            **peer
+        )
+        stmt = stmt.on_conflict_do_update(
+            constraint="uq_channel_peer_channel_account",
+            set_={
+                "peer_type": stmt.excluded.peer_type,
+                "peer_id": stmt.excluded.peer_id,
+                "access_hash": stmt.excluded.access_hash,
+                "resolved_at": stmt.excluded.resolved_at,
+            }
+        )
+        db.execute(stmt)
+
+    def _prepare_job(self, channel: GlobalChannel, peers: Dict[str, Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """
+        Готовит задание на fetch канала.
+
+        Args:
+            channel: Глобальный канал
+            peers: Кэш resolved peers канала по аккаунтам
+
+        Returns:
+            Dict с параметрами fetch или None, если нет доступного аккаунта
+        """
+        # Аккаунт подписки (если доступен) или наименее загруженный из активных
+        account = telegram_account_scheduler.pick(channel.id)
+        if account is None:
+            return None
+
+        return {
+            "channel": channel,
+            "channel_id": channel.id,
+            "channel_identifier": f"@{channel.username}" if channel.username else channel.tg_id,
+            # Forward cursor: последний собранный tg_message_id (min_id для следующего fetch)
+            "min_id": channel.last_message_id or 0,
+            "account_id": account["account_id"],
+            "session_encrypted": account["session_encrypted"],
+            "peers": peers,
+        }
+
+    def _apply_account_status_changes(self, db: Session):
+        """
+        Сохраняет новые статусы аккаунтов (requires_reauth / banned), обнаруженные при fetch.
+        """
+        changes = telegram_account_scheduler.pop_status_changes()
+        if not changes:
+            return
+
+        try:
+            for account_id, status in changes.items():
+                db.query(TelegramAccount).filter(
+                    TelegramAccount.id == UUID(account_id)
+                ).update({"status": status})
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Failed to update Telegram account statuses: {str(e)}", exc_info=True)
+
+    async def _run_pipeline(
+        self,
+        jobs: List[Dict[str, Any]],
+        db: Session,
+        stats: Dict[str, Any],
+        collected_queue: Optional[asyncio.Queue] = None
+    ):
+        """
+        Параллельный fetch каналов + один writer, который сохраняет результаты в БД.
+        """
+        global_limit = asyncio.Semaphore(self.max_concurrent_fetches)
+        account_limits = defaultdict(lambda: asyncio.Semaphore(self.max_concurrent_fetches_per_account))
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.write_queue_size)
+
+        writer = asyncio.create_task(self._write_results(queue, db, stats, collected_queue))
+
+        try:
+            await asyncio.gather(*(
+                self._fetch_channel(job, global_limit, account_limits, queue)
+                for job in jobs
+            ))
+        finally:
+            # Сигнал writer'у о завершении
+            await queue.put(None)
+            await writer
+
+    async def _fetch_channel(
+        self,
+        job: Dict[str, Any],
+        global_limit: asyncio.Semaphore,
+        account_limits: Dict[str, asyncio.Semaphore],
+        queue: asyncio.Queue
+    ):
+        """
+        Fetch сообщений одного канала (ОДИН раз для всех tenants!).
+        Не трогает БД - результат (или ошибка) передается writer'у.
+        При FloodWait или потере доступа к аккаунту канал переходит к другому аккаунту.
+        """
+        tried_accounts = []
+
+        while True:
+            error = None
+            fetch_result = None
+            account_id = job["account_id"]
+            tried_accounts.append(account_id)
+
+            async with global_limit, account_limits[account_id]:
+                logger.info(f"Fetching channel: {job['channel_identifier']}")
                 try:
-                    telegram_messages = await telegram_service.get_channel_messages(
-                        telegram_account.session_encrypted,
-                        channel_identifier,
-                        limit=100,
-                        offset_id=offset_id
+                    fetch_result = await telegram_service.get_new_channel_messages(
+                        job["session_encrypted"],
+                        job["channel_identifier"],
+                        min_id=job["min_id"],
+                        limit=self.max_catchup_messages,
+                        initial_limit=self.initial_fetch_limit,
+                        account_id=account_id,
+                        peer=job["peers"].get(account_id)
                     )
                 except Exception as e:
                     logger.error(f"Failed to fetch messages from Telegram: {str(e)}")
-                    stats["errors"].append({
-                        "channel_id": str(channel.id),
-                        "channel_identifier": str(channel_identifier),
-                        "error": str(e)
-                    })
-                    continue
-
-                # Сохранить сообщения в global_messages
-                new_messages_count = 0
-                for tg_msg in telegram_messages:
-                    try:
-                        # Извлечь author info
-                        author_tg_id = None
-                        author_username = None
-                        if tg_msg.get("author"):
-                            author_tg_id = tg_msg["author"].get("id")
-                            author_username = tg_msg["author"].get("username")
-
-                        # Создать global message
-                        message = GlobalMessage(
-                            channel_id=channel.id,
-                            tg_message_id=tg_msg["id"],
-                            text=tg_msg.get("text"),
-                            author_tg_id=author_tg_id,
-                            author_username=author_username,
-                            media_type=None,  # TODO: parse media type
-                            sent_at=datetime.fromisoformat(tg_msg["date"]),
-                        )
-
-                        db.add(message)
-                        db.flush()  # Проверить UNIQUE constraint
-                        new_messages_count += 1
-
-                    except IntegrityError:
-                        # Дубликат - это нормально, просто пропускаем
-                        db.rollback()
-                        logger.debug(f"Message {tg_msg['id']} already exists in channel {channel.id}")
-                        continue
-                    except Exception as e:
-                        db.rollback()
-                        logger.error(f"Failed to save message {tg_msg.get('id')}: {str(e)}")
-                        continue
+                    error = e
+
+            if error is None:
+                break
+
+            if isinstance(error, errors.FloodWaitError):
+                telegram_account_scheduler.park(account_id, error.seconds)
+            else:
+                status = account_status_for_error(error)
+                if status is None:
+                    break  # Ошибка канала, а не аккаунта
+                telegram_account_scheduler.disable(account_id, status)
+                await telegram_service.pool.discard(account_id)
 
-                # Commit всех новых сообщений
-                if new_messages_count > 0:
+            # Повторить с другим аккаунтом
+            account = telegram_account_scheduler.pick(job["channel_id"], exclude=tried_accounts)
+            if account is None:
+                break
+            job["account_id"] = account["account_id"]
+            job["session_encrypted"] = account["session_encrypted"]
+
+        await queue.put((job, fetch_result, error))
+
+    async def _write_results(
+        self,
+        queue: asyncio.Queue,
+        db: Session,
+        stats: Dict[str, Any],
+        collected_queue: Optional[asyncio.Queue] = None
+    ):
+        """
+        Единственный DB writer: сохраняет результаты fetch по мере поступления.
+        """
+        while True:
+            item = await queue.get()
+            if item is None:
+                break
+
+            job, fetch_result, error = item
+            channel = job["channel"]
+
+            if error is not None:
+                stats["errors"].append({
+                    "channel_id": str(channel.id),
+                    "channel_identifier": str(job["channel_identifier"]),
+                    "error": str(error)
+                })
+                if is_channel_error(error):
                     try:
+                        self._register_failure(channel, error)
                         db.commit()
-                        logger.info(f"Saved {new_messages_count} new messages from channel {channel.username or channel.tg_id}")
                     except Exception as e:
                         db.rollback()
-                        logger.error(f"Failed to commit messages: {str(e)}")
-                        stats["errors"].append({
-                            "channel_id": str(channel.id),
-                            "error": f"Commit failed: {str(e)}"
-                        })
-                        continue
-
-                # Обновить last_collected_at
-                channel.last_collected_at = datetime.utcnow()
-                if new_messages_count > 0:
-                    channel.last_message_id = telegram_messages[0]["id"]  # Первое сообщение = самое новое
-
-                db.commit()
-
-                stats["channels_processed"] += 1
-                stats["messages_collected"] += new_messages_count
+                        logger.error(f"Failed to record failure of channel {channel.id}: {str(e)}", exc_info=True)
+                continue
 
+            try:
+                if fetch_result.get("peer"):
+                    self._store_peer(job["channel_id"], job["account_id"], fetch_result["peer"], db)
+                new_messages_count = self._save_channel_messages(channel, fetch_result, db)
             except Exception as e:
+                db.rollback()
                 logger.error(f"Error processing channel {channel.id}: {str(e)}", exc_info=True)
                 stats["errors"].append({
                     "channel_id": str(channel.id),
                     "error": str(e)
                 })
+                continue
 
-        logger.info(
-            f"Global message collection completed: "
-            f"processed {stats['channels_processed']} channels, "
-            f"collected {stats['messages_collected']} messages"
-        )
+            stats["channels_processed"] += 1
+            stats["messages_collected"] += new_messages_count
 
-        return stats
+            if collected_queue is not None and new_messages_count:
+                await collected_queue.put(job["channel_id"])
+
+    def _save_channel_messages(
+        self,
+        channel: GlobalChannel,
+        fetch_result: Dict[str, Any],
+        db: Session
+    ) -> int:
+        """
+        Сохраняет сообщения канала в global_messages и сдвигает forward cursor канала.
+
+        Args:
+            channel: Глобальный канал
+            fetch_result: Результат telegram_service.get_new_channel_messages
+            db: Database session
+
+        Returns:
+            Количество новых сообщений
+        """
+        inserted_ids = self.insert_messages(channel.id, fetch_result["messages"], db)
+
+        # Сколько сообщений появилось с прошлого опроса (включая не текстовые)
+        previous_cursor = channel.last_message_id or 0
+        last_message_id = fetch_result["last_message_id"]
+        if previous_cursor and last_message_id:
+            observed_messages = max(last_message_id - previous_cursor, 0)
+        else:
+            observed_messages = len(fetch_result["messages"])
+
+        now = datetime.utcnow()
+        self._schedule_next_poll(channel, observed_messages, now)
+        self._reset_failures(channel)
+
+        # Cursor сдвигается в той же транзакции, что и вставка сообщений
+        channel.last_collected_at = now
+        if last_message_id and last_message_id > previous_cursor:
+            channel.last_message_id = last_message_id
+
+        db.commit()
+
+        if inserted_ids:
+            logger.info(f"Saved {len(inserted_ids)} new messages from channel {channel.username or channel.tg_id}")
+
+        return len(inserted_ids)
+
+    def _schedule_next_poll(self, channel: GlobalChannel, observed_messages: int, now: datetime):
+        """
+        Обновляет частоту сообщений канала и время следующего опроса.
+        - Тихий канал (нет новых сообщений): интервал удваивается до max_poll_interval
+        - Активный канал: интервал ~ target_messages_per_poll / частота, не меньше min_poll_interval
+        """
+        # Без предыдущего cursor'а первый fetch - это история, а не частота
+        if channel.last_collected_at and channel.last_message_id:
+            elapsed_hours = max((now - channel.last_collected_at).total_seconds(), 1) / 3600
+            observed_rate = observed_messages / elapsed_hours
+            if channel.message_rate is None:
+                channel.message_rate = observed_rate
+            else:
+                channel.message_rate = (
+                    self.rate_smoothing * observed_rate
+                    + (1 - self.rate_smoothing) * channel.message_rate
+                )
+
+        if observed_messages == 0:
+            interval = (channel.poll_interval_seconds or self.min_poll_interval) * 2
+        elif channel.message_rate:
+            interval = 3600 * self.target_messages_per_poll / channel.message_rate
+        else:
+            interval = self.min_poll_interval
+
+        interval = int(min(max(interval, self.min_poll_interval), self.max_poll_interval))
+        channel.poll_interval_seconds = interval
+        channel.next_poll_at = now + timedelta(seconds=interval)
+
+    def _register_failure(self, channel: GlobalChannel, error: Exception, now: Optional[datetime] = None):
+        """
+        Учитывает ошибку fetch канала: экспоненциальный backoff, после N ошибок подряд - карантин.
+        Commit выполняет вызывающий код.
+        """
+        now = now or datetime.utcnow()
+        failures = (channel.consecutive_failures or 0) + 1
+
+        channel.consecutive_failures = failures
+        channel.last_error = f"{type(error).__name__}: {error}"
+        channel.last_failure_at = now
+
+        if failures >= self.quarantine_after_failures:
+            if channel.quarantined_at is None:
+                channel.quarantined_at = now
+                logger.warning(
+                    f"Channel {channel.username or channel.tg_id} quarantined after {failures} failures: "
+                    f"{channel.last_error}"
+                )
+            delay = self.quarantine_probe_interval
+        else:
+            delay = min(self.failure_backoff_base * 2 ** (failures - 1), self.failure_backoff_max)
+
+        channel.next_poll_at = now + timedelta(seconds=delay)
+
+    def _reset_failures(self, channel: GlobalChannel):
+        """Успешный fetch закрывает circuit breaker канала."""
+        if not channel.consecutive_failures and channel.quarantined_at is None:
+            return
+
+        if channel.quarantined_at is not None:
+            logger.info(f"Channel {channel.username or channel.tg_id} recovered from quarantine")
+
+        channel.consecutive_failures = 0
+        channel.last_error = None
+        channel.quarantined_at = None
+
+    def insert_messages(
+        self,
+        channel_id: UUID,
+        telegram_messages: List[Dict[str, Any]],
+        db: Session
+    ) -> List[UUID]:
+        """
+        Bulk insert сообщений канала: INSERT ... ON CONFLICT (channel_id, tg_message_id) DO NOTHING RETURNING id.
+        Дубликаты (перекрывающиеся страницы) пропускаются без rollback остальных сообщений.
+        Commit выполняет вызывающий код.
+
+        Args:
+            channel_id: UUID глобального канала
+            telegram_messages: Сообщения из telegram_service
+            db: Database session
+
+        Returns:
+            Список UUID реально вставленных сообщений
+        """
+        rows = [self._message_row(channel_id, tg_msg) for tg_msg in telegram_messages]
+
+        inserted_ids = []
+        for i in range(0, len(rows), INSERT_BATCH_SIZE):
+            stmt = pg_insert(GlobalMessage).values(rows[i:i + INSERT_BATCH_SIZE]).on_conflict_do_nothing(
+                index_elements=["channel_id", "tg_message_id"]
+            ).returning(GlobalMessage.id)
+            inserted_ids.extend(db.execute(stmt).scalars().all())
+
+        return inserted_ids
+
+    def _message_row(self, channel_id: UUID, tg_msg: Dict[str, Any]) -> Dict[str, Any]:
+        """Строка для bulk insert в global_messages."""
+        # Извлечь author info
+        author_tg_id = None
+        author_username = None
+        if tg_msg.get("author"):
+            author_tg_id = tg_msg["author"].get("id")
+            author_username = tg_msg["author"].get("username")
+
+        text = tg_msg.get("text")
+        if text:
+            # PostgreSQL не принимает NUL в text - иначе упадет вся пачка
+            text = text.replace("\x00", "")
+
+        return {
+            "id": uuid.uuid4(),
+            "channel_id": channel_id,
+            "tg_message_id": tg_msg["id"],
+            "text": text,
+            "author_tg_id": author_tg_id,
+            "author_username": author_username,
+            "media_type": None,  # TODO: parse media type
+            "sent_at": datetime.fromisoformat(tg_msg["date"]),
+            "created_at": datetime.utcnow(),
+        }
 
 
 # Глобальный экземпляр сервиса
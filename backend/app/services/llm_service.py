@@ -1,9 +1,10 @@
 """
 LLM Service для анализа сообщений через llm.codenrock.com API.
 """
+import asyncio
 import logging
 import json
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List
 from datetime import datetime, timedelta
 
 import httpx
@@ -13,6 +14,65 @@ from app.config import settings
 
 logger = logging.getLogger(__name__)
 
+# Токены системного промпта и обвязки batch запроса (оценка)
+BATCH_PROMPT_OVERHEAD_TOKENS = 400
+
+# Токены ответа batch запроса: обвязка, вердикт одного сообщения, сущности подходящего сообщения
+BATCH_RESPONSE_OVERHEAD_TOKENS = 400
+BATCH_VERDICT_TOKENS = 120
+ENTITIES_RESPONSE_TOKENS = 400
+
+# Формат сущностей, которые LLM возвращает вместе с вердиктом для подходящих сообщений
+ENTITIES_PROMPT = """{
+        "contacts": ["email, телефон или Telegram username"],
+        "keywords": ["ключевые слова и фразы"],
+        "budget": "бюджет или null",
+        "deadline": "сроки или null",
+        "summary": "краткое описание сути (2-3 предложения)"
+    }"""
+
+
+def fallback_entities(message_text: str) -> Dict[str, Any]:
+    """Сущности без LLM: только краткое описание из начала текста."""
+    return {
+        "contacts": [],
+        "keywords": [],
+        "budget": None,
+        "deadline": None,
+        "summary": message_text[:200] + "..." if len(message_text) > 200 else message_text
+    }
+
+
+def normalize_entities(entities: Any) -> Optional[Dict[str, Any]]:
+    """
+    Приводит сущности из ответа LLM к формату extract_entities (None, если их нет).
+    """
+    if not isinstance(entities, dict):
+        return None
+
+    entities = dict(entities)
+    entities.setdefault("contacts", [])
+    entities.setdefault("keywords", [])
+    entities.setdefault("budget", None)
+    entities.setdefault("deadline", None)
+    entities.setdefault("summary", "")
+    return entities
+
+
+def parse_is_match(value: Any) -> bool:
+    """
+    Строгий разбор is_match из ответа LLM: true/false или строки "true"/"false" (без учета регистра).
+    bool("false") == True, поэтому строковые ответы модели не приводятся через bool().
+
+    Raises:
+        ValueError: значение не является булевым
+    """
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.strip().lower() in ("true", "false"):
+        return value.strip().lower() == "true"
+    raise ValueError(f"Invalid is_match value: {value!r}")
+
 
 class LLMService:
     """
@@ -24,6 +84,12 @@ class LLMService:
         self.api_key = settings.LLM_API_KEY
         self.model = settings.LLM_MODEL
         self.timeout = settings.LLM_TIMEOUT
+        self.batch_max_messages = settings.LLM_BATCH_MAX_MESSAGES
+        self.batch_max_input_tokens = settings.LLM_BATCH_MAX_INPUT_TOKENS
+        self.max_output_tokens = settings.LLM_MAX_OUTPUT_TOKENS
+
+        # Лимит одновременных запросов к LLM API (на каждую попытку retry)
+        self._request_limit = asyncio.Semaphore(settings.LLM_MAX_CONCURRENT_REQUESTS)
 
         # Cache для результатов (in-memory, простая реализация)
         # В production лучше использовать Redis
@@ -92,7 +158,7 @@ class LLMService:
         }
 
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
+            async with self._request_limit, httpx.AsyncClient(timeout=self.timeout) as client:
                 response = await client.post(
                     f"{self.api_url}/v1/chat/completions",
                     headers=headers,
@@ -123,7 +189,8 @@ class LLMService:
             {
                 "is_match": bool,
                 "confidence": float (0.0-1.0),
-                "reasoning": str
+                "reasoning": str,
+                "entities": Dict (формат extract_entities) или None - только для is_match
             }
         """
         # Проверяем кэш
@@ -133,14 +200,18 @@ class LLMService:
             return cached
 
         system_prompt = """Ты - ассистент для анализа сообщений из Telegram.
-Твоя задача - определить, соответствует ли сообщение заданному критерию.
+Твоя задача - определить, соответствует ли сообщение заданному критерию,
+и для подходящего сообщения сразу извлечь из него данные.
 
 ВАЖНО: Отвечай ТОЛЬКО в формате JSON без дополнительного текста:
 {
     "is_match": true/false,
     "confidence": 0.0-1.0,
-    "reasoning": "краткое объяснение (1-2 предложения)"
-}"""
+    "reasoning": "краткое объяснение (1-2 предложения)",
+    "entities": """ + ENTITIES_PROMPT + """
+}
+
+Поле "entities" заполняй ТОЛЬКО если is_match = true, иначе укажи null."""
 
         user_prompt = f"""Критерий поиска:
 {rule_description}
@@ -155,7 +226,7 @@ class LLMService:
                 system_prompt=system_prompt,
                 user_prompt=user_prompt,
                 temperature=0.2,
-                max_tokens=300
+                max_tokens=700
             )
 
             # Парсим JSON ответ
@@ -166,6 +237,9 @@ class LLMService:
             if not all(k in result for k in ["is_match", "confidence", "reasoning"]):
                 raise ValueError("Invalid response structure from LLM")
 
+            result["is_match"] = parse_is_match(result["is_match"])
+            result["entities"] = normalize_entities(result.get("entities")) if result["is_match"] else None
+
             # Сохраняем в кэш
             self._set_cache(cache_key, result)
 
@@ -182,9 +256,329 @@ class LLMService:
             return {
                 "is_match": False,
                 "confidence": 0.0,
-                "reasoning": f"Error parsing LLM response: {str(e)}"
+                "reasoning": f"Error parsing LLM response: {str(e)}",
+                "error": True
             }
 
+    async def analyze_message_multi(
+        self,
+        message_text: str,
+        rule_descriptions: List[str]
+    ) -> List[Dict[str, Any]]:
+        """
+        Анализирует одно сообщение сразу по нескольким правилам одним запросом к LLM.
+
+        Результаты кэшируются по каждому правилу так же, как в analyze_message.
+        Если ответ по какому-то правилу не удалось разобрать - для него
+        выполняется отдельный analyze_message.
+
+        Args:
+            message_text: Текст сообщения из Telegram
+            rule_descriptions: Описания правил (промпты от пользователя)
+
+        Returns:
+            List результатов в порядке rule_descriptions (формат как у analyze_message)
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(rule_descriptions)
+
+        # Проверяем кэш по каждому правилу
+        pending = []
+        for i, rule_description in enumerate(rule_descriptions):
+            cached = self._get_from_cache(self._get_cache_key("analyze", message_text, rule_description))
+            if cached is not None:
+                results[i] = cached
+            else:
+                pending.append(i)
+
+        if len(pending) == 1:
+            results[pending[0]] = await self.analyze_message(message_text, rule_descriptions[pending[0]])
+            pending = []
+
+        if not pending:
+            return results
+
+        system_prompt = """Ты - ассистент для анализа сообщений из Telegram.
+Твоя задача - для КАЖДОГО из пронумерованных критериев независимо определить,
+соответствует ли ему сообщение, и если оно подходит хотя бы одному - извлечь из него данные.
+
+ВАЖНО: Отвечай ТОЛЬКО в формате JSON без дополнительного текста, по одному элементу на критерий:
+{
+    "results": [
+        {
+            "criterion": номер критерия,
+            "is_match": true/false,
+            "confidence": 0.0-1.0,
+            "reasoning": "краткое объяснение (1-2 предложения)"
+        }
+    ],
+    "entities": """ + ENTITIES_PROMPT + """
+}
+
+Поле "entities" заполняй ТОЛЬКО если сообщение подходит хотя бы одному критерию, иначе укажи null."""
+
+        criteria = "\n\n".join(
+            f"Критерий {number}:\n{rule_descriptions[i]}"
+            for number, i in enumerate(pending, start=1)
+        )
+
+        user_prompt = f"""Критерии поиска:
+{criteria}
+
+Анализируемое сообщение:
+{message_text}
+
+Соответствует ли сообщение каждому из критериев? Ответь в формате JSON."""
+
+        try:
+            response = await self._call_llm(
+                system_prompt=system_prompt,
+                user_prompt=user_prompt,
+                temperature=0.2,
+                max_tokens=500 + 150 * len(pending)
+            )
+
+            logger.debug(f"LLM raw response: {response}")
+            parsed = self._parse_indexed_results(response, len(pending), key="criterion")
+
+        except (json.JSONDecodeError, ValueError, KeyError, TypeError) as e:
+            logger.error(f"Failed to parse multi-rule LLM response: {str(e)}")
+            parsed = {}
+
+        for number, i in enumerate(pending, start=1):
+            result = parsed.get(number)
+            if result is None:
+                # Fallback: отдельный запрос по этому правилу
+                result = await self.analyze_message(message_text, rule_descriptions[i])
+            else:
+                self._set_cache(self._get_cache_key("analyze", message_text, rule_descriptions[i]), result)
+            results[i] = result
+
+        logger.info(
+            f"Message analyzed against {len(rule_descriptions)} rules "
+            f"({len(rule_descriptions) - len(pending)} cached): "
+            f"{sum(1 for result in results if result['is_match'])} matches"
+        )
+
+        return results
+
+    async def analyze_messages_batch(
+        self,
+        message_texts: List[str],
+        rule_description: str
+    ) -> List[Dict[str, Any]]:
+        """
+        Анализирует несколько сообщений по одному правилу: до batch_max_messages
+        сообщений в одном запросе к LLM (размер пачки ограничен оценкой токенов).
+
+        Результаты кэшируются по каждому сообщению так же, как в analyze_message.
+        Если ответ по какому-то сообщению не удалось разобрать - для него
+        выполняется отдельный analyze_message. Ошибка запроса одной пачки не отменяет
+        остальные: сообщения этой пачки анализируются по одному.
+
+        Args:
+            message_texts: Тексты сообщений из Telegram
+            rule_description: Описание правила (промпт от пользователя)
+
+        Returns:
+            List результатов в порядке message_texts (формат как у analyze_message);
+            None - запрос к LLM по сообщению не удался (повтор при следующей обработке)
+
+        Raises:
+            Exception: не удался запрос ни по одному из сообщений
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(message_texts)
+
+        # Проверяем кэш по каждому сообщению
+        pending = []
+        for i, message_text in enumerate(message_texts):
+            cached = self._get_from_cache(self._get_cache_key("analyze", message_text, rule_description))
+            if cached is not None:
+                results[i] = cached
+            else:
+                pending.append(i)
+
+        async def analyze_one(i: int):
+            results[i] = await self.analyze_message(message_texts[i], rule_description)
+
+        async def analyze(indices: List[int]):
+            if len(indices) == 1:
+                await analyze_one(indices[0])
+                return
+
+            parsed = await self._analyze_batch([message_texts[i] for i in indices], rule_description)
+
+            for number, i in enumerate(indices, start=1):
+                result = parsed.get(number)
+                if result is None:
+                    # Fallback: отдельный запрос по этому сообщению
+                    await analyze_one(i)
+                else:
+                    self._set_cache(self._get_cache_key("analyze", message_texts[i], rule_description), result)
+                    results[i] = result
+
+        # Пачки отправляются параллельно (в пределах лимита одновременных запросов)
+        batches = [
+            [pending[position] for position in batch]
+            for batch in self._plan_batches([message_texts[i] for i in pending], rule_description)
+        ]
+        outcomes = await asyncio.gather(*(analyze(indices) for indices in batches), return_exceptions=True)
+
+        errors = []
+        for indices, outcome in zip(batches, outcomes):
+            if not isinstance(outcome, Exception):
+                continue
+            # Fallback: сообщения упавшей пачки без результата - по одному
+            logger.error(f"Batch LLM request failed for {len(indices)} messages: {str(outcome)}")
+            retry = [i for i in indices if results[i] is None]
+            errors.extend(
+                error
+                for error in await asyncio.gather(*(analyze_one(i) for i in retry), return_exceptions=True)
+                if isinstance(error, Exception)
+            )
+
+        if errors and all(results[i] is None for i in pending):
+            raise errors[0]
+
+        if len(message_texts) > 1:
+            logger.info(
+                f"Batch of {len(message_texts)} messages analyzed "
+                f"({len(message_texts) - len(pending)} cached, {len(errors)} failed): "
+                f"{sum(1 for result in results if result and result['is_match'])} matches"
+            )
+
+        return results
+
+    async def _analyze_batch(self, message_texts: List[str], rule_description: str) -> Dict[int, Dict[str, Any]]:
+        """
+        Один запрос к LLM по пачке сообщений.
+
+        Returns:
+            {номер сообщения (с 1): результат}; пусто, если ответ не удалось разобрать
+        """
+        system_prompt = """Ты - ассистент для анализа сообщений из Telegram.
+Твоя задача - для КАЖДОГО из пронумерованных сообщений независимо определить,
+соответствует ли оно заданному критерию, и для подходящих сообщений извлечь из них данные.
+
+ВАЖНО: Отвечай ТОЛЬКО в формате JSON без дополнительного текста, по одному элементу на сообщение:
+{
+    "results": [
+        {
+            "index": номер сообщения,
+            "is_match": true/false,
+            "confidence": 0.0-1.0,
+            "reasoning": "краткое объяснение (1-2 предложения)",
+            "entities": """ + ENTITIES_PROMPT + """
+        }
+    ]
+}
+
+Поле "entities" заполняй ТОЛЬКО для подходящих сообщений (is_match = true), иначе укажи null."""
+
+        messages = "\n\n".join(
+            f"Сообщение {number}:\n{message_text}"
+            for number, message_text in enumerate(message_texts, start=1)
+        )
+
+        user_prompt = f"""Критерий поиска:
+{rule_description}
+
+Анализируемые сообщения:
+{messages}
+
+Соответствует ли критерию каждое из сообщений? Ответь в формате JSON."""
+
+        try:
+            response = await self._call_llm(
+                system_prompt=system_prompt,
+                user_prompt=user_prompt,
+                temperature=0.2,
+                max_tokens=self._batch_response_tokens(len(message_texts))
+            )
+
+            logger.debug(f"LLM raw response: {response}")
+            return self._parse_indexed_results(response, len(message_texts), key="index")
+
+        except (json.JSONDecodeError, ValueError, KeyError, TypeError) as e:
+            logger.error(f"Failed to parse batch LLM response: {str(e)}")
+            return {}
+
+    @staticmethod
+    def _batch_response_tokens(count: int) -> int:
+        """Лимит токенов ответа на пачку, если все сообщения подходят (у каждого свои сущности)."""
+        return BATCH_RESPONSE_OVERHEAD_TOKENS + (BATCH_VERDICT_TOKENS + ENTITIES_RESPONSE_TOKENS) * count
+
+    def _plan_batches(self, message_texts: List[str], rule_description: str) -> List[List[int]]:
+        """
+        Делит сообщения на пачки: не больше batch_max_messages сообщений,
+        batch_max_input_tokens токенов промпта (по оценке) и ответ (с сущностями
+        для каждого сообщения) в пределах max_output_tokens.
+
+        Returns:
+            List пачек - позиций в message_texts
+        """
+        budget = (
+            self.batch_max_input_tokens
+            - BATCH_PROMPT_OVERHEAD_TOKENS
+            - self.estimate_tokens(rule_description)
+        )
+        max_messages = max(1, min(
+            self.batch_max_messages,
+            (self.max_output_tokens - BATCH_RESPONSE_OVERHEAD_TOKENS)
+            // (BATCH_VERDICT_TOKENS + ENTITIES_RESPONSE_TOKENS)
+        ))
+
+        batches = []
+        batch: List[int] = []
+        batch_tokens = 0
+        for position, message_text in enumerate(message_texts):
+            tokens = self.estimate_tokens(message_text) + 5  # + заголовок "Сообщение N"
+            if batch and (len(batch) >= max_messages or batch_tokens + tokens > budget):
+                batches.append(batch)
+                batch, batch_tokens = [], 0
+            batch.append(position)
+            batch_tokens += tokens
+
+        if batch:
+            batches.append(batch)
+
+        return batches
+
+    @staticmethod
+    def estimate_tokens(text: str) -> int:
+        """Грубая оценка числа токенов без токенизатора (~3 символа на токен)."""
+        return len(text) // 3 + 1
+
+    def _parse_indexed_results(self, response: str, count: int, key: str) -> Dict[int, Dict[str, Any]]:
+        """
+        Разбирает ответ LLM вида {"results": [{key: N, "is_match", "confidence", "reasoning", "entities"}]}.
+        Сущности берутся из элемента или общего поля "entities" (одно сообщение, несколько критериев).
+        Некорректные элементы пропускаются.
+
+        Returns:
+            {N: {"is_match": bool, "confidence": float, "reasoning": str, "entities": Dict | None}} для N в 1..count
+        """
+        data = json.loads(response)
+        items = data["results"] if isinstance(data, dict) else data
+        shared_entities = data.get("entities") if isinstance(data, dict) else None
+
+        parsed = {}
+        for item in items:
+            try:
+                number = int(item[key])
+                if not 1 <= number <= count:
+                    continue
+                is_match = parse_is_match(item["is_match"])
+                parsed[number] = {
+                    "is_match": is_match,
+                    "confidence": min(max(float(item["confidence"]), 0.0), 1.0),
+                    "reasoning": str(item["reasoning"]),
+                    "entities": normalize_entities(item.get("entities") or shared_entities) if is_match else None
+                }
+            except (KeyError, ValueError, TypeError):
+                continue
+
+        return parsed
+
     async def extract_entities(self, message_text: str) -> Dict[str, Any]:
         """
         Извлекает сущности из сообщения (контакты, ключевые слова, бюджет и т.д.).
@@ -256,13 +650,7 @@ class LLMService:
 
         except (json.JSONDecodeError, ValueError) as e:
             logger.error(f"Failed to parse entity extraction response: {str(e)}")
-            return {
-                "contacts": [],
-                "keywords": [],
-                "budget": None,
-                "deadline": None,
-                "summary": message_text[:200] + "..." if len(message_text) > 200 else message_text
-            }
+            return fallback_entities(message_text)
 
     async def generate_summary(self, message_text: str, max_length: int = 150) -> str:
         """
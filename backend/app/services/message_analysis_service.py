@@ -0,0 +1,111 @@
+"""
+Message Analysis Service - общий кэш результатов LLM анализа в таблице message_analysis.
+Одна классификация (промпт + сообщение + модель) оплачивается один раз для всех tenants,
+перезапусков и реплик worker'а.
+"""
+import hashlib
+import logging
+import uuid
+from datetime import datetime
+from typing import Dict, Any, Iterable, Tuple
+from uuid import UUID
+
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.models.message_analysis import MessageAnalysis
+
+logger = logging.getLogger(__name__)
+
+
+def prompt_hash(prompt: str) -> str:
+    """
+    Hash промпта после нормализации (регистр и пробелы не влияют на ключ).
+    """
+    normalized = " ".join(prompt.lower().split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+class MessageAnalysisService:
+    """
+    Чтение и запись результатов анализа по ключу (prompt_hash, global_message_id, model).
+    """
+
+    def load(
+        self,
+        db: Session,
+        prompt_hashes: Iterable[str],
+        message_ids: Iterable[UUID],
+        model: str
+    ) -> Dict[Tuple[str, UUID], Dict[str, Any]]:
+        """
+        Загружает сохраненные результаты одним запросом.
+
+        Returns:
+            {(prompt_hash, message_id): {"is_match", "confidence", "reasoning", "entities"}}
+        """
+        prompt_hashes = list(set(prompt_hashes))
+        message_ids = list(set(message_ids))
+        if not prompt_hashes or not message_ids:
+            return {}
+
+        rows = db.query(
+            MessageAnalysis.prompt_hash,
+            MessageAnalysis.global_message_id,
+            MessageAnalysis.is_match,
+            MessageAnalysis.confidence,
+            MessageAnalysis.reasoning,
+            MessageAnalysis.entities
+        ).filter(
+            MessageAnalysis.model == model,
+            MessageAnalysis.prompt_hash.in_(prompt_hashes),
+            MessageAnalysis.global_message_id.in_(message_ids)
+        ).all()
+
+        return {
+            (row.prompt_hash, row.global_message_id): {
+                "is_match": row.is_match,
+                "confidence": row.confidence,
+                "reasoning": row.reasoning or "",
+                "entities": row.entities
+            }
+            for row in rows
+        }
+
+    def store(
+        self,
+        db: Session,
+        analyses: Dict[Tuple[str, UUID], Dict[str, Any]],
+        model: str
+    ):
+        """
+        Сохраняет новые результаты (ON CONFLICT DO NOTHING). Commit выполняет вызывающий код.
+        Результаты-заглушки после ошибок разбора ответа LLM не сохраняются.
+        """
+        now = datetime.utcnow()
+        rows = [
+            {
+                "id": uuid.uuid4(),
+                "prompt_hash": hash_,
+                "global_message_id": message_id,
+                "model": model,
+                "is_match": bool(analysis["is_match"]),
+                "confidence": float(analysis["confidence"]),
+                "reasoning": analysis.get("reasoning"),
+                "entities": analysis.get("entities"),
+                "created_at": now,
+            }
+            for (hash_, message_id), analysis in analyses.items()
+            if not analysis.get("error")
+        ]
+        if not rows:
+            return
+
+        stmt = pg_insert(MessageAnalysis).values(rows).on_conflict_do_nothing(
+            constraint="uq_message_analysis_prompt_message_model"
+        )
+        db.execute(stmt)
+
+
+# Глобальный экземпляр сервиса
+message_analysis_service = MessageAnalysisService()
@@ -0,0 +1,247 @@
+"""
+Notification Dispatcher - доставка уведомлений из notification_outbox (email, Telegram).
+Работает отдельно от обработки правил: медленный SMTP или backend не задерживают классификацию.
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Any, List
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import get_session_local
+from app.models.notification_outbox import NotificationOutbox
+from app.services.notification_service import notification_service, DeliverySkipped, PermanentDeliveryError
+
+logger = logging.getLogger(__name__)
+
+
+class NotificationDispatcher:
+    """
+    Забирает due записи outbox и доставляет их.
+
+    - Записи забираются через SELECT ... FOR UPDATE SKIP LOCKED с lease (locked_until):
+      несколько dispatcher'ов не доставляют одну запись одновременно
+    - Перед отправкой lease записи продлевается (только если он еще наш), отправка ограничена
+      send_timeout < lease: запись не может быть забрана другим dispatcher'ом, пока она в полете
+    - До concurrency доставок параллельно
+    - Ошибка - повтор с экспоненциальным backoff, после max_attempts запись помечается failed
+    - Постоянная ошибка (PermanentDeliveryError) - сразу failed, доставка не настроена (DeliverySkipped) - skipped
+    - Idempotency key записи передается получателю (Idempotency-Key / Message-ID)
+    """
+
+    def __init__(
+        self,
+        interval: float = settings.NOTIFICATION_DISPATCH_INTERVAL_SECONDS,
+        batch_size: int = settings.NOTIFICATION_DISPATCH_BATCH_SIZE,
+        concurrency: int = settings.NOTIFICATION_DISPATCH_CONCURRENCY,
+        max_attempts: int = settings.NOTIFICATION_MAX_ATTEMPTS,
+        retry_base: int = settings.NOTIFICATION_RETRY_BASE_SECONDS,
+        retry_max: int = settings.NOTIFICATION_RETRY_MAX_SECONDS,
+        lease: int = settings.NOTIFICATION_LEASE_SECONDS,
+        send_timeout: float = settings.NOTIFICATION_SEND_TIMEOUT_SECONDS,
+    ):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.concurrency = max(concurrency, 1)
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.lease = lease
+        self.send_timeout = min(send_timeout, lease / 2)
+
+        self._wake_event = asyncio.Event()
+        self._task = None
+        self.is_running = False
+
+    def start(self):
+        """
+        Запустить dispatcher (вызывать из работающего event loop).
+        """
+        if self.is_running:
+            logger.warning("Notification dispatcher is already running")
+            return
+
+        logger.info("Starting notification dispatcher")
+        self._task = asyncio.ensure_future(self._dispatch_loop())
+        self.is_running = True
+
+    def stop(self):
+        """Остановить dispatcher (недоставленные записи остаются в outbox)."""
+        if not self.is_running:
+            return
+
+        logger.info("Stopping notification dispatcher...")
+        self._task.cancel()
+        self._task = None
+        self.is_running = False
+
+    def wake(self):
+        """Новые записи в outbox: не ждать следующего интервала."""
+        self._wake_event.set()
+
+    async def _dispatch_loop(self):
+        while True:
+            try:
+                delivered = await self.dispatch_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Notification dispatcher error: {str(e)}", exc_info=True)
+                delivered = 0
+
+            # Полная пачка - сразу следующая, иначе ждем интервал или wake()
+            if delivered < self.batch_size:
+                try:
+                    await asyncio.wait_for(self._wake_event.wait(), timeout=self.interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake_event.clear()
+
+    async def dispatch_once(self) -> int:
+        """
+        Один проход: забрать due записи, доставить, записать результаты.
+
+        Returns:
+            Количество обработанных записей
+        """
+        SessionLocal = get_session_local()
+        db: Session = SessionLocal()
+
+        try:
+            entries = self._claim(db)
+            if not entries:
+                return 0
+
+            limit = asyncio.Semaphore(self.concurrency)
+
+            async def deliver(entry: Dict[str, Any]):
+                async with limit:
+                    entry["final_status"] = None
+                    if not self._renew_lease(db, entry):
+                        # Lease истек, пока запись ждала в очереди - ее мог забрать другой dispatcher
+                        entry["error"] = "lease expired before delivery"
+                        entry["final_status"] = "lease_lost"
+                        return
+                    try:
+                        await asyncio.wait_for(self._deliver(entry), timeout=self.send_timeout)
+                        entry["error"] = None
+                    except DeliverySkipped as e:
+                        entry["error"] = str(e)
+                        entry["final_status"] = "skipped"
+                    except PermanentDeliveryError as e:
+                        entry["error"] = str(e)
+                        entry["final_status"] = "failed"
+                    except Exception as e:
+                        entry["error"] = f"{type(e).__name__}: {str(e)}"
+
+            await asyncio.gather(*(deliver(entry) for entry in entries))
+
+            self._record_results(db, entries)
+
+            sent = sum(1 for entry in entries if entry["error"] is None)
+            logger.info(f"Notification dispatcher: {sent}/{len(entries)} delivered")
+            return len(entries)
+
+        finally:
+            db.close()
+
+    def _claim(self, db: Session) -> List[Dict[str, Any]]:
+        """
+        Забирает due записи под lease. Данные копируются до commit'а (commit expire'ит ORM объекты).
+        """
+        now = datetime.utcnow()
+        rows = db.query(NotificationOutbox).filter(
+            NotificationOutbox.status == "pending",
+            NotificationOutbox.next_attempt_at <= now,
+            or_(NotificationOutbox.locked_until == None, NotificationOutbox.locked_until < now)
+        ).order_by(
+            NotificationOutbox.next_attempt_at.asc()
+        ).limit(self.batch_size).with_for_update(skip_locked=True).all()
+
+        entries = []
+        for row in rows:
+            row.locked_until = now + timedelta(seconds=self.lease)
+            entries.append({
+                "id": row.id,
+                "idempotency_key": row.idempotency_key,
+                "channel": row.channel,
+                "payload": row.payload,
+                "attempts": row.attempts,
+                "locked_until": row.locked_until,
+            })
+
+        db.commit()
+        return entries
+
+    def _renew_lease(self, db: Session, entry: Dict[str, Any]) -> bool:
+        """
+        Продлевает lease записи перед отправкой: conditional UPDATE по locked_until из claim'а.
+        False - lease уже не наш (истек и запись забрал другой dispatcher), отправлять нельзя.
+        """
+        locked_until = datetime.utcnow() + timedelta(seconds=self.lease)
+        renewed = db.query(NotificationOutbox).filter(
+            NotificationOutbox.id == entry["id"],
+            NotificationOutbox.status == "pending",
+            NotificationOutbox.locked_until == entry["locked_until"]
+        ).update({"locked_until": locked_until}, synchronize_session=False)
+        db.commit()
+
+        if renewed:
+            entry["locked_until"] = locked_until
+        return bool(renewed)
+
+    async def _deliver(self, entry: Dict[str, Any]):
+        if entry["channel"] == "email":
+            await notification_service.deliver_new_lead_email(entry["payload"], entry["idempotency_key"])
+        elif entry["channel"] == "telegram":
+            await notification_service.deliver_new_lead_telegram(entry["payload"], entry["idempotency_key"])
+        else:
+            raise ValueError(f"Unknown notification channel '{entry['channel']}'")
+
+    def _record_results(self, db: Session, entries: List[Dict[str, Any]]):
+        """
+        Статусы доставок: sent, повтор с backoff, failed или skipped.
+        Обновляются только записи, lease которых все еще наш.
+        """
+        now = datetime.utcnow()
+        for entry in entries:
+            if entry.get("final_status") == "lease_lost":
+                continue
+
+            attempts = entry["attempts"] + 1
+            values = {"attempts": attempts, "locked_until": None}
+
+            if entry["error"] is None:
+                values.update(status="sent", sent_at=now, last_error=None)
+            elif entry.get("final_status"):
+                values.update(status=entry["final_status"], last_error=entry["error"])
+                logger.warning(
+                    f"Notification {entry['idempotency_key']} {entry['final_status']} without retry: {entry['error']}"
+                )
+            elif attempts >= self.max_attempts:
+                values.update(status="failed", last_error=entry["error"])
+                logger.error(
+                    f"Notification {entry['idempotency_key']} failed after {attempts} attempts: {entry['error']}"
+                )
+            else:
+                delay = min(self.retry_base * 2 ** (attempts - 1), self.retry_max)
+                values.update(next_attempt_at=now + timedelta(seconds=delay), last_error=entry["error"])
+                logger.warning(
+                    f"Notification {entry['idempotency_key']} attempt {attempts} failed, "
+                    f"retry in {delay}s: {entry['error']}"
+                )
+
+            db.query(NotificationOutbox).filter(
+                NotificationOutbox.id == entry["id"],
+                NotificationOutbox.status == "pending",
+                NotificationOutbox.locked_until == entry["locked_until"]
+            ).update(values, synchronize_session=False)
+
+        db.commit()
+
+
+# Глобальный экземпляр dispatcher'а
+notification_dispatcher = NotificationDispatcher()
@@ -3,25 +3,47 @@ Notification Service для создания и отправки уведомл
 Используется Rule Processor'ом и другими частями системы.
 """
 
+import hashlib
 import logging
-from typing import Optional
+import uuid
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
 from uuid import UUID
 
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
 
 from app.models.notification import Notification, NotificationType
+from app.models.notification_outbox import NotificationOutbox
 from app.models.user import User
 from app.models.lead import Lead
 from app.models.rule import Rule
 from app.models.global_message import GlobalMessage
 from app.models.global_channel import GlobalChannel
-from app.services.email_service import email_service
+from app.services.email_service import email_service, is_permanent_email_error
 from app.services.telegram_bot_service import telegram_bot_service
 from app.config import settings
 
 logger = logging.getLogger(__name__)
 
 
+class DeliverySkipped(Exception):
+    """Доставка невозможна по конфигурации (например, SMTP не настроен) - без повторов."""
+
+
+class PermanentDeliveryError(Exception):
+    """Повтор доставки не поможет (отклоненный адрес, 4xx ответ backend'а) - без повторов."""
+
+
+def email_message_id(idempotency_key: str) -> str:
+    """
+    Стабильный Message-ID письма: повторная отправка после сбоя распознается почтовыми клиентами как дубль.
+    """
+    digest = hashlib.sha256(idempotency_key.encode("utf-8")).hexdigest()[:32]
+    domain = settings.SMTP_FROM_EMAIL.split('@')[-1] or "localhost"
+    return f"<{digest}@{domain}>"
+
+
 class NotificationService:
     """
     Сервис для создания уведомлений.
@@ -49,86 +71,187 @@ class NotificationService:
         Returns:
             Notification объект или None если уведомления отключены
         """
-        # Проверить настройки пользователя
-        if not user.notify_on_new_lead:
-            return None
+        items = [(self.new_lead_payload(lead), user)]
 
-        # Получить связанные данные
-        rule = lead.rule
+        notifications = self.add_new_lead_notifications(db, items)
+        self.enqueue_new_lead_deliveries(db, items)
+        db.commit()
+        if notifications:
+            db.refresh(notifications[0])
+
+        return notifications[0] if notifications else None
+
+    @staticmethod
+    def new_lead_payload(lead: Lead) -> Dict[str, Any]:
+        """
+        Данные уведомления о новом лиде из Lead с загруженными relationships.
+        Rule processor собирает такой же dict из данных в памяти, без загрузки лида.
+        """
         global_message = lead.global_message
         channel = global_message.channel if global_message else None
 
-        # Создать заголовок и текст
-        title = f"New Lead Found: {rule.name}"
-        message_text = f"A new lead matching rule '{rule.name}' has been found in {channel.title if channel else 'unknown channel'} with {int(lead.score * 100)}% confidence."
+        return {
+            "lead_id": str(lead.id),
+            "score": float(lead.score),
+            "reasoning": lead.reasoning,
+            "rule_name": lead.rule.name,
+            "source_title": channel.title if channel else None,
+            "message_text": global_message.text if global_message else None,
+            "message_link": global_message.get_telegram_link() if global_message else "",
+        }
+
+    def add_new_lead_notifications(
+        self,
+        db: Session,
+        items: List[Tuple[Dict[str, Any], User]],
+    ) -> List[Notification]:
+        """
+        Добавляет in-app уведомления о новых лидах в сессию. Commit выполняет вызывающий код.
 
-        # Создать in-app уведомление если включено
-        notification = None
-        if user.in_app_notifications_enabled:
+        Args:
+            items: [(payload (см. new_lead_payload), получатель)]
+        """
+        notifications = []
+        for payload, user in items:
+            if not user.notify_on_new_lead or not user.in_app_notifications_enabled:
+                continue
+
+            title, message_text = self._new_lead_texts(payload)
             notification = Notification(
                 tenant_id=user.id,
                 type=NotificationType.LEAD_CREATED,
                 title=title,
                 message=message_text,
-                related_lead_id=lead.id,
+                related_lead_id=UUID(payload["lead_id"]),
                 is_read=False,
             )
             db.add(notification)
-            db.commit()
-            db.refresh(notification)
+            notifications.append(notification)
             logger.info(f"Created in-app notification for user {user.id}: {title}")
 
-        # Отправить email если включено
-        if user.email_notifications_enabled:
-            try:
-                await email_service.send_new_lead_notification(
-                    to_email=user.email,
-                    user_name=user.full_name,
-                    lead_id=str(lead.id),
-                    lead_score=float(lead.score),
-                    lead_reasoning=lead.reasoning or "No reasoning provided",
-                    rule_name=rule.name,
-                    source_title=channel.title if channel else "Unknown channel",
-                    message_preview=global_message.text[:500] if global_message and global_message.text else "No message text",
-                )
-                logger.info(f"Sent email notification to {user.email}: {title}")
-            except Exception as e:
-                logger.error(f"Failed to send email notification to {user.email}: {str(e)}")
+        return notifications
 
-        # Отправить Telegram уведомление если включено
-        if user.telegram_bot_enabled and user.telegram_chat_id:
-            try:
-                lead_url = f"{settings.FRONTEND_URL}/dashboard/leads?lead_id={lead.id}"
-
-                # Получить ссылку на оригинальное сообщение
-                message_link = global_message.get_telegram_link() if global_message else ""
-
-                # HTTP POST к backend endpoint (worker не имеет прямого доступа к telegram_bot_service)
-                import httpx
-                backend_url = getattr(settings, 'BACKEND_URL', 'http://backend:8000')
-
-                async with httpx.AsyncClient() as client:
-                    response = await client.post(
-                        f"{backend_url}/api/internal/telegram/send-notification",
-                        json={
-                            "chat_id": user.telegram_chat_id,
-                            "lead_id": str(lead.id),
-                            "rule_name": rule.name,
-                            "source_title": channel.title if channel else "Unknown channel",
-                            "message_preview": global_message.text if global_message and global_message.text else "No message text",
-                            "lead_url": lead_url,
-                            "score": float(lead.score),
-                            "message_link": message_link
-                        },
-                        timeout=10.0
-                    )
-                    response.raise_for_status()
-
-                logger.info(f"Sent Telegram notification request to backend for user {user.id}")
-            except Exception as e:
-                logger.error(f"Failed to send Telegram notification to user {user.id}: {str(e)}", exc_info=True)
+    def enqueue_new_lead_deliveries(
+        self,
+        db: Session,
+        items: List[Tuple[Dict[str, Any], User]],
+    ):
+        """
+        Записывает email / Telegram доставки в notification_outbox (в транзакции вызывающего кода).
+        Доставляет их NotificationDispatcher; повторная запись того же лида игнорируется.
 
-        return notification
+        Args:
+            items: [(payload (см. new_lead_payload), получатель)]
+        """
+        now = datetime.utcnow()
+        rows = []
+        for payload, user in items:
+            if not user.notify_on_new_lead:
+                continue
+
+            deliveries = []
+            if user.email_notifications_enabled:
+                deliveries.append(("email", {"to_email": user.email, "user_name": user.full_name}))
+            if user.telegram_bot_enabled and user.telegram_chat_id:
+                deliveries.append(("telegram", {"chat_id": user.telegram_chat_id}))
+
+            for channel, recipient in deliveries:
+                rows.append({
+                    "id": uuid.uuid4(),
+                    "idempotency_key": f"new_lead:{payload['lead_id']}:{user.id}:{channel}",
+                    "user_id": user.id,
+                    "lead_id": UUID(payload["lead_id"]),
+                    "channel": channel,
+                    "payload": {**payload, **recipient},
+                    "status": "pending",
+                    "attempts": 0,
+                    "next_attempt_at": now,
+                    "created_at": now,
+                })
+
+        if not rows:
+            return
+
+        stmt = pg_insert(NotificationOutbox).values(rows).on_conflict_do_nothing(
+            index_elements=["idempotency_key"]
+        )
+        db.execute(stmt)
+
+    async def deliver_new_lead_email(self, payload: Dict[str, Any], idempotency_key: str):
+        """
+        Email о новом лиде (вызывается dispatcher'ом). Ошибка доставки - исключение:
+        DeliverySkipped / PermanentDeliveryError не повторяются, остальные - повторяются.
+        """
+        title, _ = self._new_lead_texts(payload)
+        message_text = payload["message_text"]
+
+        if not email_service.is_configured:
+            raise DeliverySkipped("SMTP is not configured")
+
+        try:
+            await email_service.send_new_lead_notification(
+                to_email=payload["to_email"],
+                user_name=payload["user_name"],
+                lead_id=payload["lead_id"],
+                lead_score=payload["score"],
+                lead_reasoning=payload["reasoning"] or "No reasoning provided",
+                rule_name=payload["rule_name"],
+                source_title=payload["source_title"] or "Unknown channel",
+                message_preview=message_text[:500] if message_text else "No message text",
+                message_id=email_message_id(idempotency_key),
+                raise_errors=True,
+            )
+        except Exception as e:
+            if is_permanent_email_error(e):
+                raise PermanentDeliveryError(f"{type(e).__name__}: {str(e)}") from e
+            raise
+
+        logger.info(f"Sent email notification to {payload['to_email']}: {title}")
+
+    async def deliver_new_lead_telegram(self, payload: Dict[str, Any], idempotency_key: str):
+        """
+        Telegram уведомление о новом лиде через backend (вызывается dispatcher'ом).
+        Idempotency-Key позволяет backend'у не отправить повтор после сетевой ошибки.
+        """
+        lead_url = f"{settings.FRONTEND_URL}/dashboard/leads?lead_id={payload['lead_id']}"
+        message_text = payload["message_text"]
+
+        # HTTP POST к backend endpoint (worker не имеет прямого доступа к telegram_bot_service)
+        import httpx
+        backend_url = getattr(settings, 'BACKEND_URL', 'http://backend:8000')
+
+        async with httpx.AsyncClient() as client:
+            response = await client.post(
+                f"{backend_url}/api/internal/telegram/send-notification",
+                json={
+                    "chat_id": payload["chat_id"],
+                    "lead_id": payload["lead_id"],
+                    "rule_name": payload["rule_name"],
+                    "source_title": payload["source_title"] or "Unknown channel",
+                    "message_preview": message_text or "No message text",
+                    "lead_url": lead_url,
+                    "score": payload["score"],
+                    "message_link": payload["message_link"]
+                },
+                headers={"Idempotency-Key": idempotency_key},
+                timeout=10.0
+            )
+            # 4xx (кроме таймаута и rate limit) не исправится повтором того же запроса
+            if 400 <= response.status_code < 500 and response.status_code not in (408, 429):
+                raise PermanentDeliveryError(f"Backend rejected notification: HTTP {response.status_code}")
+            response.raise_for_status()
+
+        logger.info(f"Sent Telegram notification request to backend for chat {payload['chat_id']}")
+
+    @staticmethod
+    def _new_lead_texts(payload: Dict[str, Any]) -> Tuple[str, str]:
+        """Заголовок и текст уведомления о новом лиде."""
+        title = f"New Lead Found: {payload['rule_name']}"
+        message_text = (
+            f"A new lead matching rule '{payload['rule_name']}' has been found in "
+            f"{payload['source_title'] or 'unknown channel'} with {int(payload['score'] * 100)}% confidence."
+        )
+        return title, message_text
 
     async def create_lead_status_change_notification(
         self,
@@ -0,0 +1,227 @@
+"""
+Prefilter Service - дешевый лексический префильтр сообщений перед LLM.
+Ключевые слова всех правил ищутся за один проход по тексту (Aho-Corasick),
+regex-паттерны проверяются только для правил, где они заданы.
+"""
+import logging
+import re
+from collections import deque
+from typing import Dict, Any, List, Set, Iterable, Optional
+from uuid import UUID
+
+logger = logging.getLogger(__name__)
+
+# Слова, которые не используются как ключевые при выводе из промпта
+PROMPT_STOPWORDS = {
+    "ищу", "ищем", "нужен", "нужна", "нужно", "нужны", "который", "которые", "которая", "если",
+    "сообщение", "сообщения", "сообщений", "человек", "люди", "можно", "чтобы", "только", "также",
+    "или", "для", "что", "как", "это", "есть", "быть", "где", "когда", "очень", "любой", "любые",
+    "message", "messages", "looking", "someone", "people", "which", "where", "about", "with", "from",
+    "that", "this", "should", "would", "want", "need",
+}
+
+
+def normalize_text(text: str) -> str:
+    """Нормализация для поиска ключевых слов: нижний регистр, ё -> е."""
+    return text.lower().replace("ё", "е")
+
+
+def derive_keywords(prompt: str, max_keywords: int = 30) -> List[str]:
+    """
+    Ключевые слова из промпта правила: значимые слова, обрезанные до основы (первые 6 букв),
+    чтобы совпадали разные словоформы ("разработчика" -> "разраб").
+    """
+    keywords = []
+    for word in re.findall(r"\w{4,}", normalize_text(prompt)):
+        if word in PROMPT_STOPWORDS or word.isdigit():
+            continue
+        stem = word[:6]
+        if stem not in keywords:
+            keywords.append(stem)
+        if len(keywords) >= max_keywords:
+            break
+    return keywords
+
+
+class KeywordAutomaton:
+    """
+    Автомат Aho-Corasick: находит все ключевые слова в тексте за один проход.
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[Set[int]] = [set()]
+        self.keywords: List[str] = []
+
+        for keyword in keywords:
+            self._add(normalize_text(keyword.strip()))
+        self._build()
+
+    def _add(self, keyword: str):
+        if not keyword:
+            return
+
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(set())
+            state = next_state
+
+        self._output[state].add(len(self.keywords))
+        self.keywords.append(keyword)
+
+    def _build(self):
+        """Вычисляет fail-переходы (BFS по trie)."""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fail_state = self._goto[fail].get(char, 0)
+                # Для детей корня fail-переход всегда в корень
+                self._fail[next_state] = fail_state if fail_state != next_state else 0
+                self._output[next_state] |= self._output[self._fail[next_state]]
+
+    def search(self, text: str) -> Set[int]:
+        """
+        Индексы (в self.keywords) ключевых слов, найденных в нормализованном тексте.
+        """
+        found: Set[int] = set()
+        state = 0
+        for char in text:
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            if self._output[state]:
+                found |= self._output[state]
+        return found
+
+
+class RulePrefilterIndex:
+    """
+    Префильтр для набора правил (например, всех правил канала).
+
+    Конфигурация правила (Rule.prefilter):
+    {
+        "include_keywords": [...],  # хотя бы одно должно встретиться
+        "exclude_keywords": [...],  # ни одно не должно встретиться
+        "include_patterns": [...],  # regex, аналогично include_keywords
+        "exclude_patterns": [...],
+        "derive_from_prompt": bool  # include_keywords из промпта, если не заданы явно
+    }
+    Правило без конфигурации пропускает все сообщения.
+    """
+
+    def __init__(self, targets: Iterable[Dict[str, Any]]):
+        keywords: List[str] = []
+        keyword_ids: Dict[str, int] = {}
+        # keyword index -> [(rule_id, "include" / "exclude")]
+        self._keyword_rules: Dict[int, List[tuple]] = {}
+        self._include_rules: Set[UUID] = set()
+        self._include_patterns: Dict[UUID, List[re.Pattern]] = {}
+        self._exclude_patterns: Dict[UUID, List[re.Pattern]] = {}
+
+        for target in targets:
+            config = target.get("prefilter")
+            if not config:
+                continue
+            rule_id = target["rule_id"]
+
+            include_keywords = list(config.get("include_keywords") or [])
+            if not include_keywords and config.get("derive_from_prompt"):
+                include_keywords = derive_keywords(target["prompt"])
+
+            for kind, rule_keywords in (("include", include_keywords), ("exclude", config.get("exclude_keywords") or [])):
+                for keyword in rule_keywords:
+                    keyword = normalize_text(keyword.strip())
+                    if not keyword:
+                        continue
+                    if keyword not in keyword_ids:
+                        keyword_ids[keyword] = len(keywords)
+                        keywords.append(keyword)
+                    self._keyword_rules.setdefault(keyword_ids[keyword], []).append((rule_id, kind))
+
+            include_patterns = self._compile_patterns(rule_id, config.get("include_patterns"))
+            exclude_patterns = self._compile_patterns(rule_id, config.get("exclude_patterns"))
+
+            # Некорректный паттерн не должен блокировать правило: его include/exclude часть не применяется
+            if include_patterns is not None and (include_keywords or include_patterns):
+                self._include_rules.add(rule_id)
+                if include_patterns:
+                    self._include_patterns[rule_id] = include_patterns
+
+            if exclude_patterns:
+                self._exclude_patterns[rule_id] = exclude_patterns
+
+        self._automaton = KeywordAutomaton(keywords) if keywords else None
+
+    @staticmethod
+    def _compile_patterns(rule_id: UUID, patterns: Optional[List[str]]) -> Optional[List[re.Pattern]]:
+        """
+        Компилирует паттерны по отдельности (как их проверяет схема RulePrefilter:
+        inline флаги вроде (?i) допустимы только в начале выражения, поэтому паттерны не объединяются).
+
+        Returns:
+            Список паттернов; None, если какой-то паттерн некорректен
+        """
+        compiled = []
+        for pattern in patterns or []:
+            try:
+                compiled.append(re.compile(pattern, re.IGNORECASE))
+            except re.error as e:
+                logger.warning(f"Invalid prefilter pattern for rule {rule_id}, ignoring it: '{pattern}': {str(e)}")
+                return None
+        return compiled
+
+    @property
+    def is_empty(self) -> bool:
+        """Ни у одного правила нет префильтра."""
+        return self._automaton is None and not self._include_patterns and not self._exclude_patterns
+
+    def rejected(self, text: str, rule_ids: Optional[Iterable[UUID]] = None) -> Set[UUID]:
+        """
+        Правила, для которых сообщение не проходит префильтр (LLM не нужен).
+
+        Args:
+            text: Текст сообщения
+            rule_ids: Проверять только эти правила (None = все)
+        """
+        if self.is_empty:
+            return set()
+
+        included: Set[UUID] = set()
+        excluded: Set[UUID] = set()
+
+        if self._automaton is not None:
+            for keyword_index in self._automaton.search(normalize_text(text)):
+                for rule_id, kind in self._keyword_rules[keyword_index]:
+                    (included if kind == "include" else excluded).add(rule_id)
+
+        candidates = set(rule_ids) if rule_ids is not None else (
+            self._include_rules | set(self._exclude_patterns) | excluded
+        )
+
+        rejected = set()
+        for rule_id in candidates:
+            if rule_id in excluded:
+                rejected.add(rule_id)
+                continue
+
+            if any(pattern.search(text) for pattern in self._exclude_patterns.get(rule_id, ())):
+                rejected.add(rule_id)
+                continue
+
+            if rule_id in self._include_rules and rule_id not in included:
+                if not any(pattern.search(text) for pattern in self._include_patterns.get(rule_id, ())):
+                    rejected.add(rule_id)
+
+        return rejected
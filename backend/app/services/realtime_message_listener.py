@@ -0,0 +1,351 @@
+"""
+Realtime Message Listener - push-ингест сообщений через Telethon update events.
+Новые сообщения сразу пишутся в global_messages и передаются rule processor'у.
+Polling (MessageCollectorWorkerV2) остается fallback'ом.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Dict, Any, Set, Iterable
+from uuid import UUID
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from telethon import TelegramClient, events, utils
+
+from app.config import settings
+from app.database import get_session_local
+from app.models.channel_subscription import ChannelSubscription
+from app.models.global_channel import GlobalChannel
+from app.models.telegram_account import TelegramAccount
+from app.services.global_message_collector import (
+    global_message_collector,
+    monitored_channel_filter,
+    channel_available_filter,
+)
+from app.services.rule_processor_v2 import rule_processor_v2
+from app.services.telegram_service import telegram_service
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_tg_id(tg_id: int) -> int:
+    """
+    Telegram ID канала без маркера типа (-100... / -...), как entity.id.
+    """
+    if tg_id < 0:
+        real_id, _ = utils.resolve_id(tg_id)
+        return real_id
+    return tg_id
+
+
+class RealtimeMessageListener:
+    """
+    Слушает events.NewMessage на pooled клиентах всех аккаунтов с активными подписками.
+
+    - Supervisor периодически закрепляет (pin) клиентов в пуле и обновляет список каналов
+    - После нового подключения (старт / reconnect) выполняется catch-up fetch через коллектор
+    - Канал считается синхронизированным после успешного catch-up: только тогда
+      realtime события сдвигают его forward cursor, и polling его пропускает
+    - Событие принимается, только если оно продолжает cursor (следующий message id); при пропуске
+      оно отбрасывается, и канал перестает считаться синхронизированным до следующего catch-up
+    """
+
+    def __init__(
+        self,
+        supervise_interval: float = settings.REALTIME_SUPERVISE_INTERVAL_SECONDS,
+        resync_interval: float = settings.REALTIME_RESYNC_INTERVAL_SECONDS,
+        dispatch_delay: float = settings.REALTIME_DISPATCH_DELAY_SECONDS,
+    ):
+        self.supervise_interval = supervise_interval
+        self.resync_interval = resync_interval
+        self.dispatch_delay = dispatch_delay
+
+        self._clients: Dict[str, TelegramClient] = {}  # account_id -> клиент с handler'ом
+        self._channels: Dict[int, UUID] = {}  # normalized tg_id -> GlobalChannel.id
+        self._synced_channels: Set[UUID] = set()
+        self._pending_channels: Set[UUID] = set()
+        self._dispatch_event = asyncio.Event()
+        self._tasks = []
+        self._last_resync_at = 0.0
+        self.is_running = False
+
+    @property
+    def synced_channel_ids(self) -> Set[UUID]:
+        """Каналы, которые сейчас надежно получаются в realtime."""
+        return set(self._synced_channels) if self.is_running else set()
+
+    def start(self):
+        """
+        Запустить listener (вызывать из работающего event loop).
+        """
+        if self.is_running:
+            logger.warning("Realtime message listener is already running")
+            return
+
+        logger.info("Starting realtime message listener")
+        self._tasks = [
+            asyncio.ensure_future(self._supervise_loop()),
+            asyncio.ensure_future(self._dispatch_loop()),
+        ]
+        self.is_running = True
+
+    def stop(self):
+        """Остановить listener."""
+        if not self.is_running:
+            return
+
+        logger.info("Stopping realtime message listener...")
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+        for account_id in list(self._clients):
+            self._detach(account_id)
+            telegram_service.pool.unpin(account_id)
+
+        self._channels = {}
+        self._synced_channels = set()
+        self.is_running = False
+
+    async def _supervise_loop(self):
+        """Периодическая проверка подключений и списка каналов."""
+        while True:
+            try:
+                await self._supervise()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Realtime supervisor error: {str(e)}", exc_info=True)
+
+            await asyncio.sleep(self.supervise_interval)
+
+    async def _supervise(self):
+        """
+        Закрепляет клиентов, подключает handler'ы и делает catch-up для новых/переподключенных каналов.
+        """
+        SessionLocal = get_session_local()
+        db: Session = SessionLocal()
+
+        try:
+            assignments = self._load_assignments(db)
+
+            channels: Dict[int, UUID] = {}
+            need_catch_up: Set[UUID] = set()
+
+            for account_id, assignment in assignments.items():
+                try:
+                    client = await telegram_service.pool.pin(account_id, assignment["session_encrypted"])
+                except Exception as e:
+                    logger.warning(f"Realtime: failed to connect account {account_id}: {str(e)}")
+                    self._detach(account_id)
+                    continue
+
+                if self._clients.get(account_id) is not client:
+                    # Новое подключение - update'ы за время простоя могли быть потеряны
+                    self._detach(account_id)
+                    client.add_event_handler(self._on_new_message, events.NewMessage())
+                    self._clients[account_id] = client
+                    need_catch_up.update(assignment["channels"].values())
+                    logger.info(
+                        f"Realtime: listening on account {account_id} "
+                        f"({len(assignment['channels'])} channels)"
+                    )
+
+                channels.update(assignment["channels"])
+
+            # Аккаунты без активных подписок больше не слушаем
+            for account_id in list(self._clients):
+                if account_id not in assignments:
+                    self._detach(account_id)
+                    telegram_service.pool.unpin(account_id)
+
+            watched = set(channels.values())
+            self._channels = channels
+            self._synced_channels &= watched
+            need_catch_up |= watched - self._synced_channels
+
+            now = time.monotonic()
+            if now - self._last_resync_at >= self.resync_interval:
+                need_catch_up = watched
+                self._last_resync_at = now
+
+            if need_catch_up:
+                await self._catch_up(need_catch_up & watched, db)
+
+        finally:
+            db.close()
+
+    def _load_assignments(self, db: Session) -> Dict[str, Dict[str, Any]]:
+        """
+        Аккаунты и каналы их активных подписок (только каналы, которые мониторят правила).
+        Каналы в backoff/карантине после ошибок не слушаются - их пробует polling по расписанию.
+
+        Returns:
+            {account_id: {"session_encrypted": bytes, "channels": {normalized tg_id: GlobalChannel.id}}}
+        """
+        rows = db.query(
+            TelegramAccount.id,
+            TelegramAccount.session_encrypted,
+            GlobalChannel.id,
+            GlobalChannel.tg_id,
+        ).join(
+            ChannelSubscription, ChannelSubscription.telegram_account_id == TelegramAccount.id
+        ).join(
+            GlobalChannel, GlobalChannel.id == ChannelSubscription.channel_id
+        ).filter(
+            ChannelSubscription.is_active == True,
+            TelegramAccount.status == "active",
+            GlobalChannel.is_active == True,
+            monitored_channel_filter(),
+            channel_available_filter(datetime.utcnow())
+        ).all()
+
+        assignments: Dict[str, Dict[str, Any]] = {}
+        for account_id, session_encrypted, channel_id, tg_id in rows:
+            assignment = assignments.setdefault(str(account_id), {
+                "session_encrypted": session_encrypted,
+                "channels": {},
+            })
+            assignment["channels"][normalize_tg_id(tg_id)] = channel_id
+
+        return assignments
+
+    async def _catch_up(self, channel_ids: Set[UUID], db: Session):
+        """
+        Catch-up fetch каналов с их forward cursor'а; успешные становятся синхронизированными.
+        """
+        if not channel_ids:
+            return
+
+        logger.info(f"Realtime: catch-up fetch for {len(channel_ids)} channels")
+        self._synced_channels -= channel_ids
+
+        result = await global_message_collector.collect_global_messages(db, channel_ids=channel_ids)
+
+        failed = set()
+        for error in result.get("errors", []):
+            if isinstance(error, dict) and error.get("channel_id"):
+                failed.add(UUID(error["channel_id"]))
+
+        self._synced_channels |= channel_ids - failed
+
+        if result.get("messages_collected"):
+            self._mark_pending(channel_ids)
+
+    def _detach(self, account_id: str):
+        """Снять handler с клиента аккаунта."""
+        client = self._clients.pop(account_id, None)
+        if client is not None:
+            client.remove_event_handler(self._on_new_message)
+
+    async def _on_new_message(self, event):
+        """
+        Handler events.NewMessage: пишет сообщение в global_messages сразу.
+
+        Принимаются только события синхронизированных каналов, продолжающие cursor без пропуска.
+        Остальные отбрасываются: их по порядку соберет catch-up/polling, иначе rule processor
+        сдвинул бы cursor правил за новое сообщение и пропустил бы дособранные более ранние.
+        """
+        channel_id = self._channels.get(normalize_tg_id(event.chat_id))
+        if channel_id is None or channel_id not in self._synced_channels:
+            return
+
+        tg_msg = telegram_service.message_to_dict(event.message)
+
+        SessionLocal = get_session_local()
+        db: Session = SessionLocal()
+        inserted_ids = []
+        gap = False
+
+        try:
+            if self._advance_cursor(channel_id, tg_msg["id"], db):
+                if tg_msg["text"]:  # Only text messages for now
+                    inserted_ids = global_message_collector.insert_messages(channel_id, [tg_msg], db)
+            else:
+                gap = self._is_gap(channel_id, tg_msg["id"], db)
+
+            db.commit()
+
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Realtime: failed to save message {tg_msg['id']} from channel {channel_id}: {str(e)}")
+            return
+        finally:
+            db.close()
+
+        if gap:
+            # Пропуск в последовательности: канал снова собирает polling, supervisor сделает catch-up
+            logger.info(f"Realtime: gap before message {tg_msg['id']} in channel {channel_id}, resyncing")
+            self._synced_channels.discard(channel_id)
+
+        if inserted_ids:
+            logger.debug(f"Realtime: message {tg_msg['id']} saved for channel {channel_id}")
+            self._mark_pending({channel_id})
+
+    def _advance_cursor(self, channel_id: UUID, message_id: int, db: Session) -> bool:
+        """
+        Сдвигает forward cursor канала на message_id, если это следующий id (last_message_id + 1).
+        """
+        return bool(db.execute(
+            update(GlobalChannel).where(
+                GlobalChannel.id == channel_id,
+                GlobalChannel.last_message_id == message_id - 1
+            ).values(
+                last_message_id=message_id,
+                last_collected_at=datetime.utcnow()
+            )
+        ).rowcount)
+
+    def _is_gap(self, channel_id: UUID, message_id: int, db: Session) -> bool:
+        """
+        Пропущены ли сообщения между cursor'ом канала и message_id (иначе событие - уже собранный дубль).
+        """
+        last_message_id = db.query(GlobalChannel.last_message_id).filter(
+            GlobalChannel.id == channel_id
+        ).scalar()
+        return last_message_id is None or message_id > last_message_id + 1
+
+    def _mark_pending(self, channel_ids: Iterable[UUID]):
+        """Поставить каналы в очередь на обработку правилами."""
+        self._pending_channels.update(channel_ids)
+        self._dispatch_event.set()
+
+    async def _dispatch_loop(self):
+        """
+        Передает новые сообщения rule processor'у (с небольшой задержкой, чтобы собрать пачку).
+        """
+        while True:
+            await self._dispatch_event.wait()
+            await asyncio.sleep(self.dispatch_delay)
+            self._dispatch_event.clear()
+
+            channel_ids, self._pending_channels = self._pending_channels, set()
+            if not channel_ids:
+                continue
+
+            try:
+                await self._process_channels(channel_ids)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Realtime: rule processing failed: {str(e)}", exc_info=True)
+
+    async def _process_channels(self, channel_ids: Set[UUID]):
+        """
+        Прогоняет новые сообщения каналов через правила подписанных tenants.
+        """
+        SessionLocal = get_session_local()
+        db: Session = SessionLocal()
+
+        try:
+            result = await rule_processor_v2.process_new_messages(db, channel_ids=channel_ids)
+            if result["leads_created"]:
+                logger.info(f"Realtime: created {result['leads_created']} leads")
+        finally:
+            db.close()
+
+
+# Глобальный экземпляр listener'а
+realtime_message_listener = RealtimeMessageListener()
@@ -0,0 +1,226 @@
+"""
+Rule Classifier Service - локальный классификатор правила (TF-IDF + логистическая регрессия),
+обученный на вердиктах LLM и feedback по лидам. Сообщения, которые классификатор уверенно
+считает нерелевантными, не отправляются в LLM; неуверенные идут в LLM как обычно.
+
+Зависимость опциональна (scikit-learn): без нее классификатор выключается.
+"""
+import asyncio
+import logging
+import random
+import time
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Set, Tuple
+from uuid import UUID
+
+from sqlalchemy import and_
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.global_message import GlobalMessage
+from app.models.lead import Lead
+from app.models.rule import Rule
+from app.models.rule_verdict import RuleVerdict
+
+try:
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.model_selection import train_test_split
+    from sklearn.pipeline import make_pipeline
+except ImportError:  # pragma: no cover - опциональная зависимость
+    make_pipeline = None
+
+logger = logging.getLogger(__name__)
+
+# Статусы лидов, которые считаются feedback'ом пользователя
+# (архивация пересчетом threshold - не feedback, см. THRESHOLD_ARCHIVE_REASON)
+POSITIVE_LEAD_STATUSES = ("processed",)
+NEGATIVE_LEAD_STATUSES = ("archived",)
+
+
+class RuleClassifierService:
+    """
+    - Обучающая выборка: вердикты LLM текущей версии промпта (match = is_match и confidence >= threshold),
+      статус лида переопределяет вердикт (processed - positive, archived пользователем - negative)
+    - Agreement: на контрольной выборке (20%) доля отсевов классификатора, с которыми согласны LLM/feedback.
+      Быстрый путь включается только при agreement >= min_agreement
+    - Модели хранятся в памяти (ключ - rule_id и prompt_version), метрики - в rules.classifier_*
+    - Небольшая доля отсевов (audit_rate) все равно идет в LLM, чтобы вердикты продолжали поступать
+    """
+
+    def __init__(
+        self,
+        enabled: bool = settings.RULE_CLASSIFIER_ENABLED,
+        min_samples: int = settings.RULE_CLASSIFIER_MIN_SAMPLES,
+        min_class_samples: int = settings.RULE_CLASSIFIER_MIN_CLASS_SAMPLES,
+        max_samples: int = settings.RULE_CLASSIFIER_MAX_SAMPLES,
+        negative_threshold: float = settings.RULE_CLASSIFIER_NEGATIVE_THRESHOLD,
+        min_agreement: float = settings.RULE_CLASSIFIER_MIN_AGREEMENT,
+        audit_rate: float = settings.RULE_CLASSIFIER_AUDIT_RATE,
+        retrain_interval: float = settings.RULE_CLASSIFIER_RETRAIN_INTERVAL_SECONDS,
+    ):
+        self.enabled = enabled
+        self.min_samples = min_samples
+        self.min_class_samples = min_class_samples
+        self.max_samples = max_samples
+        self.negative_threshold = negative_threshold
+        self.min_agreement = min_agreement
+        self.audit_rate = audit_rate
+        self.retrain_interval = retrain_interval
+
+        # rule_id -> {"prompt_version", "pipeline", "trusted", "checked_at"}
+        self._models: Dict[UUID, Dict[str, Any]] = {}
+
+    @property
+    def is_available(self) -> bool:
+        """Классификатор включен и scikit-learn установлен."""
+        return self.enabled and make_pipeline is not None
+
+    async def refresh(self, db: Session, targets: List[Dict[str, Any]]):
+        """
+        (Пере)обучает модели правил, у которых модели нет, сменилась версия промпта
+        или истек retrain_interval. Обучение выполняется вне event loop.
+        """
+        if not self.is_available:
+            return
+
+        now = time.monotonic()
+        stale = [
+            target for target in targets
+            if (model := self._models.get(target["rule_id"])) is None
+            or model["prompt_version"] != target["prompt_version"]
+            or now - model["checked_at"] >= self.retrain_interval
+        ]
+
+        for target in stale:
+            try:
+                await self._train_rule(db, target)
+            except Exception as e:
+                db.rollback()
+                logger.warning(f"Rule {target['rule_id']}: classifier training failed: {str(e)}")
+
+    async def _train_rule(self, db: Session, target: Dict[str, Any]):
+        """Обучение модели одного правила и сохранение метрик."""
+        texts, labels = self._load_samples(db, target)
+
+        model = {
+            "prompt_version": target["prompt_version"],
+            "pipeline": None,
+            "trusted": False,
+            "checked_at": time.monotonic(),
+        }
+        self._models[target["rule_id"]] = model
+
+        positives = sum(labels)
+        if len(labels) < self.min_samples or min(positives, len(labels) - positives) < self.min_class_samples:
+            return
+
+        pipeline, agreement = await asyncio.to_thread(self._fit, texts, labels)
+
+        model["pipeline"] = pipeline
+        model["trusted"] = agreement is not None and agreement >= self.min_agreement
+
+        db.query(Rule).filter(Rule.id == target["rule_id"]).update({
+            "classifier_samples": len(labels),
+            "classifier_agreement": agreement,
+            "classifier_trained_at": datetime.utcnow(),
+        }, synchronize_session=False)
+        db.commit()
+
+        logger.info(
+            f"Rule {target['rule_id']}: classifier trained on {len(labels)} samples, "
+            f"agreement={agreement}, fast path {'enabled' if model['trusted'] else 'disabled'}"
+        )
+
+    def _load_samples(self, db: Session, target: Dict[str, Any]) -> Tuple[List[str], List[int]]:
+        """
+        Последние вердикты LLM текущей версии промпта с текстами и статусами лидов.
+        """
+        rows = db.query(
+            GlobalMessage.text,
+            RuleVerdict.is_match,
+            RuleVerdict.confidence,
+            Lead.status,
+            Lead.archive_reason
+        ).join(
+            GlobalMessage, GlobalMessage.id == RuleVerdict.global_message_id
+        ).outerjoin(
+            Lead, and_(
+                Lead.rule_id == RuleVerdict.rule_id,
+                Lead.global_message_id == RuleVerdict.global_message_id
+            )
+        ).filter(
+            RuleVerdict.rule_id == target["rule_id"],
+            RuleVerdict.prompt_version == target["prompt_version"],
+            GlobalMessage.text != None
+        ).order_by(
+            RuleVerdict.analyzed_at.desc()
+        ).limit(self.max_samples).all()
+
+        texts, labels = [], []
+        for text, is_match, confidence, lead_status, archive_reason in rows:
+            if lead_status in POSITIVE_LEAD_STATUSES:
+                label = 1
+            elif lead_status in NEGATIVE_LEAD_STATUSES and archive_reason is None:
+                label = 0
+            else:
+                label = int(bool(is_match) and confidence >= target["threshold"])
+            texts.append(text)
+            labels.append(label)
+
+        return texts, labels
+
+    def _fit(self, texts: List[str], labels: List[int]) -> Tuple[Any, Optional[float]]:
+        """
+        Оценивает agreement на контрольной выборке и обучает итоговую модель на всех данных.
+        """
+        train_texts, test_texts, train_labels, test_labels = train_test_split(
+            texts, labels, test_size=0.2, stratify=labels, random_state=0
+        )
+
+        pipeline = self._make_pipeline().fit(train_texts, train_labels)
+        probabilities = pipeline.predict_proba(test_texts)[:, 1]
+
+        skipped = [label for label, p in zip(test_labels, probabilities) if p < self.negative_threshold]
+        agreement = (skipped.count(0) / len(skipped)) if skipped else None
+
+        return self._make_pipeline().fit(texts, labels), agreement
+
+    @staticmethod
+    def _make_pipeline():
+        # Символьные n-граммы устойчивы к русской морфологии и опечаткам
+        return make_pipeline(
+            TfidfVectorizer(analyzer="char_wb", ngram_range=(3, 5), min_df=2, sublinear_tf=True, max_features=50000),
+            LogisticRegression(class_weight="balanced", max_iter=1000)
+        )
+
+    async def rejected(self, work: List[tuple]) -> Set[tuple]:
+        """
+        Пары (rule_id, message_id), которые доверенный классификатор правила уверенно отклоняет.
+
+        Args:
+            work: [(target, item)] - кандидаты на анализ LLM
+        """
+        by_rule: Dict[UUID, List[Dict[str, Any]]] = {}
+        for target, item in work:
+            model = self._models.get(target["rule_id"])
+            if model and model["trusted"] and model["prompt_version"] == target["prompt_version"]:
+                by_rule.setdefault(target["rule_id"], []).append(item)
+
+        if not by_rule:
+            return set()
+
+        return await asyncio.to_thread(self._predict_rejected, by_rule)
+
+    def _predict_rejected(self, by_rule: Dict[UUID, List[Dict[str, Any]]]) -> Set[tuple]:
+        rejected = set()
+        for rule_id, items in by_rule.items():
+            probabilities = self._models[rule_id]["pipeline"].predict_proba([item["text"] for item in items])[:, 1]
+            for item, p in zip(items, probabilities):
+                if p < self.negative_threshold and random.random() >= self.audit_rate:
+                    rejected.add((rule_id, item["id"]))
+        return rejected
+
+
+# Глобальный экземпляр сервиса
+rule_classifier_service = RuleClassifierService()
@@ -2,35 +2,95 @@
 Rule Processor V2 - обработка правил с использованием global_messages и progress tracking.
 Эффективная архитектура для масштабирования на тысячи пользователей.
 """
+import asyncio
 import logging
-from typing import Dict, Any, List
+import uuid
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Dict, Any, List, Optional, Iterable, AsyncIterator
+from uuid import UUID
 from decimal import Decimal
 from datetime import datetime, timedelta
 
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import and_
+from sqlalchemy.orm import Session
+from sqlalchemy import and_, func, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
+from app.config import settings
 from app.models.global_channel import GlobalChannel
-from app.models.global_message import GlobalMessage
+from app.models.global_message import GlobalMessage, telegram_message_link
 from app.models.channel_subscription import ChannelSubscription
 from app.models.rule import Rule
 from app.models.rule_analysis_progress import RuleAnalysisProgress
 from app.models.lead import Lead
+from app.models.tenant import Tenant
 from app.models.user import User
-from app.services.llm_service import llm_service
+from app.services.llm_service import llm_service, fallback_entities
+from app.services.message_analysis_service import message_analysis_service, prompt_hash
+from app.services.prefilter_service import RulePrefilterIndex
+from app.services.embedding_service import embedding_service, np
+from app.services.rule_classifier_service import rule_classifier_service
+from app.services.rule_verdict_service import rule_verdict_service
 from app.services.notification_service import notification_service
+from app.services.notification_dispatcher import notification_dispatcher
 
 logger = logging.getLogger(__name__)
 
+# Новая пара (rule, channel) анализирует историю за этот период
+HISTORY_WINDOW_DAYS = 5
+
+# Сообщений канала за один запрос к global_messages
+MESSAGE_BATCH_SIZE = 100
+
 
 class RuleProcessorV2:
     """
     Процессор правил V2 с эффективным progress tracking.
     - Использует global_messages вместо tenant-specific messages
-    - Отслеживает прогресс через last_analyzed_message_id
+    - Отслеживает прогресс через cursor (last_sent_at, last_tg_message_id)
+    - Cursor'ы и счетчики пачки записываются одним upsert'ом и одним commit'ом
+    - Рабочий набор задачи (progress, получатели уведомлений, существующие лиды) загружается
+      заранее несколькими запросами: в цикле по сообщениям к БД идут только записи
+    - Лиды пачки вставляются одним INSERT ... ON CONFLICT DO NOTHING RETURNING,
+      уведомления собираются из данных в памяти
+    - Email / Telegram уведомления пишутся в notification_outbox в той же транзакции,
+      доставляет их NotificationDispatcher
     - Анализирует только НОВЫЕ сообщения
+
+    Message-centric fan-out:
+    - Строится in-memory индекс channel -> правила (tenant, rule), которым нужен канал
+    - Новые сообщения канала читаются ОДИН раз и проходят через все правила индекса
+    - Запросы к БД растут с количеством новых сообщений, а не tenants x rules x channels
+    - LLM запросы группируются: одно сообщение по нескольким правилам tenant'а
+      или пачка сообщений по одному правилу (см. _classify)
+    - Результаты LLM общие для всех tenants (message_analysis, ключ - hash промпта)
+    - Опциональный лексический префильтр правил (Rule.prefilter) отсеивает сообщения до LLM
+    - Опциональный семантический префильтр: cosine similarity embeddings сообщения и промпта
+    - Опциональный локальный классификатор правила (обучен на вердиктах LLM) отсеивает
+      уверенно нерелевантные сообщения, неуверенные идут в LLM
+
+    Конкурентный режим:
+    - Каналы обрабатываются параллельно (до max_concurrent_channels), LLM запросы
+      пачки отправляются одновременно (общий лимит - LLM_MAX_CONCURRENT_REQUESTS)
+    - Все обращения к Session - под одним db_lock (Session не потокобезопасна)
+    - Лиды и progress канала применяются строго в порядке сообщений, независимо
+      от порядка прихода ответов LLM
     """
 
+    def __init__(
+        self,
+        multi_rule_max_rules: int = settings.LLM_MULTI_RULE_MAX_RULES,
+        max_concurrent_channels: int = settings.RULE_PROCESSOR_MAX_CONCURRENT_CHANNELS,
+        prefilter_enabled: bool = settings.RULE_PREFILTER_ENABLED,
+    ):
+        self.multi_rule_max_rules = max(multi_rule_max_rules, 1)
+        self.max_concurrent_channels = max(max_concurrent_channels, 1)
+        self.prefilter_enabled = prefilter_enabled
+
+        # Один канал не обрабатывается параллельно (worker и realtime listener).
+        # channel_id -> (lock, число держащих и ждущих); запись удаляется, когда lock никому не нужен
+        self._channel_locks: Dict[UUID, list] = {}
+
     async def process_rules_for_tenant(
         self,
         tenant_id: str,
@@ -50,365 +110,880 @@ class RuleProcessorV2:
                 "rules_processed": int,
                 "messages_analyzed": int,
                 "leads_created": int,
+                "prefilter_skipped": {rule_id: int},
                 "lead_ids": List[UUID],
                 "errors": List[str]
             }
         """
+        result = await self.process_new_messages(db, tenant_ids=[tenant_id])
+        return result["tenants"].get(str(tenant_id)) or self._empty_tenant_stats(tenant_id)
+
+    async def process_new_messages(
+        self,
+        db: Session,
+        tenant_ids: Optional[Iterable[UUID]] = None,
+        channel_ids: Optional[Iterable[UUID]] = None,
+        exclude_channel_ids: Optional[Iterable[UUID]] = None
+    ) -> Dict[str, Any]:
+        """
+        Прогоняет новые сообщения каналов через все заинтересованные правила.
+
+        Args:
+            db: Database session
+            tenant_ids: Только правила этих tenants (None = все)
+            channel_ids: Только эти каналы (None = все подписанные)
+            exclude_channel_ids: Пропустить эти каналы (например, уже обработанные в этом цикле)
+
+        Returns:
+            Dict со статистикой:
+            {
+                "channels_processed": int,
+                "messages_analyzed": int,
+                "leads_created": int,
+                "prefilter_skipped": int,
+                "lead_ids": List[UUID],
+                "errors": List[str],
+                "tenants": {tenant_id: статистика tenant'а (см. process_rules_for_tenant)}
+            }
+        """
         stats = {
-            "tenant_id": str(tenant_id),
-            "rules_processed": 0,
+            "channels_processed": 0,
             "messages_analyzed": 0,
             "leads_created": 0,
+            "prefilter_skipped": 0,
             "lead_ids": [],
-            "errors": []
+            "errors": [],
+            "tenants": {}
         }
 
-        # Получить все активные правила tenant'а
-        rules = db.query(Rule).filter(
-            Rule.tenant_id == tenant_id,
-            Rule.is_active == True
-        ).all()
-
-        if not rules:
-            logger.debug(f"No active rules for tenant {tenant_id}")
+        index = self._build_channel_index(
+            db,
+            tenant_ids=tenant_ids,
+            channel_ids=channel_ids,
+            exclude_channel_ids=exclude_channel_ids
+        )
+        if not index:
+            logger.debug("No active rule-channel pairs to process")
             return stats
 
-        logger.info(f"Processing {len(rules)} rules for tenant {tenant_id}")
+        rule_ids_by_tenant = defaultdict(set)
+        for targets in index.values():
+            for target in targets:
+                rule_ids_by_tenant[str(target["tenant_id"])].add(target["rule_id"])
+        for tenant_id, rule_ids in rule_ids_by_tenant.items():
+            tenant_stats = self._empty_tenant_stats(tenant_id)
+            tenant_stats["rules_processed"] = len(rule_ids)
+            stats["tenants"][tenant_id] = tenant_stats
 
-        for rule in rules:
-            try:
-                result = await self._process_rule(
-                    rule=rule,
-                    tenant_id=tenant_id,
-                    db=db
-                )
+        logger.info(
+            f"Processing {len(index)} channels for "
+            f"{sum(len(rule_ids) for rule_ids in rule_ids_by_tenant.values())} rules "
+            f"of {len(rule_ids_by_tenant)} tenants"
+        )
 
-                stats["rules_processed"] += 1
-                stats["messages_analyzed"] += result["messages_analyzed"]
-                stats["leads_created"] += result["leads_created"]
-                stats["lead_ids"].extend(result["lead_ids"])
+        if rule_classifier_service.is_available:
+            rule_targets = {target["rule_id"]: target for targets in index.values() for target in targets}
+            await rule_classifier_service.refresh(db, list(rule_targets.values()))
 
-            except Exception as e:
-                error_msg = f"Error processing rule {rule.id}: {str(e)}"
-                logger.error(error_msg, exc_info=True)
-                stats["errors"].append(error_msg)
+        working_set = self._load_working_set(db, index)
+
+        db_lock = asyncio.Lock()
+        channel_limit = asyncio.Semaphore(self.max_concurrent_channels)
+
+        await asyncio.gather(*(
+            self._run_channel(channel_id, targets, db, db_lock, channel_limit, working_set, stats)
+            for channel_id, targets in index.items()
+        ))
+
+        for tenant_stats in stats["tenants"].values():
+            stats["messages_analyzed"] += tenant_stats["messages_analyzed"]
+            stats["leads_created"] += tenant_stats["leads_created"]
+            stats["prefilter_skipped"] += sum(tenant_stats["prefilter_skipped"].values())
+            stats["lead_ids"].extend(tenant_stats["lead_ids"])
+            stats["errors"].extend(tenant_stats["errors"])
 
         logger.info(
-            f"Tenant {tenant_id} processing complete: "
+            f"Rule processing complete: "
             f"analyzed {stats['messages_analyzed']} messages, "
             f"created {stats['leads_created']} leads"
         )
 
         return stats
 
-    async def _process_rule(
+    def _empty_tenant_stats(self, tenant_id) -> Dict[str, Any]:
+        return {
+            "tenant_id": str(tenant_id),
+            "rules_processed": 0,
+            "messages_analyzed": 0,
+            "leads_created": 0,
+            "prefilter_skipped": {},
+            "lead_ids": [],
+            "errors": []
+        }
+
+    def _build_channel_index(
         self,
-        rule: Rule,
-        tenant_id: str,
-        db: Session
+        db: Session,
+        tenant_ids: Optional[Iterable[UUID]] = None,
+        channel_ids: Optional[Iterable[UUID]] = None,
+        exclude_channel_ids: Optional[Iterable[UUID]] = None
+    ) -> Dict[UUID, List[Dict[str, Any]]]:
+        """
+        Индекс channel_id -> активные правила, которым нужен канал.
+        Учитываются активные подписки tenant'а и Rule.channel_ids
+        (NULL/пустой = все подписанные каналы).
+
+        Поля правил копируются в индекс: commit'ы во время обработки
+        не вызывают повторную загрузку Rule из БД.
+        """
+        query = db.query(Rule, ChannelSubscription.channel_id).join(
+            ChannelSubscription, and_(
+                ChannelSubscription.tenant_id == Rule.tenant_id,
+                ChannelSubscription.is_active == True
+            )
+        ).join(
+            Tenant, Tenant.id == Rule.tenant_id
+        ).join(
+            GlobalChannel, GlobalChannel.id == ChannelSubscription.channel_id
+        ).filter(
+            Rule.is_active == True,
+            Tenant.deleted_at == None,
+            GlobalChannel.is_active == True
+        )
+        if tenant_ids is not None:
+            query = query.filter(Rule.tenant_id.in_(list(tenant_ids)))
+        if channel_ids is not None:
+            query = query.filter(ChannelSubscription.channel_id.in_(list(channel_ids)))
+        if exclude_channel_ids:
+            query = query.filter(ChannelSubscription.channel_id.notin_(list(exclude_channel_ids)))
+
+        targets: Dict[UUID, Dict[str, Any]] = {}
+        index: Dict[UUID, Dict[UUID, Dict[str, Any]]] = defaultdict(dict)
+
+        for rule, channel_id in query.all():
+            target = targets.get(rule.id)
+            if target is None:
+                target = targets[rule.id] = {
+                    "rule_id": rule.id,
+                    "name": rule.name,
+                    "tenant_id": rule.tenant_id,
+                    "prompt": rule.prompt,
+                    "prompt_hash": prompt_hash(rule.prompt),
+                    "prompt_version": rule.prompt_version,
+                    "prefilter": rule.prefilter,
+                    "threshold": float(rule.threshold),
+                    "channel_ids": frozenset(rule.channel_ids or ()),
+                }
+
+            if target["channel_ids"] and channel_id not in target["channel_ids"]:
+                continue
+
+            index[channel_id][rule.id] = target
+
+        return {channel_id: list(channel_targets.values()) for channel_id, channel_targets in index.items()}
+
+    def _load_working_set(
+        self,
+        db: Session,
+        index: Dict[UUID, List[Dict[str, Any]]]
     ) -> Dict[str, Any]:
         """
-        Обрабатывает одно правило для tenant'а.
+        Загружает рабочий набор задачи несколькими bulk запросами.
 
         Returns:
             {
-                "rule_id": UUID,
-                "messages_analyzed": int,
-                "leads_created": int,
-                "lead_ids": List[UUID]
+                "recipients": {tenant_id: User} - получатель уведомлений tenant'а (detached),
+                "channels": {channel_id: {"title", "username", "tg_id"}} - для уведомлений,
+                "existing_leads": {(rule_id, global_message_id)} - лиды по сообщениям после cursor'ов,
+                "embeddings": {global_message_id: np.ndarray} - декодированные embeddings сообщений,
+                    заполняется семантическим префильтром (одно чтение и декодирование на задачу)
             }
         """
-        stats = {
-            "rule_id": str(rule.id),
-            "messages_analyzed": 0,
-            "leads_created": 0,
-            "lead_ids": []
+        channel_ids = list(index.keys())
+        targets = {target["rule_id"]: target for targets in index.values() for target in targets}
+        rule_ids = list(targets.keys())
+        tenant_ids = list({target["tenant_id"] for target in targets.values()})
+
+        # Уведомления получает первый пользователь tenant'а (как и раньше)
+        recipients = {}
+        for user in db.query(User).filter(User.tenant_id.in_(tenant_ids)).order_by(User.created_at.asc()).all():
+            recipients.setdefault(user.tenant_id, user)
+        for user in recipients.values():
+            # Commit'ы в цикле не должны expire'ить пользователей и вызывать их перезагрузку
+            db.expunge(user)
+
+        channels = {
+            channel_id: {"title": title, "username": username, "tg_id": tg_id}
+            for channel_id, title, username, tg_id in db.query(
+                GlobalChannel.id,
+                GlobalChannel.title,
+                GlobalChannel.username,
+                GlobalChannel.tg_id
+            ).filter(GlobalChannel.id.in_(channel_ids)).all()
         }
 
-        # Получить подписки tenant'а на каналы
-        subscriptions = db.query(ChannelSubscription).filter(
-            ChannelSubscription.tenant_id == tenant_id,
-            ChannelSubscription.is_active == True
-        ).all()
+        # Лиды интересны только по сообщениям после самого раннего cursor'а
+        # (сами cursor'ы каналы читают под своей блокировкой, см. _load_channel_cursors)
+        history_start = datetime.utcnow() - timedelta(days=HISTORY_WINDOW_DAYS)
+        oldest_cursor = db.query(func.min(RuleAnalysisProgress.last_sent_at)).filter(
+            RuleAnalysisProgress.rule_id.in_(rule_ids),
+            RuleAnalysisProgress.channel_id.in_(channel_ids)
+        ).scalar()
+        oldest = min(history_start, oldest_cursor) if oldest_cursor else history_start
+
+        existing_leads = set(
+            db.query(Lead.rule_id, Lead.global_message_id).join(
+                GlobalMessage, GlobalMessage.id == Lead.global_message_id
+            ).filter(
+                Lead.rule_id.in_(rule_ids),
+                GlobalMessage.channel_id.in_(channel_ids),
+                GlobalMessage.sent_at >= oldest
+            ).all()
+        )
 
-        if not subscriptions:
-            logger.debug(f"No active subscriptions for tenant {tenant_id}")
-            return stats
+        logger.debug(
+            f"Working set: {len(recipients)} recipients, {len(channels)} channels, "
+            f"{len(existing_leads)} existing leads"
+        )
 
-        # Определяем, какие каналы обрабатывать для этого правила
-        if rule.channel_ids:
-            # Правило применяется только к указанным каналам
-            channels_to_process = rule.channel_ids
-            logger.debug(f"Rule {rule.id}: will process {len(channels_to_process)} specific channels")
-        else:
-            # channel_ids = NULL означает "все подписанные каналы"
-            channels_to_process = None
-            logger.debug(f"Rule {rule.id}: will process all subscribed channels")
-
-        # Обработать каждую подписку (канал)
-        for subscription in subscriptions:
-            channel = subscription.channel
-
-            # Фильтруем каналы по channel_ids правила
-            if channels_to_process is not None and channel.id not in channels_to_process:
-                logger.debug(f"Skipping channel {channel.id} - not in rule.channel_ids")
-                continue
+        return {
+            "recipients": recipients,
+            "channels": channels,
+            "existing_leads": existing_leads,
+            "embeddings": {},
+        }
 
+    async def _run_channel(
+        self,
+        channel_id: UUID,
+        targets: List[Dict[str, Any]],
+        db: Session,
+        db_lock: asyncio.Lock,
+        channel_limit: asyncio.Semaphore,
+        working_set: Dict[str, Any],
+        stats: Dict[str, Any]
+    ):
+        """
+        Обработка одного канала в конкурентном режиме (ошибки не прерывают остальные каналы).
+        """
+        async with channel_limit, self._channel_lock(channel_id):
             try:
-                # Получить прогресс анализа для этого (rule, channel)
-                progress = db.query(RuleAnalysisProgress).filter(
-                    RuleAnalysisProgress.rule_id == rule.id,
-                    RuleAnalysisProgress.channel_id == channel.id
-                ).first()
-
-                # Получить НОВЫЕ сообщения из канала (которые еще не анализировали)
-                query = db.query(GlobalMessage).filter(
-                    GlobalMessage.channel_id == channel.id
-                )
+                await self._process_channel(channel_id, targets, db, db_lock, working_set, stats)
+                stats["channels_processed"] += 1
+            except Exception as e:
+                async with db_lock:
+                    db.rollback()
+                error_msg = f"Error processing channel {channel_id}: {str(e)}"
+                logger.error(error_msg, exc_info=True)
+                for tenant_id in {str(target["tenant_id"]) for target in targets}:
+                    stats["tenants"][tenant_id]["errors"].append(error_msg)
 
-                if progress and progress.last_analyzed_message_id:
-                    # Инкрементальный режим: берем сообщения ПОСЛЕ последнего
-                    last_msg = db.query(GlobalMessage).get(progress.last_analyzed_message_id)
-                    if last_msg:
-                        query = query.filter(
-                            GlobalMessage.sent_at > last_msg.sent_at
-                        )
-                else:
-                    # Новый канал для правила: анализируем историю
-                    # Ограничение: последние 5 дней
-                    five_days_ago = datetime.utcnow() - timedelta(days=5)
-                    query = query.filter(
-                        GlobalMessage.sent_at >= five_days_ago
-                    )
-                    logger.info(
-                        f"New rule-channel pair: analyzing history from last 5 days for "
-                        f"rule {rule.id}, channel {channel.id}"
-                    )
+    @asynccontextmanager
+    async def _channel_lock(self, channel_id: UUID) -> AsyncIterator[None]:
+        """
+        Блокировка канала. Хранится, только пока ее держат или ждут: словарь не растет
+        с каждым когда-либо обработанным каналом.
+        """
+        entry = self._channel_locks.get(channel_id)
+        if entry is None:
+            entry = self._channel_locks[channel_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._channel_locks[channel_id]
+
+    async def _process_channel(
+        self,
+        channel_id: UUID,
+        targets: List[Dict[str, Any]],
+        db: Session,
+        db_lock: asyncio.Lock,
+        working_set: Dict[str, Any],
+        stats: Dict[str, Any]
+    ):
+        """
+        Читает новые сообщения канала одним потоком от самого раннего cursor'а среди правил
+        и передает каждое сообщение правилам, которые его еще не анализировали.
 
-                # Сортировка по sent_at ASC, максимум 100 сообщений за раз
-                new_messages = query.order_by(
-                    GlobalMessage.sent_at.asc()
-                ).limit(100).all()
+        Cursor правила - позиция последнего обработанного сообщения (sent_at, tg_message_id):
+        сообщения с одинаковым sent_at не пропускаются.
+        """
+        history_start = datetime.utcnow() - timedelta(days=HISTORY_WINDOW_DAYS)
 
-                if not new_messages:
-                    continue  # Нет новых сообщений для этого канала
+        prefilter = RulePrefilterIndex(targets) if self.prefilter_enabled else None
 
+        # Cursor'ы читаются заново под блокировкой канала: рабочий набор мог устареть, пока задача ее ждала
+        # (cursor сдвинула другая задача или progress сброшен при смене промпта)
+        async with db_lock:
+            cursors = self._load_channel_cursors(channel_id, targets, db)
+
+        pending = []
+        for target in targets:
+            cursor = cursors.get(target["rule_id"])
+            if cursor is None:
+                # Новая пара (rule, channel): анализируем историю
                 logger.info(
-                    f"Rule {rule.id} / Channel {channel.username or channel.tg_id}: "
-                    f"processing {len(new_messages)} new messages"
+                    f"New rule-channel pair: analyzing history from last {HISTORY_WINDOW_DAYS} days for "
+                    f"rule {target['rule_id']}, channel {channel_id}"
                 )
+                cursor = (history_start, 0)
+            pending.append({"target": target, "cursor": cursor, "progress": self._empty_progress()})
+
+        while pending:
+            async with db_lock:
+                # Сортировка по (sent_at, tg_message_id) ASC, не более MESSAGE_BATCH_SIZE сообщений за раз
+                new_messages = db.query(GlobalMessage).filter(
+                    GlobalMessage.channel_id == channel_id,
+                    tuple_(GlobalMessage.sent_at, GlobalMessage.tg_message_id) > min(pair["cursor"] for pair in pending)
+                ).order_by(
+                    GlobalMessage.sent_at.asc(),
+                    GlobalMessage.tg_message_id.asc()
+                ).limit(MESSAGE_BATCH_SIZE).all()
+
+                # Поля сообщений читаются до первого commit'а (commit expire'ит ORM объекты)
+                batch = [
+                    {
+                        "id": message.id,
+                        "position": (message.sent_at, message.tg_message_id),
+                        "text": message.text
+                    }
+                    for message in new_messages
+                ]
+
+            if not batch:
+                break
+
+            logger.info(f"Channel {channel_id}: processing {len(batch)} new messages for {len(pending)} rules")
+
+            await self._process_window(channel_id, batch, pending, prefilter, db, db_lock, working_set, stats)
+
+            if len(batch) < MESSAGE_BATCH_SIZE:
+                break
+
+            # Следующую пачку получают все правила, кроме остановленных ошибкой LLM
+            pending = [pair for pair in pending if not pair.get("stalled")]
+
+    def _load_channel_cursors(
+        self,
+        channel_id: UUID,
+        targets: List[Dict[str, Any]],
+        db: Session
+    ) -> Dict[UUID, tuple]:
+        """
+        Текущие cursor'ы правил канала из rule_analysis_progress.
 
-                # Анализировать каждое новое сообщение
-                for message in new_messages:
-                    try:
-                        # Проверить: уже есть лид?
-                        existing_lead = db.query(Lead).filter(
-                            Lead.tenant_id == tenant_id,
-                            Lead.global_message_id == message.id,
-                            Lead.rule_id == rule.id
-                        ).first()
-
-                        if existing_lead:
-                            # Лид уже создан (race condition или повторный запуск)
-                            logger.debug(f"Lead already exists for message {message.id} and rule {rule.id}")
-
-                            # Обновляем progress даже если лид существует
-                            self._update_progress(
-                                rule_id=rule.id,
-                                channel_id=channel.id,
-                                last_analyzed_message_id=message.id,
-                                lead_created=False,
-                                db=db,
-                                progress=progress
-                            )
-                            continue
-
-                        # Проверить что сообщение имеет текст
-                        if not message.text:
-                            # Обновляем progress но не создаем лид
-                            self._update_progress(
-                                rule_id=rule.id,
-                                channel_id=channel.id,
-                                last_analyzed_message_id=message.id,
-                                lead_created=False,
-                                db=db,
-                                progress=progress
-                            )
-                            continue
-
-                        stats["messages_analyzed"] += 1
-
-                        # Анализировать через LLM
-                        analysis = await llm_service.analyze_message(
-                            message_text=message.text,
-                            rule_description=rule.prompt
-                        )
-
-                        # Если match и превышает threshold - создать лид
-                        if analysis["is_match"] and analysis["confidence"] >= float(rule.threshold):
-                            lead = await self._create_lead(
-                                tenant_id=tenant_id,
-                                global_message=message,
-                                rule=rule,
-                                analysis=analysis,
-                                db=db
-                            )
-
-                            stats["leads_created"] += 1
-                            stats["lead_ids"].append(lead.id)
-
-                            logger.info(
-                                f"Lead created: global_message_id={message.id}, "
-                                f"rule_id={rule.id}, score={lead.score}"
-                            )
-
-                            # Обновить прогресс (с лидом)
-                            self._update_progress(
-                                rule_id=rule.id,
-                                channel_id=channel.id,
-                                last_analyzed_message_id=message.id,
-                                lead_created=True,
-                                db=db,
-                                progress=progress
-                            )
-                        else:
-                            logger.debug(
-                                f"Message {message.id} does not match rule {rule.id}: "
-                                f"is_match={analysis['is_match']}, confidence={analysis['confidence']}"
-                            )
-
-                            # Обновить прогресс (без лида)
-                            self._update_progress(
-                                rule_id=rule.id,
-                                channel_id=channel.id,
-                                last_analyzed_message_id=message.id,
-                                lead_created=False,
-                                db=db,
-                                progress=progress
-                            )
-
-                    except Exception as e:
-                        logger.error(
-                            f"Error analyzing message {message.id} with rule {rule.id}: {str(e)}",
-                            exc_info=True
-                        )
-                        # Продолжаем со следующим сообщением
+        Returns:
+            {rule_id: (last_sent_at, last_tg_message_id)} - пары без progress отсутствуют
+        """
+        return {
+            rule_id: (last_sent_at, last_tg_message_id or 0)
+            for rule_id, last_sent_at, last_tg_message_id in db.query(
+                RuleAnalysisProgress.rule_id,
+                RuleAnalysisProgress.last_sent_at,
+                RuleAnalysisProgress.last_tg_message_id
+            ).filter(
+                RuleAnalysisProgress.rule_id.in_([target["rule_id"] for target in targets]),
+                RuleAnalysisProgress.channel_id == channel_id,
+                RuleAnalysisProgress.last_sent_at != None
+            ).all()
+        }
 
+    async def _process_window(
+        self,
+        channel_id: UUID,
+        batch: List[Dict[str, Any]],
+        pairs: List[Dict[str, Any]],
+        prefilter: Optional[RulePrefilterIndex],
+        db: Session,
+        db_lock: asyncio.Lock,
+        working_set: Dict[str, Any],
+        stats: Dict[str, Any]
+    ):
+        """
+        Анализирует пачку сообщений канала правилами пар:
+        сначала все LLM запросы пачки (параллельно), затем лиды и progress строго в порядке сообщений.
+        """
+        # Лиды по сообщениям (race condition или повторный запуск) - из рабочего набора
+        existing = working_set["existing_leads"]
+
+        async with db_lock:
+            work = [
+                (pair["target"], item)
+                for item in batch if item["text"]
+                for pair in pairs
+                if pair["cursor"] < item["position"] and (pair["target"]["rule_id"], item["id"]) not in existing
+            ]
+
+            # Префильтр: сообщения, не прошедшие keyword/regex проверку правила, не идут в LLM
+            prefiltered = set()
+            if prefilter is not None and not prefilter.is_empty and work:
+                for item in batch:
+                    if item["text"]:
+                        prefiltered.update((rule_id, item["id"]) for rule_id in prefilter.rejected(item["text"]))
+                work = [
+                    (target, item) for target, item in work
+                    if (target["rule_id"], item["id"]) not in prefiltered
+                ]
+
+        # Семантический префильтр: similarity сообщения и промпта ниже порога - без LLM
+        if work and embedding_service.is_available:
+            try:
+                dissimilar = await self._embedding_rejected(work, db, db_lock, working_set["embeddings"])
             except Exception as e:
-                logger.error(
-                    f"Error processing channel {channel.id} for rule {rule.id}: {str(e)}",
-                    exc_info=True
+                logger.warning(f"Embedding prefilter failed, sending all messages to LLM: {str(e)}")
+                dissimilar = set()
+
+            if dissimilar:
+                prefiltered |= dissimilar
+                work = [
+                    (target, item) for target, item in work
+                    if (target["rule_id"], item["id"]) not in dissimilar
+                ]
+
+        # Локальный классификатор: уверенно нерелевантные сообщения не идут в LLM
+        if work and rule_classifier_service.is_available:
+            try:
+                distilled = await rule_classifier_service.rejected(work)
+            except Exception as e:
+                logger.warning(f"Rule classifier failed, sending all messages to LLM: {str(e)}")
+                distilled = set()
+
+            if distilled:
+                prefiltered |= distilled
+                work = [
+                    (target, item) for target, item in work
+                    if (target["rule_id"], item["id"]) not in distilled
+                ]
+
+        async with db_lock:
+            # Результаты, уже оплаченные любым tenant'ом с таким же промптом
+            shared = message_analysis_service.load(
+                db,
+                prompt_hashes=[target["prompt_hash"] for target, _ in work],
+                message_ids=[item["id"] for _, item in work],
+                model=llm_service.model
+            )
+
+        # Каждая пара (промпт, сообщение) отправляется в LLM один раз
+        to_classify = {}
+        for target, item in work:
+            key = (target["prompt_hash"], item["id"])
+            if key not in shared:
+                to_classify.setdefault(key, (target, item))
+
+        classified = await self._classify(list(to_classify.values()))
+
+        fresh = {}
+        for key, (target, item) in to_classify.items():
+            analysis = classified.get((target["rule_id"], item["id"]))
+            if analysis is not None:
+                fresh[key] = analysis
+
+        if shared or to_classify:
+            logger.debug(
+                f"Channel {channel_id}: {len(work)} analyses needed, {len(shared)} shared, "
+                f"{len(to_classify)} sent to LLM"
+            )
+        shared.update(fresh)
+
+        analyses = {
+            (target["rule_id"], item["id"]): shared[(target["prompt_hash"], item["id"])]
+            for target, item in work
+            if (target["prompt_hash"], item["id"]) in shared
+        }
+
+        # Вердикты всех пар (rule, message) - для пересчета лидов при смене threshold
+        verdicts = [
+            {
+                "rule_id": target["rule_id"],
+                "global_message_id": item["id"],
+                "prompt_version": target["prompt_version"],
+                "is_match": bool(analysis["is_match"]),
+                "confidence": float(analysis["confidence"]),
+                "reasoning": analysis.get("reasoning"),
+            }
+            for target, item in work
+            for analysis in [analyses.get((target["rule_id"], item["id"]))]
+            if analysis is not None and not analysis.get("error")
+        ]
+
+        new_leads = []
+        for item in batch:
+            interested = [
+                pair for pair in pairs
+                if pair["cursor"] < item["position"] and not pair.get("stalled")
+            ]
+            if interested:
+                self._apply_message(item, interested, existing, prefiltered, analyses, new_leads, stats)
+
+        async with db_lock:
+            if fresh or verdicts:
+                try:
+                    message_analysis_service.store(db, fresh, model=llm_service.model)
+                    rule_verdict_service.store(db, verdicts)
+                    db.commit()
+                except Exception as e:
+                    db.rollback()
+                    logger.warning(f"Failed to store analyses and verdicts: {str(e)}")
+
+            # Лиды, уведомления (in-app и outbox), cursor'ы и счетчики пачки - одной транзакцией
+            notifications = self._write_leads(channel_id, new_leads, db, working_set, stats)
+            self._flush_progress(channel_id, pairs, db)
+
+        # Email / Telegram доставляет dispatcher - классификация не ждет доставку
+        if notifications:
+            notification_dispatcher.wake()
+
+    async def _embedding_rejected(
+        self,
+        work: List[tuple],
+        db: Session,
+        db_lock: asyncio.Lock,
+        vectors: Dict[UUID, Any]
+    ) -> set:
+        """
+        Пары (rule_id, message_id), у которых cosine similarity сообщения и промпта ниже порога.
+        Embeddings сообщений вычисляются один раз и сохраняются (message_embeddings);
+        в пределах задачи декодированные векторы берутся из vectors (кэш рабочего набора).
+        """
+        items = list({item["id"]: item for _, item in work}.values())
+        targets = list({target["rule_id"]: target for target, _ in work}.values())
+
+        not_cached = [item["id"] for item in items if item["id"] not in vectors]
+        if not_cached:
+            async with db_lock:
+                vectors.update(embedding_service.load(db, not_cached))
+
+        missing = [item for item in items if item["id"] not in vectors]
+        if missing:
+            encoded = await embedding_service.encode([item["text"] for item in missing])
+            fresh = {item["id"]: vector for item, vector in zip(missing, encoded)}
+            vectors.update(fresh)
+
+            async with db_lock:
+                try:
+                    embedding_service.store(db, fresh)
+                    db.commit()
+                except Exception as e:
+                    db.rollback()
+                    logger.warning(f"Failed to store message embeddings: {str(e)}")
+
+        message_rows = {item["id"]: row for row, item in enumerate(items)}
+        rule_columns = {target["rule_id"]: column for column, target in enumerate(targets)}
+
+        scores = embedding_service.similarity(
+            np.stack([vectors[item["id"]] for item in items]),
+            await embedding_service.prompt_matrix(targets)
+        )
+
+        return {
+            (target["rule_id"], item["id"])
+            for target, item in work
+            if scores[message_rows[item["id"]], rule_columns[target["rule_id"]]] < embedding_service.floor_for(target)
+        }
+
+    def _apply_message(
+        self,
+        item: Dict[str, Any],
+        pairs: List[Dict[str, Any]],
+        existing: set,
+        prefiltered: set,
+        analyses: Dict[tuple, Dict[str, Any]],
+        new_leads: List[Dict[str, Any]],
+        stats: Dict[str, Any]
+    ):
+        """
+        Собирает лиды по результатам анализа сообщения (запись - в _write_leads) и сдвигает progress правил.
+        """
+        message_id = item["id"]
+
+        for pair in pairs:
+            target = pair["target"]
+            rule_id = target["rule_id"]
+            tenant_stats = stats["tenants"][str(target["tenant_id"])]
+            skipped = False
+            rule_key = str(rule_id)
+
+            if (rule_id, message_id) in existing:
+                logger.debug(f"Lead already exists for message {message_id} and rule {rule_id}")
+
+            elif not item["text"]:
+                # Обновляем progress но не создаем лид
+                pass
+
+            elif (rule_id, message_id) in prefiltered:
+                skipped = True
+                tenant_stats["prefilter_skipped"][rule_key] = tenant_stats["prefilter_skipped"].get(rule_key, 0) + 1
+
+            else:
+                analysis = analyses.get((rule_id, message_id))
+                if analysis is None:
+                    # Ошибка LLM: progress правила стоит до следующего запуска
+                    pair["stalled"] = True
+                    continue
+
+                tenant_stats["messages_analyzed"] += 1
+
+                # Если match и превышает threshold - создать лид
+                if analysis["is_match"] and analysis["confidence"] >= target["threshold"]:
+                    new_leads.append({"pair": pair, "item": item, "analysis": analysis})
+                else:
+                    logger.debug(
+                        f"Message {message_id} does not match rule {rule_id}: "
+                        f"is_match={analysis['is_match']}, confidence={analysis['confidence']}"
+                    )
+
+            self._update_progress(pair, item, lead_created=False, prefiltered=skipped)
+
+    async def _classify(self, work: List[tuple]) -> Dict[tuple, Dict[str, Any]]:
+        """
+        Анализирует пары (правило, сообщение) через LLM минимальным числом запросов.
+
+        Для каждого tenant'а выбирается стратегия:
+        - несколько правил на сообщение при небольшом числе сообщений - analyze_message_multi
+          (одно сообщение по всем правилам tenant'а)
+        - иначе analyze_messages_batch (пачка сообщений по одному правилу)
+
+        Returns:
+            {(rule_id, message_id): результат анализа}; пары с ошибкой LLM отсутствуют
+        """
+        by_tenant = defaultdict(list)
+        for target, item in work:
+            by_tenant[target["tenant_id"]].append((target, item))
+
+        analyses = {}
+        requests = []
+        for tenant_work in by_tenant.values():
+            rule_ids = {target["rule_id"] for target, _ in tenant_work}
+            message_ids = {item["id"] for _, item in tenant_work}
+
+            batch_requests = len(rule_ids) * -(-len(message_ids) // llm_service.batch_max_messages)
+            if len(rule_ids) > 1 and len(message_ids) < batch_requests:
+                requests.extend(self._requests_by_message(tenant_work, analyses))
+            else:
+                requests.extend(self._requests_by_rule(tenant_work, analyses))
+
+        # Все запросы сразу: число одновременных вызовов ограничивает llm_service
+        await asyncio.gather(*requests)
+
+        return analyses
+
+    def _requests_by_message(self, work: List[tuple], analyses: Dict[tuple, Dict[str, Any]]) -> List:
+        """Одно сообщение - все правила tenant'а (до multi_rule_max_rules за запрос)."""
+        by_message = defaultdict(list)
+        for target, item in work:
+            by_message[item["id"]].append(target)
+
+        items = {item["id"]: item for _, item in work}
+
+        async def classify(item: Dict[str, Any], chunk: List[Dict[str, Any]]):
+            try:
+                results = await llm_service.analyze_message_multi(
+                    message_text=item["text"],
+                    rule_descriptions=[target["prompt"] for target in chunk]
                 )
-                # Продолжаем со следующим каналом
+            except Exception as e:
+                logger.error(f"LLM analysis failed for message {item['id']}: {str(e)}", exc_info=True)
+                return
 
-        return stats
+            for target, analysis in zip(chunk, results):
+                analyses[(target["rule_id"], item["id"])] = analysis
+
+        return [
+            classify(items[message_id], targets[start:start + self.multi_rule_max_rules])
+            for message_id, targets in by_message.items()
+            for start in range(0, len(targets), self.multi_rule_max_rules)
+        ]
+
+    def _requests_by_rule(self, work: List[tuple], analyses: Dict[tuple, Dict[str, Any]]) -> List:
+        """Одно правило - пачка сообщений (analyze_messages_batch)."""
+        by_rule = defaultdict(list)
+        for target, item in work:
+            by_rule[target["rule_id"]].append((target, item))
+
+        async def classify(target: Dict[str, Any], items: List[Dict[str, Any]]):
+            try:
+                results = await llm_service.analyze_messages_batch(
+                    message_texts=[item["text"] for item in items],
+                    rule_description=target["prompt"]
+                )
+            except Exception as e:
+                logger.error(f"LLM analysis failed for rule {target['rule_id']}: {str(e)}", exc_info=True)
+                return
+
+            for item, analysis in zip(items, results):
+                if analysis is not None:
+                    analyses[(target["rule_id"], item["id"])] = analysis
+
+        return [
+            classify(rule_work[0][0], [item for _, item in rule_work])
+            for rule_work in by_rule.values()
+        ]
+
+    @staticmethod
+    def _empty_progress() -> Dict[str, Any]:
+        return {
+            "last_analyzed_message_id": None,
+            "messages_analyzed": 0,
+            "leads_created": 0,
+            "messages_prefiltered": 0,
+        }
 
     def _update_progress(
         self,
-        rule_id: str,
-        channel_id: str,
-        last_analyzed_message_id: str,
+        pair: Dict[str, Any],
+        item: Dict[str, Any],
         lead_created: bool,
-        db: Session,
-        progress: RuleAnalysisProgress = None
+        prefiltered: bool = False
     ):
         """
-        Обновляет прогресс анализа для пары (rule, channel).
+        Сдвигает cursor правила на сообщение и накапливает счетчики (в памяти до _flush_progress).
         """
-        if not progress:
-            # Создать новый progress
-            progress = RuleAnalysisProgress(
-                rule_id=rule_id,
-                channel_id=channel_id,
-                last_analyzed_message_id=last_analyzed_message_id,
-                last_analyzed_at=datetime.utcnow(),
-                messages_analyzed=1,
-                leads_created=1 if lead_created else 0
-            )
-            db.add(progress)
-        else:
-            # Обновить существующий
-            progress.last_analyzed_message_id = last_analyzed_message_id
-            progress.last_analyzed_at = datetime.utcnow()
-            progress.messages_analyzed += 1
-            if lead_created:
-                progress.leads_created += 1
+        progress = pair["progress"]
+        progress["last_analyzed_message_id"] = item["id"]
+        progress["messages_analyzed"] += 1
+        if lead_created:
+            progress["leads_created"] += 1
+        if prefiltered:
+            progress["messages_prefiltered"] += 1
+        pair["cursor"] = item["position"]
+
+    def _flush_progress(self, channel_id: UUID, pairs: List[Dict[str, Any]], db: Session):
+        """
+        Записывает cursor'ы и счетчики правил канала одним upsert'ом (счетчики прибавляются).
+        """
+        changed = [pair for pair in pairs if pair["progress"]["last_analyzed_message_id"] is not None]
+        if not changed:
+            return
 
+        now = datetime.utcnow()
+        stmt = pg_insert(RuleAnalysisProgress).values([
+            {
+                "id": uuid.uuid4(),
+                "rule_id": pair["target"]["rule_id"],
+                "channel_id": channel_id,
+                "last_sent_at": pair["cursor"][0],
+                "last_tg_message_id": pair["cursor"][1],
+                "last_analyzed_at": now,
+                **pair["progress"],
+            }
+            for pair in changed
+        ])
+        stmt = stmt.on_conflict_do_update(
+            constraint="uq_rule_channel",
+            set_={
+                "last_analyzed_message_id": stmt.excluded.last_analyzed_message_id,
+                "last_sent_at": stmt.excluded.last_sent_at,
+                "last_tg_message_id": stmt.excluded.last_tg_message_id,
+                "last_analyzed_at": stmt.excluded.last_analyzed_at,
+                "messages_analyzed": RuleAnalysisProgress.messages_analyzed + stmt.excluded.messages_analyzed,
+                "leads_created": RuleAnalysisProgress.leads_created + stmt.excluded.leads_created,
+                "messages_prefiltered": RuleAnalysisProgress.messages_prefiltered + stmt.excluded.messages_prefiltered,
+            }
+        )
+
+        db.execute(stmt)
         db.commit()
 
-    async def _create_lead(
+        for pair in changed:
+            pair["progress"] = self._empty_progress()
+
+
+    def _write_leads(
         self,
-        tenant_id: str,
-        global_message: GlobalMessage,
-        rule: Rule,
-        analysis: Dict[str, Any],
-        db: Session
-    ) -> Lead:
+        channel_id: UUID,
+        new_leads: List[Dict[str, Any]],
+        db: Session,
+        working_set: Dict[str, Any],
+        stats: Dict[str, Any]
+    ) -> List[tuple]:
         """
-        Создает лид на основе анализа глобального сообщения.
-
-        Args:
-            tenant_id: UUID tenant'а
-            global_message: Глобальное сообщение
-            rule: Правило, которое сработало
-            analysis: Результат LLM анализа
-            db: Database session
+        Вставляет лиды пачки одним INSERT ... ON CONFLICT DO NOTHING RETURNING, добавляет
+        in-app уведомления и записи notification_outbox. Данные уведомлений собираются из памяти,
+        лиды не перечитываются. Commit выполняет _flush_progress.
 
         Returns:
-            Lead: Созданный лид
+            [(payload, получатель)] созданных уведомлений
         """
-        # Извлекаем сущности из сообщения
-        try:
-            extracted_entities = await llm_service.extract_entities(global_message.text)
-        except Exception as e:
-            logger.warning(f"Failed to extract entities: {str(e)}")
-            extracted_entities = {
-                "contacts": [],
-                "keywords": [],
-                "budget": None,
-                "deadline": None,
-                "summary": global_message.text[:200] + "..." if len(global_message.text) > 200 else global_message.text
+        if not new_leads:
+            return []
+
+        now = datetime.utcnow()
+        rows = {}
+        for lead in new_leads:
+            target, item, analysis = lead["pair"]["target"], lead["item"], lead["analysis"]
+            # Сущности извлечены тем же запросом, что и вердикт - второй запрос к LLM не нужен
+            extracted_entities = analysis.get("entities") or fallback_entities(item["text"])
+            rows[(target["rule_id"], item["id"])] = {
+                "id": uuid.uuid4(),
+                "tenant_id": target["tenant_id"],
+                "global_message_id": item["id"],
+                "rule_id": target["rule_id"],
+                "score": Decimal(str(analysis["confidence"])).quantize(Decimal("0.01")),
+                "reasoning": analysis["reasoning"],
+                "extracted_entities": extracted_entities,
+                "status": "new",
+                "created_at": now,
+                "updated_at": now,
             }
 
-        # Создаем лид с global_message_id
-        lead = Lead(
-            tenant_id=tenant_id,
-            global_message_id=global_message.id,
-            rule_id=rule.id,
-            score=Decimal(str(analysis["confidence"])),
-            reasoning=analysis["reasoning"],
-            extracted_entities=extracted_entities,
-            status="new"
-        )
-
-        db.add(lead)
-        db.commit()
-        db.refresh(lead)
+        stmt = pg_insert(Lead).values(list(rows.values())).on_conflict_do_nothing(
+            constraint="uq_lead_tenant_message_rule"
+        ).returning(Lead.id, Lead.rule_id, Lead.global_message_id)
+        inserted = {(rule_id, message_id): lead_id for lead_id, rule_id, message_id in db.execute(stmt).all()}
+
+        # Лиды, которые уже создал другой процесс, тоже считаются существующими
+        working_set["existing_leads"].update(rows.keys())
+
+        channel = working_set["channels"].get(channel_id) or {}
+        notifications = []
+        for lead in new_leads:
+            pair, item = lead["pair"], lead["item"]
+            target = pair["target"]
+            key = (target["rule_id"], item["id"])
+            if key not in inserted:
+                logger.debug(f"Lead already exists for message {item['id']} and rule {target['rule_id']}")
+                continue
 
-        # Загружаем связанные объекты для уведомления
-        lead = db.query(Lead).options(
-            joinedload(Lead.rule),
-            joinedload(Lead.global_message).joinedload(GlobalMessage.channel)
-        ).filter(Lead.id == lead.id).first()
+            row = rows[key]
+            pair["progress"]["leads_created"] += 1
+            tenant_stats = stats["tenants"][str(target["tenant_id"])]
+            tenant_stats["leads_created"] += 1
+            tenant_stats["lead_ids"].append(row["id"])
 
-        # Получаем пользователя (владельца tenant)
-        user = db.query(User).filter(User.tenant_id == tenant_id).first()
+            logger.info(
+                f"Lead created: global_message_id={item['id']}, "
+                f"rule_id={target['rule_id']}, score={row['score']}"
+            )
 
-        # Создаем уведомление о новом лиде
-        if user:
-            try:
-                await notification_service.create_new_lead_notification(
-                    db=db,
-                    lead=lead,
-                    user=user
+            recipient = working_set["recipients"].get(target["tenant_id"])
+            if recipient is None:
+                logger.warning(
+                    f"No user found for tenant {target['tenant_id']}, notification not sent for lead {row['id']}"
                 )
-                logger.info(f"Notification sent for lead {lead.id} to user {user.id}")
-            except Exception as e:
-                logger.error(f"Failed to create notification for lead {lead.id}: {str(e)}", exc_info=True)
-        else:
-            logger.warning(f"No user found for tenant {tenant_id}, notification not sent for lead {lead.id}")
+                continue
+
+            payload = {
+                "lead_id": str(row["id"]),
+                "score": float(row["score"]),
+                "reasoning": row["reasoning"],
+                "rule_name": target["name"],
+                "source_title": channel.get("title"),
+                "message_text": item["text"],
+                "message_link": telegram_message_link(
+                    channel.get("username"), channel["tg_id"], item["position"][1]
+                ) if channel else "",
+            }
+            notifications.append((payload, recipient))
+
+        notification_service.add_new_lead_notifications(db, notifications)
+        notification_service.enqueue_new_lead_deliveries(db, notifications)
 
-        return lead
+        return notifications
 
 
 # Глобальный экземпляр процессора V2
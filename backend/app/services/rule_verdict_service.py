@@ -0,0 +1,191 @@
+"""
+Rule Verdict Service - хранение вердиктов LLM по парам (rule, message)
+и пересчет лидов при изменении threshold правила (только SQL, без LLM).
+"""
+import logging
+import uuid
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, Any, List
+
+from sqlalchemy import select, exists, and_, or_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session, joinedload
+
+from app.models.global_message import GlobalMessage
+from app.models.lead import Lead
+from app.models.message_analysis import MessageAnalysis
+from app.models.rule import Rule
+from app.models.rule_verdict import RuleVerdict
+from app.models.user import User
+from app.services.llm_service import llm_service, fallback_entities
+from app.services.message_analysis_service import prompt_hash
+from app.services.notification_service import notification_service
+
+logger = logging.getLogger(__name__)
+
+# archive_reason лидов, которые архивировал пересчет threshold (а не пользователь)
+THRESHOLD_ARCHIVE_REASON = "threshold"
+
+
+class RuleVerdictService:
+    """
+    Вердикты сохраняются для каждой проанализированной пары (rule, message),
+    поэтому новый threshold применяется к уже полученным confidence.
+    """
+
+    def store(self, db: Session, verdicts: List[Dict[str, Any]]):
+        """
+        Сохраняет вердикты (upsert по паре rule, message). Commit выполняет вызывающий код.
+
+        Args:
+            verdicts: [{"rule_id", "global_message_id", "prompt_version", "is_match", "confidence", "reasoning"}]
+        """
+        if not verdicts:
+            return
+
+        now = datetime.utcnow()
+        stmt = pg_insert(RuleVerdict).values([
+            {"id": uuid.uuid4(), "analyzed_at": now, **verdict}
+            for verdict in verdicts
+        ])
+        stmt = stmt.on_conflict_do_update(
+            constraint="uq_rule_verdict_rule_message",
+            set_={
+                "prompt_version": stmt.excluded.prompt_version,
+                "is_match": stmt.excluded.is_match,
+                "confidence": stmt.excluded.confidence,
+                "reasoning": stmt.excluded.reasoning,
+                "analyzed_at": stmt.excluded.analyzed_at,
+            }
+        )
+        db.execute(stmt)
+
+    def apply_threshold(self, db: Session, rule: Rule) -> Dict[str, int]:
+        """
+        Пересчитывает лиды правила по сохраненным вердиктам текущей версии промпта:
+        - вердикты выше threshold без лида - создается лид (сущности из message_analysis,
+          in-app уведомление и записи notification_outbox, как у лидов из rule processor)
+        - лиды, архивированные прошлым threshold, снова проходят - возвращаются в new
+        - лиды в статусе new с вердиктом ниже threshold - архивируются с archive_reason = threshold
+        Лиды, с которыми уже работали (in_progress, processed, архивированные пользователем), не меняются.
+        Commit выполняет вызывающий код.
+
+        Returns:
+            {"leads_created": int, "leads_restored": int, "leads_archived": int}
+        """
+        threshold = float(rule.threshold)
+        now = datetime.utcnow()
+
+        current = [
+            RuleVerdict.rule_id == rule.id,
+            RuleVerdict.prompt_version == rule.prompt_version,
+        ]
+        passes = [
+            RuleVerdict.is_match == True,
+            RuleVerdict.confidence >= threshold,
+        ]
+
+        restored = db.query(Lead).filter(
+            Lead.rule_id == rule.id,
+            Lead.status == "archived",
+            Lead.archive_reason == THRESHOLD_ARCHIVE_REASON,
+            Lead.global_message_id.in_(select(RuleVerdict.global_message_id).where(*current, *passes))
+        ).update({"status": "new", "archive_reason": None, "updated_at": now}, synchronize_session=False)
+
+        created = self._create_passing_leads(db, rule, current, passes, now)
+
+        failing = select(RuleVerdict.global_message_id).where(
+            *current,
+            or_(RuleVerdict.is_match == False, RuleVerdict.confidence < threshold)
+        )
+
+        archived = db.query(Lead).filter(
+            Lead.rule_id == rule.id,
+            Lead.status == "new",
+            Lead.global_message_id.in_(failing)
+        ).update(
+            {"status": "archived", "archive_reason": THRESHOLD_ARCHIVE_REASON, "updated_at": now},
+            synchronize_session=False
+        )
+
+        logger.info(
+            f"Rule {rule.id}: threshold {threshold} applied to stored verdicts - "
+            f"{created} leads created, {restored} restored, {archived} archived"
+        )
+
+        return {"leads_created": created, "leads_restored": restored, "leads_archived": archived}
+
+    def _create_passing_leads(self, db: Session, rule: Rule, current: list, passes: list, now: datetime) -> int:
+        """
+        Создает лиды по прошедшим вердиктам без лида и ставит уведомления о них.
+        """
+        rows = db.query(
+            RuleVerdict.global_message_id,
+            RuleVerdict.confidence,
+            RuleVerdict.reasoning,
+            GlobalMessage.text,
+            MessageAnalysis.entities,
+        ).join(
+            GlobalMessage, GlobalMessage.id == RuleVerdict.global_message_id
+        ).outerjoin(
+            MessageAnalysis, and_(
+                MessageAnalysis.global_message_id == RuleVerdict.global_message_id,
+                MessageAnalysis.prompt_hash == prompt_hash(rule.prompt),
+                MessageAnalysis.model == llm_service.model
+            )
+        ).filter(
+            *current,
+            *passes,
+            ~exists().where(
+                Lead.tenant_id == rule.tenant_id,
+                Lead.rule_id == rule.id,
+                Lead.global_message_id == RuleVerdict.global_message_id
+            )
+        ).all()
+
+        if not rows:
+            return 0
+
+        stmt = pg_insert(Lead).values([
+            {
+                "id": uuid.uuid4(),
+                "tenant_id": rule.tenant_id,
+                "global_message_id": global_message_id,
+                "rule_id": rule.id,
+                "score": Decimal(str(confidence)).quantize(Decimal("0.01")),
+                "reasoning": reasoning,
+                # Сущности извлечены вместе с вердиктом; без них - как в rule processor
+                "extracted_entities": entities or fallback_entities(text or ""),
+                "status": "new",
+                "created_at": now,
+                "updated_at": now,
+            }
+            for global_message_id, confidence, reasoning, text, entities in rows
+        ]).on_conflict_do_nothing(
+            constraint="uq_lead_tenant_message_rule"
+        ).returning(Lead.id)
+        lead_ids = [lead_id for lead_id, in db.execute(stmt).all()]
+
+        # Уведомления получает первый пользователь tenant'а (как в rule processor)
+        recipient = db.query(User).filter(
+            User.tenant_id == rule.tenant_id
+        ).order_by(User.created_at.asc()).first()
+
+        if recipient is None:
+            logger.warning(f"No user found for tenant {rule.tenant_id}, notifications not sent for rule {rule.id}")
+        elif lead_ids:
+            leads = db.query(Lead).options(
+                joinedload(Lead.rule),
+                joinedload(Lead.global_message).joinedload(GlobalMessage.channel)
+            ).filter(Lead.id.in_(lead_ids)).all()
+
+            items = [(notification_service.new_lead_payload(lead), recipient) for lead in leads]
+            notification_service.add_new_lead_notifications(db, items)
+            notification_service.enqueue_new_lead_deliveries(db, items)
+
+        return len(lead_ids)
+
+
+# Глобальный экземпляр сервиса
+rule_verdict_service = RuleVerdictService()
@@ -0,0 +1,153 @@
+"""
+Telegram Account Scheduler - распределяет сбор каналов по всем активным Telegram аккаунтам.
+Учитывает FloodWait (аккаунт "паркуется" до конца ожидания) и смену статуса аккаунтов.
+"""
+import logging
+import time
+from collections import Counter, defaultdict
+from typing import Dict, Any, List, Optional, Iterable
+from uuid import UUID
+
+from sqlalchemy.orm import Session
+from telethon import errors
+
+from app.models.channel_subscription import ChannelSubscription
+from app.models.telegram_account import TelegramAccount
+from app.services.telegram_service import telegram_service, TelegramSessionNotAuthorized
+
+logger = logging.getLogger(__name__)
+
+# Ошибки Telegram, после которых аккаунт нельзя использовать
+BANNED_ERRORS = (
+    errors.UserDeactivatedBanError,
+    errors.UserDeactivatedError,
+    errors.PhoneNumberBannedError,
+)
+
+
+def account_status_for_error(error: Exception) -> Optional[str]:
+    """
+    Статус аккаунта, который следует выставить после ошибки fetch.
+
+    Returns:
+        "banned", "requires_reauth" или None (ошибка не связана с аккаунтом)
+    """
+    if isinstance(error, BANNED_ERRORS):
+        return "banned"
+    if isinstance(error, (errors.UnauthorizedError, TelegramSessionNotAuthorized)):
+        return "requires_reauth"
+    return None
+
+
+class TelegramAccountScheduler:
+    """
+    Выбирает аккаунт для fetch каждого канала.
+
+    - Предпочитает аккаунты из активных ChannelSubscription канала
+    - Среди кандидатов выбирает наименее загруженный в текущем цикле
+    - Аккаунт с FloodWaitError паркуется до окончания ожидания
+    - Аккаунты со статусом requires_reauth / banned исключаются (каналы переходят к другим)
+    """
+
+    def __init__(self):
+        self._parked_until: Dict[str, float] = {}  # account_id -> time.monotonic()
+        self._accounts: Dict[str, bytes] = {}  # account_id -> session_encrypted
+        self._preferred: Dict[UUID, List[str]] = {}  # channel_id -> account_ids подписок
+        self._load: Counter = Counter()
+        self._status_changes: Dict[str, str] = {}
+
+    async def refresh(self, db: Session):
+        """
+        Загружает активные аккаунты и предпочтения подписок перед циклом сбора.
+        Клиенты аккаунтов, которые перестали быть активными, закрываются.
+        """
+        accounts = {
+            str(account_id): session_encrypted
+            for account_id, session_encrypted in db.query(
+                TelegramAccount.id,
+                TelegramAccount.session_encrypted
+            ).filter(TelegramAccount.status == "active").all()
+        }
+
+        for account_id in set(self._accounts) - set(accounts):
+            logger.info(f"Telegram account {account_id} is no longer active, rebalancing its channels")
+            await telegram_service.pool.discard(account_id)
+
+        preferred = defaultdict(list)
+        for channel_id, account_id in db.query(
+            ChannelSubscription.channel_id,
+            ChannelSubscription.telegram_account_id
+        ).filter(ChannelSubscription.is_active == True).all():
+            if str(account_id) in accounts:
+                preferred[channel_id].append(str(account_id))
+
+        self._accounts = accounts
+        self._preferred = dict(preferred)
+        self._load = Counter()
+
+    @property
+    def has_accounts(self) -> bool:
+        """Есть ли хотя бы один активный аккаунт."""
+        return bool(self._accounts)
+
+    def pick(self, channel_id: UUID, exclude: Iterable[str] = ()) -> Optional[Dict[str, Any]]:
+        """
+        Выбирает аккаунт для fetch канала.
+
+        Args:
+            channel_id: UUID глобального канала
+            exclude: Аккаунты, которые уже не подошли для этого канала
+
+        Returns:
+            {"account_id": str, "session_encrypted": bytes} или None, если все аккаунты недоступны
+        """
+        excluded = set(exclude)
+        available = [
+            account_id for account_id in self._accounts
+            if account_id not in excluded and not self.is_parked(account_id)
+        ]
+        if not available:
+            return None
+
+        preferred = [account_id for account_id in self._preferred.get(channel_id, []) if account_id in available]
+        candidates = preferred or available
+
+        account_id = min(candidates, key=lambda a: self._load[a])
+        self._load[account_id] += 1
+
+        return {
+            "account_id": account_id,
+            "session_encrypted": self._accounts[account_id],
+        }
+
+    def is_parked(self, account_id: str) -> bool:
+        """Аккаунт ждет окончания FloodWait."""
+        parked_until = self._parked_until.get(account_id)
+        if parked_until is None:
+            return False
+        if parked_until <= time.monotonic():
+            del self._parked_until[account_id]
+            return False
+        return True
+
+    def park(self, account_id: str, seconds: int):
+        """Не использовать аккаунт seconds секунд (FloodWaitError)."""
+        logger.warning(f"Telegram account {account_id} hit FloodWait, parked for {seconds}s")
+        self._parked_until[account_id] = time.monotonic() + seconds
+
+    def disable(self, account_id: str, status: str):
+        """
+        Исключить аккаунт из распределения и запомнить новый статус для записи в БД.
+        """
+        logger.warning(f"Telegram account {account_id} disabled with status '{status}'")
+        self._accounts.pop(account_id, None)
+        self._status_changes[account_id] = status
+
+    def pop_status_changes(self) -> Dict[str, str]:
+        """Новые статусы аккаунтов, накопленные за цикл (account_id -> status)."""
+        changes, self._status_changes = self._status_changes, {}
+        return changes
+
+
+# Глобальный экземпляр планировщика
+telegram_account_scheduler = TelegramAccountScheduler()
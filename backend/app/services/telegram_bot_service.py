@@ -298,6 +298,9 @@ class TelegramBotService:
             message_preview: Превью сообщения
             lead_url: Ссылка на лид в дашборде
             message_link: Ссылка на оригинальное сообщение в Telegram
+
+        Raises:
+            Exception: Ошибка отправки (после логирования)
         """
         if not self.bot:
             self.bot = Bot(token=settings.TELEGRAM_BOT_TOKEN)
@@ -342,6 +345,8 @@ class TelegramBotService:
                 f"Failed to send Telegram notification to chat_id {chat_id}: {str(e)}",
                 exc_info=True
             )
+            # Ошибку получает вызывающий код: доставка из notification_outbox будет повторена
+            raise
 
 
 # Глобальный экземпляр
@@ -1,14 +1,291 @@
-from telethon import TelegramClient
+from telethon import TelegramClient, errors
 from telethon.sessions import StringSession
 from telethon.tl.functions.messages import GetDialogsRequest
-from telethon.tl.types import InputPeerEmpty, Channel, Chat, User as TelegramUser
-from typing import List, Dict, Any, Optional
+from telethon.tl.functions.updates import GetStateRequest
+from telethon.tl.types import (
+    InputPeerEmpty,
+    InputPeerChannel,
+    InputPeerChat,
+    InputPeerUser,
+    Channel,
+    Chat,
+    User as TelegramUser,
+)
+from typing import List, Dict, Any, Optional, AsyncIterator
+from contextlib import asynccontextmanager
 from datetime import datetime
 import asyncio
+import hashlib
+import logging
+import time
 
 from app.config import settings
 from app.utils.encryption import encrypt_session, decrypt_session
 
+logger = logging.getLogger(__name__)
+
+
+class TelegramSessionNotAuthorized(Exception):
+    """
+    Raised when a stored session is no longer authorized (re-auth required).
+    """
+
+
+class _PooledClient:
+    """
+    Long-lived Telegram client of one account plus its pool bookkeeping.
+    """
+
+    def __init__(self, session_encrypted: bytes, max_concurrent_requests: int):
+        self.session_encrypted = session_encrypted
+        self.client: Optional[TelegramClient] = None
+        self.semaphore = asyncio.Semaphore(max_concurrent_requests)
+        self.connect_lock = asyncio.Lock()
+        self.in_use = 0
+        self.pinned = False
+        self.retired = False
+        self.last_used_at = time.monotonic()
+        self.last_health_check_at = 0.0
+
+
+class TelegramClientPool:
+    """
+    Pool of connected Telegram clients keyed by TelegramAccount.
+
+    Each account keeps one client connected between calls, so the MTProto
+    handshake is paid once per account instead of once per request.
+    - Health check (GetState ping) before reuse once the interval has passed
+    - Reconnect with exponential backoff
+    - Idle clients are disconnected after the idle timeout (unless pinned) by a
+      background task started with start() and stopped by close_all()
+    - Concurrent requests per client are capped with a semaphore
+    """
+
+    def __init__(
+        self,
+        api_id: int,
+        api_hash: str,
+        max_concurrent_requests: int = settings.TELEGRAM_POOL_MAX_CONCURRENT_REQUESTS,
+        idle_timeout: float = settings.TELEGRAM_POOL_IDLE_TIMEOUT_SECONDS,
+        health_check_interval: float = settings.TELEGRAM_POOL_HEALTH_CHECK_INTERVAL_SECONDS,
+        reconnect_attempts: int = settings.TELEGRAM_POOL_RECONNECT_ATTEMPTS,
+        reconnect_backoff: float = settings.TELEGRAM_POOL_RECONNECT_BACKOFF_SECONDS,
+        eviction_interval: float = settings.TELEGRAM_POOL_EVICTION_INTERVAL_SECONDS,
+    ):
+        self.api_id = api_id
+        self.api_hash = api_hash
+        self.max_concurrent_requests = max_concurrent_requests
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.reconnect_attempts = reconnect_attempts
+        self.reconnect_backoff = reconnect_backoff
+        self.eviction_interval = eviction_interval
+        self._entries: Dict[str, _PooledClient] = {}
+        self._eviction_task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """
+        Start periodic idle eviction (call from a running event loop).
+        """
+        if self._eviction_task is not None and not self._eviction_task.done():
+            return
+        self._eviction_task = asyncio.ensure_future(self._eviction_loop())
+
+    async def _eviction_loop(self):
+        """Evict idle clients even when nobody calls acquire()."""
+        while True:
+            await asyncio.sleep(self.eviction_interval)
+            try:
+                await self.evict_idle()
+            except Exception as e:
+                logger.error(f"Telegram client pool eviction failed: {str(e)}", exc_info=True)
+
+    @asynccontextmanager
+    async def acquire(self, account_key: str, session_encrypted: bytes) -> AsyncIterator[TelegramClient]:
+        """
+        Borrow the connected client of an account.
+
+        Args:
+            account_key: Pool key (TelegramAccount id)
+            session_encrypted: Encrypted session data of the account
+
+        Yields:
+            Authorized TelegramClient (must not be disconnected by the caller)
+        """
+        await self.evict_idle()
+
+        entry = await self._get_entry(account_key, session_encrypted)
+
+        entry.in_use += 1
+        try:
+            async with entry.semaphore:
+                try:
+                    client = await self._ensure_connected(entry)
+                except Exception:
+                    # Do not keep a broken entry around (e.g. revoked session)
+                    await self._retire(account_key, entry)
+                    raise
+                entry.last_used_at = time.monotonic()
+                yield client
+        finally:
+            entry.in_use -= 1
+            entry.last_used_at = time.monotonic()
+            if entry.retired and entry.in_use == 0:
+                await self._disconnect(entry)
+
+    async def pin(self, account_key: str, session_encrypted: bytes) -> TelegramClient:
+        """
+        Keep the client of an account connected regardless of idle time
+        (used by realtime listeners that wait for update events).
+
+        Returns:
+            Connected TelegramClient. It may be replaced after a reconnect,
+            so callers should call pin() periodically and compare identities.
+        """
+        entry = await self._get_entry(account_key, session_encrypted)
+        entry.pinned = True
+        try:
+            return await self._ensure_connected(entry)
+        except Exception:
+            await self._retire(account_key, entry)
+            raise
+
+    def unpin(self, account_key: str):
+        """
+        Allow the client of an account to be evicted when idle again.
+        """
+        entry = self._entries.get(account_key)
+        if entry is not None:
+            entry.pinned = False
+            entry.last_used_at = time.monotonic()
+
+    async def discard(self, account_key: str):
+        """
+        Drop the client of an account (e.g. after the account was banned).
+        """
+        entry = self._entries.get(account_key)
+        if entry is not None:
+            await self._retire(account_key, entry)
+
+    async def evict_idle(self):
+        """
+        Disconnect clients that have not been used for idle_timeout seconds.
+        """
+        now = time.monotonic()
+        for account_key, entry in list(self._entries.items()):
+            if entry.pinned or entry.in_use:
+                continue
+            if now - entry.last_used_at > self.idle_timeout:
+                logger.info(f"Evicting idle Telegram client for account {account_key}")
+                await self._retire(account_key, entry)
+
+    async def close_all(self):
+        """
+        Stop idle eviction and disconnect all pooled clients (on shutdown).
+        """
+        if self._eviction_task is not None:
+            self._eviction_task.cancel()
+            self._eviction_task = None
+
+        for account_key, entry in list(self._entries.items()):
+            await self._retire(account_key, entry)
+
+    async def _get_entry(self, account_key: str, session_encrypted: bytes) -> _PooledClient:
+        """
+        Get the pool entry of an account, creating it if needed.
+        """
+        entry = self._entries.get(account_key)
+        if entry is None or entry.session_encrypted != session_encrypted:
+            if entry is not None:
+                # Session was replaced (re-auth) - retire the old client
+                await self._retire(account_key, entry)
+            entry = _PooledClient(session_encrypted, self.max_concurrent_requests)
+            self._entries[account_key] = entry
+        return entry
+
+    async def _ensure_connected(self, entry: _PooledClient) -> TelegramClient:
+        """
+        Return a healthy connected client, reconnecting if necessary.
+        """
+        async with entry.connect_lock:
+            client = entry.client
+            if client is not None and client.is_connected():
+                now = time.monotonic()
+                if now - entry.last_health_check_at < self.health_check_interval:
+                    return client
+                try:
+                    await client(GetStateRequest())
+                    entry.last_health_check_at = now
+                    return client
+                except Exception as e:
+                    logger.warning(f"Telegram client health check failed, reconnecting: {str(e)}")
+
+            if client is not None:
+                await self._disconnect(entry)
+
+            entry.client = await self._connect_with_backoff(entry.session_encrypted)
+            entry.last_health_check_at = time.monotonic()
+            return entry.client
+
+    async def _connect_with_backoff(self, session_encrypted: bytes) -> TelegramClient:
+        """
+        Connect a new client, retrying network failures with exponential backoff.
+
+        Raises:
+            TelegramSessionNotAuthorized: If the session is not authorized
+            Exception: If all attempts failed
+        """
+        session_string = decrypt_session(session_encrypted)
+        delay = self.reconnect_backoff
+
+        for attempt in range(1, self.reconnect_attempts + 1):
+            client = TelegramClient(
+                StringSession(session_string),
+                self.api_id,
+                self.api_hash,
+            )
+            try:
+                await client.connect()
+            except (OSError, asyncio.TimeoutError) as e:
+                await client.disconnect()
+                if attempt == self.reconnect_attempts:
+                    raise
+                logger.warning(
+                    f"Telegram connect attempt {attempt}/{self.reconnect_attempts} failed: {str(e)}. "
+                    f"Retrying in {delay:.1f}s"
+                )
+                await asyncio.sleep(delay)
+                delay *= 2
+                continue
+
+            if not await client.is_user_authorized():
+                await client.disconnect()
+                raise TelegramSessionNotAuthorized("Session is not authorized")
+
+            return client
+
+        raise Exception("Failed to connect Telegram client")
+
+    async def _retire(self, account_key: str, entry: _PooledClient):
+        """
+        Remove an entry from the pool; disconnect now or when the last user releases it.
+        """
+        if self._entries.get(account_key) is entry:
+            del self._entries[account_key]
+        entry.retired = True
+        if entry.in_use == 0:
+            await self._disconnect(entry)
+
+    async def _disconnect(self, entry: _PooledClient):
+        """Disconnect the client of an entry, ignoring errors."""
+        client, entry.client = entry.client, None
+        if client is None:
+            return
+        try:
+            await client.disconnect()
+        except Exception as e:
+            logger.debug(f"Error while disconnecting Telegram client: {str(e)}")
+
 
 class TelegramService:
     """
@@ -19,6 +296,15 @@ class TelegramService:
         self.api_id = settings.TELEGRAM_API_ID
         self.api_hash = settings.TELEGRAM_API_HASH
         self._clients: Dict[str, TelegramClient] = {}
+        self.pool = TelegramClientPool(self.api_id, self.api_hash)
+
+    def _pool_key(self, session_encrypted: bytes, account_id: Optional[str]) -> str:
+        """
+        Pool key for an account: its id, or a session fingerprint if the id is unknown.
+        """
+        if account_id:
+            return str(account_id)
+        return hashlib.sha256(session_encrypted).hexdigest()
 
     async def create_client(
         self,
@@ -136,14 +422,15 @@ class TelegramService:
         await client.connect()
 
         if not await client.is_user_authorized():
-            raise Exception("Session is not authorized")
+            raise TelegramSessionNotAuthorized("Session is not authorized")
 
         return client
 
     async def get_dialogs(
         self,
         session_encrypted: bytes,
-        limit: int = 100
+        limit: int = 100,
+        account_id: Optional[str] = None
     ) -> List[Dict[str, Any]]:
         """
         Get list of dialogs (chats, channels, groups) for authenticated user.
@@ -151,13 +438,14 @@ class TelegramService:
         Args:
             session_encrypted: Encrypted session data
             limit: Maximum number of dialogs to fetch
+            account_id: TelegramAccount ID (client pool key)
 
         Returns:
             List of dialog information
         """
-        client = await self.get_client_from_session(session_encrypted)
+        pool_key = self._pool_key(session_encrypted, account_id)
 
-        try:
+        async with self.pool.acquire(pool_key, session_encrypted) as client:
             dialogs = await client.get_dialogs(limit=limit)
 
             result = []
@@ -178,15 +466,13 @@ class TelegramService:
 
             return result
 
-        finally:
-            await client.disconnect()
-
     async def get_channel_messages(
         self,
         session_encrypted: bytes,
         channel_id: int,
         limit: int = 100,
-        offset_id: int = 0
+        offset_id: int = 0,
+        account_id: Optional[str] = None
     ) -> List[Dict[str, Any]]:
         """
         Get messages from a channel.
@@ -196,13 +482,14 @@ class TelegramService:
             channel_id: Telegram channel ID
             limit: Maximum number of messages to fetch
             offset_id: Message ID to start from (for pagination)
+            account_id: TelegramAccount ID (client pool key)
 
         Returns:
             List of message information
         """
-        client = await self.get_client_from_session(session_encrypted)
+        pool_key = self._pool_key(session_encrypted, account_id)
 
-        try:
+        async with self.pool.acquire(pool_key, session_encrypted) as client:
             # Get channel entity
             channel = await client.get_entity(channel_id)
 
@@ -216,44 +503,178 @@ class TelegramService:
             result = []
             for msg in messages:
                 if msg.message:  # Only text messages for now
-                    message_info = {
-                        "id": msg.id,
-                        "text": msg.message,
-                        "date": msg.date.isoformat(),
-                        "views": msg.views,
-                        "forwards": msg.forwards,
-                        "author": None,
-                    }
-
-                    # Try to get author info
-                    if msg.sender:
-                        sender = msg.sender
-                        message_info["author"] = {
-                            "id": sender.id,
-                            "username": getattr(sender, "username", None),
-                            "first_name": getattr(sender, "first_name", None),
-                        }
-
-                    result.append(message_info)
+                    result.append(self.message_to_dict(msg))
 
             return result
 
-        finally:
-            await client.disconnect()
+    async def get_new_channel_messages(
+        self,
+        session_encrypted: bytes,
+        channel_id: int,
+        min_id: int = 0,
+        limit: Optional[int] = None,
+        initial_limit: int = 100,
+        account_id: Optional[str] = None,
+        peer: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        Get messages posted after a forward cursor, oldest first.
 
-    async def get_me(self, session_encrypted: bytes) -> Dict[str, Any]:
+        With min_id set, iter_messages pages forward through everything newer
+        than min_id (up to limit), so a busy channel is drained in one pass.
+        Without a cursor (first collection) only the latest initial_limit
+        messages are fetched.
+
+        A cached peer (see input_peer_to_dict) skips entity resolution and goes
+        straight to GetHistory. If Telegram rejects it, the channel is resolved
+        again and the fresh peer is returned for caching.
+
+        Args:
+            session_encrypted: Encrypted session data
+            channel_id: Telegram channel ID or @username
+            min_id: Last collected message ID (exclusive)
+            limit: Maximum number of messages to fetch (None = no limit)
+            initial_limit: Number of latest messages to fetch without a cursor
+            account_id: TelegramAccount ID (client pool key)
+            peer: Cached peer of the channel for this account
+
+        Returns:
+            {
+                "messages": list of text messages (oldest first),
+                "last_message_id": highest message ID seen, including non-text messages,
+                "peer": freshly resolved peer to cache, or None if the cached one was used
+            }
+        """
+        pool_key = self._pool_key(session_encrypted, account_id)
+
+        async with self.pool.acquire(pool_key, session_encrypted) as client:
+            input_peer = self.dict_to_input_peer(peer) if peer else None
+
+            if input_peer is not None:
+                try:
+                    result = await self._iter_new_messages(client, input_peer, min_id, limit, initial_limit)
+                    result["peer"] = None
+                    return result
+                except (errors.ChannelInvalidError, errors.PeerIdInvalidError) as e:
+                    # Cached access_hash is no longer valid - resolve again
+                    logger.info(f"Cached peer for {channel_id} is invalid ({str(e)}), resolving again")
+
+            input_peer = await client.get_input_entity(channel_id)
+            result = await self._iter_new_messages(client, input_peer, min_id, limit, initial_limit)
+            result["peer"] = self.input_peer_to_dict(input_peer)
+            return result
+
+    async def _iter_new_messages(
+        self,
+        client: TelegramClient,
+        input_peer,
+        min_id: int,
+        limit: Optional[int],
+        initial_limit: int
+    ) -> Dict[str, Any]:
+        """
+        Page through messages newer than min_id (see get_new_channel_messages).
+        """
+        if min_id:
+            iterator = client.iter_messages(input_peer, limit=limit, min_id=min_id, reverse=True)
+        else:
+            iterator = client.iter_messages(input_peer, limit=initial_limit)
+
+        result = []
+        last_message_id = None
+        async for msg in iterator:
+            if last_message_id is None or msg.id > last_message_id:
+                last_message_id = msg.id
+            if msg.message:  # Only text messages for now
+                result.append(self.message_to_dict(msg))
+
+        if not min_id:
+            # Latest messages come newest first
+            result.reverse()
+
+        return {
+            "messages": result,
+            "last_message_id": last_message_id,
+        }
+
+    def input_peer_to_dict(self, input_peer) -> Optional[Dict[str, Any]]:
+        """
+        Convert an InputPeer to a plain dict for caching.
+
+        Args:
+            input_peer: InputPeerChannel / InputPeerChat / InputPeerUser
+
+        Returns:
+            {"peer_type": str, "peer_id": int, "access_hash": int or None}
+            or None for unsupported peers
+        """
+        if isinstance(input_peer, InputPeerChannel):
+            return {"peer_type": "channel", "peer_id": input_peer.channel_id, "access_hash": input_peer.access_hash}
+        if isinstance(input_peer, InputPeerChat):
+            return {"peer_type": "chat", "peer_id": input_peer.chat_id, "access_hash": None}
+        if isinstance(input_peer, InputPeerUser):
+            return {"peer_type": "user", "peer_id": input_peer.user_id, "access_hash": input_peer.access_hash}
+        return None
+
+    def dict_to_input_peer(self, peer: Dict[str, Any]):
+        """
+        Build an InputPeer from a cached peer dict (see input_peer_to_dict).
+
+        Returns:
+            InputPeer or None for unknown peer types
+        """
+        if peer["peer_type"] == "channel":
+            return InputPeerChannel(channel_id=peer["peer_id"], access_hash=peer["access_hash"])
+        if peer["peer_type"] == "chat":
+            return InputPeerChat(chat_id=peer["peer_id"])
+        if peer["peer_type"] == "user":
+            return InputPeerUser(user_id=peer["peer_id"], access_hash=peer["access_hash"])
+        return None
+
+    def message_to_dict(self, msg) -> Dict[str, Any]:
+        """
+        Convert a Telethon message to a plain dict.
+
+        Args:
+            msg: Telethon Message
+
+        Returns:
+            Message information
+        """
+        message_info = {
+            "id": msg.id,
+            "text": msg.message,
+            "date": msg.date.isoformat(),
+            "views": msg.views,
+            "forwards": msg.forwards,
+            "author": None,
+        }
+
+        # Try to get author info
+        if msg.sender:
+            sender = msg.sender
+            message_info["author"] = {
+                "id": sender.id,
+                "username": getattr(sender, "username", None),
+                "first_name": getattr(sender, "first_name", None),
+            }
+
+        return message_info
+
+    async def get_me(self, session_encrypted: bytes, account_id: Optional[str] = None) -> Dict[str, Any]:
         """
         Get information about the authenticated user.
 
         Args:
             session_encrypted: Encrypted session data
+            account_id: TelegramAccount ID (client pool key)
 
         Returns:
             User information
         """
-        client = await self.get_client_from_session(session_encrypted)
+        pool_key = self._pool_key(session_encrypted, account_id)
 
-        try:
+        async with self.pool.acquire(pool_key, session_encrypted) as client:
             me = await client.get_me()
 
             return {
@@ -264,9 +685,6 @@ class TelegramService:
                 "phone": me.phone,
             }
 
-        finally:
-            await client.disconnect()
-
     def _get_entity_type(self, entity) -> str:
         """
         Determine entity type.
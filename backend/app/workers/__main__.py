@@ -13,6 +13,7 @@ import sys
 import logging
 
 from app.workers import message_collector_worker
+from app.services.telegram_service import telegram_service
 
 # Configure logging
 logging.basicConfig(
@@ -53,6 +54,7 @@ async def main():
         interval_minutes = int(os.getenv("WORKER_INTERVAL_MINUTES", "1"))
 
         logger.info(f"Collection interval: {interval_minutes} minutes")
+        telegram_service.pool.start()
         message_collector_worker.start(interval_minutes=interval_minutes)
 
         logger.info("Worker started successfully")
@@ -69,6 +71,7 @@ async def main():
         # Graceful shutdown
         logger.info("Shutting down worker...")
         message_collector_worker.stop()
+        await telegram_service.pool.close_all()
         logger.info("Worker stopped gracefully")
         logger.info("=" * 60)
 
@@ -2,6 +2,7 @@
 Background worker V2 - использует глобальную архитектуру с progress tracking.
 Эффективный сбор и анализ для масштабирования на тысячи пользователей.
 """
+import asyncio
 import logging
 from datetime import datetime
 from typing import Dict, Any
@@ -10,10 +11,12 @@ from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 from sqlalchemy.orm import Session
 
+from app.config import settings
 from app.database import get_session_local
 from app.services.global_message_collector import global_message_collector
+from app.services.realtime_message_listener import realtime_message_listener
+from app.services.notification_dispatcher import notification_dispatcher
 from app.services.rule_processor_v2 import rule_processor_v2
-from app.models.tenant import Tenant
 
 logger = logging.getLogger(__name__)
 
@@ -22,9 +25,15 @@ class MessageCollectorWorkerV2:
     """
     Worker V2 для фонового сбора и анализа сообщений.
 
-    Архитектура:
+    Архитектура (этапы работают одновременно, как pipeline):
     1. Global Message Collection - собирает сообщения ОДИН раз для всех tenants
-    2. Per-Tenant Rule Processing - анализирует только НОВЫЕ сообщения для каждого tenant
+    2. Rule Processing - каналы с новыми сообщениями сразу после сохранения идут через
+       bounded очередь к потребителям-классификаторам (индекс channel -> правила);
+       после сбора - проход по остальным каналам
+    3. Delivery - email / Telegram уведомления из outbox доставляет notification_dispatcher
+
+    При REALTIME_INGESTION_ENABLED сообщения приходят через realtime_message_listener,
+    а polling собирает только каналы, которые не синхронизированы в realtime.
     """
 
     def __init__(self):
@@ -48,63 +57,70 @@ class MessageCollectorWorkerV2:
             logger.info("="*80)
 
             # ============================================================
-            # ЭТАП 1: GLOBAL MESSAGE COLLECTION
-            # Собираем сообщения из всех уникальных каналов (ОДИН раз!)
+            # ЭТАП 1 + 2: COLLECTION -> RULE PROCESSING (pipeline)
+            # Канал с новыми сообщениями сразу после сохранения уходит через
+            # bounded очередь на классификацию; сбор остальных каналов продолжается.
+            # ЭТАП 3 (доставка уведомлений) - notification_dispatcher, из outbox.
             # ============================================================
-            logger.info("STAGE 1: Collecting global messages from channels...")
-
-            collection_result = await global_message_collector.collect_global_messages(db)
+            logger.info("STAGE 1+2: Collecting global messages and processing rules (pipelined)...")
+
+            processing_result = self._empty_processing_result()
+            classified_channels = set()
+            collected_queue: asyncio.Queue = asyncio.Queue(maxsize=settings.PIPELINE_CLASSIFY_QUEUE_SIZE)
+
+            consumers = [
+                asyncio.create_task(
+                    self._classification_stage(collected_queue, processing_result, classified_channels)
+                )
+                for _ in range(max(settings.PIPELINE_CLASSIFY_WORKERS, 1))
+            ]
+
+            try:
+                # Каналы, получаемые в realtime, polling пропускает
+                collection_result = await global_message_collector.collect_global_messages(
+                    db,
+                    exclude_channel_ids=realtime_message_listener.synced_channel_ids,
+                    collected_queue=collected_queue
+                )
+            finally:
+                # Сигнал потребителям о завершении сбора
+                for _ in consumers:
+                    await collected_queue.put(None)
+                await asyncio.gather(*consumers)
 
             logger.info(
                 f"Global collection complete: "
                 f"processed {collection_result['channels_processed']} channels, "
-                f"collected {collection_result['messages_collected']} new messages"
+                f"collected {collection_result['messages_collected']} new messages, "
+                f"{len(classified_channels)} channels classified in pipeline"
             )
 
-            # ============================================================
-            # ЭТАП 2: PER-TENANT RULE PROCESSING
-            # Анализируем НОВЫЕ сообщения для каждого tenant
-            # ============================================================
-            logger.info("STAGE 2: Processing rules for all tenants...")
-
-            # Получить всех активных tenants
-            tenants = db.query(Tenant).filter(
-                Tenant.deleted_at == None
-            ).all()
-
-            logger.info(f"Found {len(tenants)} active tenants to process")
-
-            tenants_stats = []
-            total_messages_analyzed = 0
-            total_leads_created = 0
-            all_lead_ids = []
+            # Остальные каналы: история новых правил, сообщения realtime каналов, остановленные правила
             all_errors = collection_result.get('errors', [])
 
-            for tenant in tenants:
-                try:
-                    logger.info(f"Processing tenant: {tenant.name} (ID: {tenant.id})")
-
-                    tenant_result = await rule_processor_v2.process_rules_for_tenant(
-                        tenant_id=tenant.id,
-                        db=db
-                    )
-
-                    tenants_stats.append(tenant_result)
-                    total_messages_analyzed += tenant_result['messages_analyzed']
-                    total_leads_created += tenant_result['leads_created']
-                    all_lead_ids.extend(tenant_result['lead_ids'])
-                    all_errors.extend(tenant_result.get('errors', []))
-
-                    logger.info(
-                        f"Tenant {tenant.name}: "
-                        f"analyzed {tenant_result['messages_analyzed']} messages, "
-                        f"created {tenant_result['leads_created']} leads"
-                    )
-
-                except Exception as e:
-                    error_msg = f"Error processing tenant {tenant.id}: {str(e)}"
-                    logger.error(error_msg, exc_info=True)
-                    all_errors.append(error_msg)
+            try:
+                sweep_result = await rule_processor_v2.process_new_messages(
+                    db,
+                    exclude_channel_ids=classified_channels
+                )
+                self._merge_processing_result(processing_result, sweep_result)
+            except Exception as e:
+                error_msg = f"Error processing rules: {str(e)}"
+                logger.error(error_msg, exc_info=True)
+                all_errors.append(error_msg)
+
+            tenants_stats = list(processing_result['tenants'].values())
+            total_messages_analyzed = processing_result['messages_analyzed']
+            total_leads_created = processing_result['leads_created']
+            all_lead_ids = processing_result['lead_ids']
+            all_errors.extend(processing_result['errors'])
+
+            for tenant_result in tenants_stats:
+                logger.info(
+                    f"Tenant {tenant_result['tenant_id']}: "
+                    f"analyzed {tenant_result['messages_analyzed']} messages, "
+                    f"created {tenant_result['leads_created']} leads"
+                )
 
             # ============================================================
             # ФИНАЛЬНАЯ СТАТИСТИКА
@@ -118,6 +134,7 @@ class MessageCollectorWorkerV2:
             logger.info(f"Tenants Processed: {len(tenants_stats)}")
             logger.info(f"Messages Analyzed: {total_messages_analyzed}")
             logger.info(f"Leads Created: {total_leads_created}")
+            logger.info(f"Skipped by Prefilter: {processing_result['prefilter_skipped']}")
             if all_errors:
                 logger.warning(f"Errors: {len(all_errors)}")
             logger.info("="*80)
@@ -131,6 +148,7 @@ class MessageCollectorWorkerV2:
                 "tenants_processed": len(tenants_stats),
                 "total_messages_analyzed": total_messages_analyzed,
                 "total_leads_created": total_leads_created,
+                "total_prefilter_skipped": processing_result['prefilter_skipped'],
                 "lead_ids": all_lead_ids,
 
                 # Detailed stats
@@ -152,6 +170,7 @@ class MessageCollectorWorkerV2:
                 "tenants_processed": 0,
                 "total_messages_analyzed": 0,
                 "total_leads_created": 0,
+                "total_prefilter_skipped": 0,
                 "lead_ids": [],
                 "tenants_stats": [],
                 "errors": [str(e)],
@@ -161,6 +180,87 @@ class MessageCollectorWorkerV2:
         finally:
             db.close()
 
+    async def _classification_stage(
+        self,
+        collected_queue: asyncio.Queue,
+        processing_result: Dict[str, Any],
+        classified_channels: set
+    ):
+        """
+        Потребитель pipeline: классифицирует каналы по мере их сбора (своя DB сессия).
+        Готовые к этому моменту каналы очереди обрабатываются вместе, до PIPELINE_CLASSIFY_MAX_CHANNELS.
+        """
+        SessionLocal = get_session_local()
+        db: Session = SessionLocal()
+
+        try:
+            done = False
+            while not done:
+                channel_id = await collected_queue.get()
+                if channel_id is None:
+                    break
+
+                channel_ids = {channel_id}
+                while len(channel_ids) < settings.PIPELINE_CLASSIFY_MAX_CHANNELS and not collected_queue.empty():
+                    channel_id = collected_queue.get_nowait()
+                    if channel_id is None:
+                        done = True
+                        break
+                    channel_ids.add(channel_id)
+
+                try:
+                    result = await rule_processor_v2.process_new_messages(db, channel_ids=channel_ids)
+                    self._merge_processing_result(processing_result, result)
+                    # Каналы с ошибкой останутся для финального прохода
+                    classified_channels.update(channel_ids)
+                    if result["leads_created"]:
+                        logger.info(f"Pipeline: {result['leads_created']} leads from {len(channel_ids)} channels")
+                except Exception as e:
+                    db.rollback()
+                    error_msg = f"Pipeline: error processing rules: {str(e)}"
+                    logger.error(error_msg, exc_info=True)
+                    processing_result["errors"].append(error_msg)
+        finally:
+            db.close()
+
+    @staticmethod
+    def _empty_processing_result() -> Dict[str, Any]:
+        return {
+            "messages_analyzed": 0,
+            "leads_created": 0,
+            "prefilter_skipped": 0,
+            "lead_ids": [],
+            "errors": [],
+            "tenants": {}
+        }
+
+    @staticmethod
+    def _merge_processing_result(total: Dict[str, Any], result: Dict[str, Any]):
+        """Суммирует статистику process_new_messages (в том числе по tenants) за цикл."""
+        for key in ("messages_analyzed", "leads_created", "prefilter_skipped"):
+            total[key] += result[key]
+        total["lead_ids"].extend(result["lead_ids"])
+        total["errors"].extend(result["errors"])
+
+        for tenant_id, tenant_result in result["tenants"].items():
+            tenant_total = total["tenants"].get(tenant_id)
+            if tenant_total is None:
+                total["tenants"][tenant_id] = {
+                    **tenant_result,
+                    "prefilter_skipped": dict(tenant_result["prefilter_skipped"]),
+                    "lead_ids": list(tenant_result["lead_ids"]),
+                    "errors": list(tenant_result["errors"]),
+                }
+                continue
+
+            tenant_total["rules_processed"] = max(tenant_total["rules_processed"], tenant_result["rules_processed"])
+            tenant_total["messages_analyzed"] += tenant_result["messages_analyzed"]
+            tenant_total["leads_created"] += tenant_result["leads_created"]
+            for rule_id, skipped in tenant_result["prefilter_skipped"].items():
+                tenant_total["prefilter_skipped"][rule_id] = tenant_total["prefilter_skipped"].get(rule_id, 0) + skipped
+            tenant_total["lead_ids"].extend(tenant_result["lead_ids"])
+            tenant_total["errors"].extend(tenant_result["errors"])
+
     def start(self, interval_minutes: int = 1):
         """
         Запустить worker с указанным интервалом.
@@ -185,6 +285,13 @@ class MessageCollectorWorkerV2:
         )
 
         self.scheduler.start()
+
+        # Доставка email / Telegram уведомлений из outbox
+        notification_dispatcher.start()
+
+        if settings.REALTIME_INGESTION_ENABLED:
+            realtime_message_listener.start()
+
         self.is_running = True
         logger.info("Message collector worker V2 started successfully")
 
@@ -194,7 +301,9 @@ class MessageCollectorWorkerV2:
             return
 
         logger.info("Stopping message collector worker V2...")
+        realtime_message_listener.stop()
         self.scheduler.shutdown(wait=True)
+        notification_dispatcher.stop()
         self.is_running = False
         logger.info("Message collector worker V2 stopped")
 
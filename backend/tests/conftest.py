@@ -1,35 +1,46 @@
 """
 Pytest configuration and fixtures for testing.
 """
+import os
+
+from cryptography.fernet import Fernet
+
+# app.utils.encryption проверяет ключ при импорте
+os.environ.setdefault("ENCRYPTION_KEY", Fernet.generate_key().decode())
+
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
 
 from app.main import app
-from app.db.base import Base
-from app.db.session import get_db
+from app.database import Base, get_db
 from app.models import User, Tenant
-from app.core.security import get_password_hash
+from app.utils.security import get_password_hash
 from app.api.deps import get_current_user, get_current_tenant
 
 
-# Test database (SQLite in-memory)
-SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    connect_args={"check_same_thread": False},
-    poolclass=StaticPool,
-)
+# Модели используют PostgreSQL типы (UUID, ARRAY, JSONB) - нужна тестовая база PostgreSQL.
+# Без TEST_DATABASE_URL тесты с базой пропускаются, unit тесты сервисов работают всегда.
+SQLALCHEMY_DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL) if SQLALCHEMY_DATABASE_URL else None
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
 @pytest.fixture
 def db_session():
     """Create a fresh database for each test."""
-    Base.metadata.create_all(bind=engine)
+    if engine is None:
+        pytest.skip("TEST_DATABASE_URL is not set")
+
+    try:
+        Base.metadata.create_all(bind=engine)
+    except OperationalError as e:
+        pytest.skip(f"Test database is not available: {e}")
+
     session = TestingSessionLocal()
     try:
         yield session
@@ -60,8 +71,6 @@ def test_tenant(db_session):
     """Create a test tenant."""
     tenant = Tenant(
         name="Test Tenant",
-        slug="test-tenant",
-        is_active=True,
     )
     db_session.add(tenant)
     db_session.commit()
@@ -74,10 +83,10 @@ def test_user(db_session, test_tenant):
     """Create a test user."""
     user = User(
         email="test@example.com",
-        hashed_password=get_password_hash("testpassword123"),
+        password_hash=get_password_hash("testpassword123"),
         full_name="Test User",
         is_active=True,
-        is_superuser=False,
+        email_verified=True,
         tenant_id=test_tenant.id,
     )
     db_session.add(user)
@@ -91,10 +100,11 @@ def test_superuser(db_session, test_tenant):
     """Create a test superuser."""
     user = User(
         email="admin@example.com",
-        hashed_password=get_password_hash("adminpassword123"),
+        password_hash=get_password_hash("adminpassword123"),
         full_name="Admin User",
+        role="owner",
         is_active=True,
-        is_superuser=True,
+        email_verified=True,
         tenant_id=test_tenant.id,
     )
     db_session.add(user)
@@ -0,0 +1,136 @@
+"""
+Tests for the semantic (embedding) prefilter.
+"""
+import asyncio
+import sys
+import uuid
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+from app.services import rule_processor_v2 as processor_module
+from app.services.embedding_service import EmbeddingService
+from app.services.rule_processor_v2 import RuleProcessorV2
+
+
+@pytest.fixture
+def service():
+    return EmbeddingService(enabled=True, similarity_floor=0.3, load_retry_interval=3600)
+
+
+class TestScoring:
+    """Test similarity scoring and per-rule floors."""
+
+    def test_similarity_is_cosine_of_normalized_vectors(self):
+        np = pytest.importorskip("numpy")
+        messages = np.array([[1.0, 0.0], [0.6, 0.8]], dtype=np.float32)
+        prompts = np.array([[1.0, 0.0], [0.0, 1.0], [0.6, 0.8]], dtype=np.float32)
+
+        scores = EmbeddingService.similarity(messages, prompts)
+
+        assert scores.shape == (2, 3)
+        assert scores[0].tolist() == pytest.approx([1.0, 0.0, 0.6])
+        assert scores[1].tolist() == pytest.approx([0.6, 0.8, 1.0])
+
+    def test_floor_for(self, service):
+        assert service.floor_for({"prefilter": None}) == 0.3
+        assert service.floor_for({"prefilter": {"include_keywords": ["python"]}}) == 0.3
+        assert service.floor_for({"prefilter": {"similarity_floor": 0.55}}) == 0.55
+        # An explicit 0 disables the semantic check for the rule
+        assert service.floor_for({"prefilter": {"similarity_floor": 0}}) == 0.0
+
+
+class TestModelLoadBackoff:
+    """A failed model load disables the prefilter for load_retry_interval."""
+
+    @pytest.mark.asyncio
+    async def test_failed_load_is_not_retried_until_backoff_passes(self, service):
+        calls = []
+
+        def failing_model(name, device):
+            calls.append(name)
+            raise OSError("model not found")
+
+        module = SimpleNamespace(SentenceTransformer=failing_model)
+        with patch.dict(sys.modules, {"sentence_transformers": module}):
+            results = await asyncio.gather(
+                *(service._get_model() for _ in range(3)), return_exceptions=True
+            )
+
+            # One load attempt; windows that waited for the lock fail fast
+            assert len(calls) == 1
+            assert isinstance(results[0], OSError)
+            assert all(isinstance(result, RuntimeError) for result in results[1:])
+            assert service._load_retry_at > 0
+            assert not service._unavailable
+
+            with pytest.raises(RuntimeError):
+                await service._get_model()
+            assert len(calls) == 1
+
+            # After the backoff the load is attempted again
+            service._load_retry_at = 0.0
+            with pytest.raises(OSError):
+                await service._get_model()
+            assert len(calls) == 2
+
+    @pytest.mark.asyncio
+    async def test_is_available_respects_backoff(self, service):
+        pytest.importorskip("numpy")
+        assert service.is_available
+
+        service._load_retry_at = float("inf")
+
+        assert not service.is_available
+
+    @pytest.mark.asyncio
+    async def test_missing_package_disables_for_good(self, service):
+        with patch.dict(sys.modules, {"sentence_transformers": None}):
+            with pytest.raises(ImportError):
+                await service._get_model()
+
+        assert service._unavailable
+        assert not service.is_available
+
+
+class TestEmbeddingCache:
+    """Decoded message vectors are reused across windows of one processing run."""
+
+    @pytest.mark.asyncio
+    async def test_vectors_are_loaded_once_per_run(self):
+        np = pytest.importorskip("numpy")
+        stored, fresh = {"id": uuid.uuid4(), "text": "stored"}, {"id": uuid.uuid4(), "text": "fresh"}
+        target = {"rule_id": uuid.uuid4(), "prompt": "p", "prompt_hash": "h", "prefilter": None}
+        loaded, encoded = [], []
+
+        def load(db, message_ids):
+            loaded.append(list(message_ids))
+            return {stored["id"]: np.array([1.0, 0.0], dtype=np.float32)}
+
+        async def encode(texts):
+            encoded.append(texts)
+            return np.array([[0.0, 1.0]] * len(texts), dtype=np.float32)
+
+        async def prompt_matrix(targets):
+            return np.array([[1.0, 0.0]], dtype=np.float32)
+
+        embedding = processor_module.embedding_service
+        processor = RuleProcessorV2(prefilter_enabled=False)
+        db = SimpleNamespace(commit=lambda: None, rollback=lambda: None)
+        cache = {}
+        work = [(target, stored), (target, fresh)]
+
+        with patch.object(embedding, "load", load), \
+                patch.object(embedding, "encode", encode), \
+                patch.object(embedding, "store", lambda db, vectors: None), \
+                patch.object(embedding, "prompt_matrix", prompt_matrix), \
+                patch.object(embedding, "similarity_floor", 0.5):
+            first = await processor._embedding_rejected(work, db, asyncio.Lock(), cache)
+            second = await processor._embedding_rejected(work, db, asyncio.Lock(), cache)
+
+        assert first == second == {(target["rule_id"], fresh["id"])}
+        assert len(loaded) == 1
+        assert sorted(loaded[0]) == sorted([stored["id"], fresh["id"]])
+        assert encoded == [["fresh"]]
+        assert set(cache) == {stored["id"], fresh["id"]}
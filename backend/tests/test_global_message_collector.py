@@ -0,0 +1,278 @@
+"""
+Tests for GlobalMessageCollector scheduling logic.
+"""
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from telethon import errors
+
+from app.services.global_message_collector import GlobalMessageCollector
+
+
+NOW = datetime(2026, 1, 1, 12, 0, 0)
+
+
+@pytest.fixture
+def collector():
+    """Collector with explicit scheduling parameters."""
+    return GlobalMessageCollector(
+        min_poll_interval=60,
+        max_poll_interval=3600,
+        target_messages_per_poll=1.0,
+        rate_smoothing=0.5,
+        failure_backoff_base=60,
+        failure_backoff_max=3600,
+        quarantine_after_failures=3,
+        quarantine_probe_interval=21600,
+    )
+
+
+def make_channel(**fields):
+    channel = dict(
+        username="test_channel",
+        tg_id=12345,
+        last_collected_at=None,
+        last_message_id=None,
+        message_rate=None,
+        poll_interval_seconds=None,
+        next_poll_at=None,
+        consecutive_failures=0,
+        last_error=None,
+        last_failure_at=None,
+        quarantined_at=None,
+    )
+    channel.update(fields)
+    return SimpleNamespace(**channel)
+
+
+class TestSchedulePoll:
+    """Test adaptive per-channel polling schedule."""
+
+    def test_first_fetch_does_not_set_rate(self, collector):
+        """History fetched without a cursor is not a message rate."""
+        channel = make_channel()
+
+        collector._schedule_next_poll(channel, observed_messages=50, now=NOW)
+
+        assert channel.message_rate is None
+        assert channel.poll_interval_seconds == 60
+        assert channel.next_poll_at == NOW + timedelta(seconds=60)
+
+    def test_rate_initialized_from_first_observation(self, collector):
+        """Rate is messages per hour since the previous collection."""
+        channel = make_channel(last_collected_at=NOW - timedelta(hours=1), last_message_id=100)
+
+        collector._schedule_next_poll(channel, observed_messages=4, now=NOW)
+
+        assert channel.message_rate == pytest.approx(4.0)
+        # 1 message per poll at 4 messages/hour -> 15 minutes
+        assert channel.poll_interval_seconds == 900
+
+    def test_rate_is_smoothed(self, collector):
+        """EWMA combines the observed rate with the previous one."""
+        channel = make_channel(
+            last_collected_at=NOW - timedelta(hours=1),
+            last_message_id=100,
+            message_rate=2.0,
+        )
+
+        collector._schedule_next_poll(channel, observed_messages=6, now=NOW)
+
+        assert channel.message_rate == pytest.approx(0.5 * 6 + 0.5 * 2.0)
+        assert channel.poll_interval_seconds == 900
+
+    def test_quiet_channel_backs_off(self, collector):
+        """No new messages doubles the interval."""
+        channel = make_channel(
+            last_collected_at=NOW - timedelta(minutes=10),
+            last_message_id=100,
+            message_rate=1.0,
+            poll_interval_seconds=600,
+        )
+
+        collector._schedule_next_poll(channel, observed_messages=0, now=NOW)
+
+        assert channel.poll_interval_seconds == 1200
+        assert channel.next_poll_at == NOW + timedelta(seconds=1200)
+
+    def test_interval_is_clamped(self, collector):
+        """Interval stays within [min_poll_interval, max_poll_interval]."""
+        busy = make_channel(last_collected_at=NOW - timedelta(hours=1), last_message_id=100)
+        quiet = make_channel(
+            last_collected_at=NOW - timedelta(hours=1),
+            last_message_id=100,
+            poll_interval_seconds=3000,
+        )
+
+        collector._schedule_next_poll(busy, observed_messages=1000, now=NOW)
+        collector._schedule_next_poll(quiet, observed_messages=0, now=NOW)
+
+        assert busy.poll_interval_seconds == 60
+        assert quiet.poll_interval_seconds == 3600
+
+    def test_quiet_channel_doubles_up_to_max(self, collector):
+        """Consecutive empty polls double the interval until max_poll_interval."""
+        channel = make_channel(last_collected_at=NOW - timedelta(minutes=1), last_message_id=100)
+        intervals = []
+
+        now = NOW
+        for _ in range(8):
+            collector._schedule_next_poll(channel, observed_messages=0, now=now)
+            intervals.append(channel.poll_interval_seconds)
+            channel.last_collected_at = now
+            now = channel.next_poll_at
+
+        assert intervals == [120, 240, 480, 960, 1920, 3600, 3600, 3600]
+
+    def test_busy_channel_stays_at_min(self, collector):
+        """A sustained burst never polls faster than min_poll_interval."""
+        channel = make_channel(
+            last_collected_at=NOW - timedelta(minutes=1),
+            last_message_id=100,
+            message_rate=600.0,
+            poll_interval_seconds=60,
+        )
+
+        collector._schedule_next_poll(channel, observed_messages=30, now=NOW)
+
+        assert channel.message_rate > 600
+        assert channel.poll_interval_seconds == 60
+        assert channel.next_poll_at == NOW + timedelta(seconds=60)
+
+    def test_quiet_channel_speeds_up_on_new_activity(self, collector):
+        """A channel parked at max_poll_interval comes back as soon as messages appear."""
+        channel = make_channel(
+            last_collected_at=NOW - timedelta(hours=1),
+            last_message_id=100,
+            message_rate=0.0,
+            poll_interval_seconds=3600,
+        )
+
+        collector._schedule_next_poll(channel, observed_messages=20, now=NOW)
+
+        # 0.5 * 20/h -> 10 messages/hour -> 6 minutes
+        assert channel.poll_interval_seconds == 360
+
+    def test_rate_after_floodwait_delay(self, collector):
+        """
+        A poll delayed by a FloodWait park sees more messages over a longer period:
+        the rate stays the same and the channel is not treated as a burst.
+        """
+        channel = make_channel(
+            last_collected_at=NOW - timedelta(hours=3),
+            last_message_id=100,
+            message_rate=4.0,
+            poll_interval_seconds=900,
+        )
+
+        collector._schedule_next_poll(channel, observed_messages=12, now=NOW)
+
+        assert channel.message_rate == pytest.approx(4.0)
+        assert channel.poll_interval_seconds == 900
+
+
+class FakeSession:
+    def __init__(self):
+        self.commits = 0
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        pass
+
+
+class TestFloodWaitResult:
+    """A FloodWait is an account problem, not a channel one."""
+
+    @pytest.mark.asyncio
+    async def test_floodwait_keeps_channel_schedule(self, collector):
+        due_at = NOW - timedelta(minutes=1)
+        channel = make_channel(id=uuid.uuid4(), next_poll_at=due_at, poll_interval_seconds=900, message_rate=4.0)
+        queue = asyncio.Queue()
+        await queue.put((
+            {"channel": channel, "channel_identifier": "@test_channel"},
+            None,
+            errors.FloodWaitError(request=None, capture=30),
+        ))
+        await queue.put(None)
+        stats = {"channels_processed": 0, "messages_collected": 0, "errors": []}
+        db = FakeSession()
+
+        await collector._write_results(queue, db, stats)
+
+        # Still due: the next cycle retries with another (unparked) account
+        assert channel.next_poll_at == due_at
+        assert channel.poll_interval_seconds == 900
+        assert channel.message_rate == 4.0
+        assert channel.consecutive_failures == 0
+        assert db.commits == 0
+        assert len(stats["errors"]) == 1
+
+
+class TestCircuitBreaker:
+    """Test failure backoff and channel quarantine."""
+
+    def test_failure_backs_off_exponentially(self, collector):
+        """Each consecutive failure doubles the delay before the next poll."""
+        channel = make_channel()
+
+        collector._register_failure(channel, ValueError("boom"), now=NOW)
+        assert channel.consecutive_failures == 1
+        assert channel.next_poll_at == NOW + timedelta(seconds=60)
+        assert channel.last_error == "ValueError: boom"
+        assert channel.last_failure_at == NOW
+
+        collector._register_failure(channel, ValueError("boom"), now=NOW)
+        assert channel.consecutive_failures == 2
+        assert channel.next_poll_at == NOW + timedelta(seconds=120)
+        assert channel.quarantined_at is None
+
+    def test_backoff_is_capped(self):
+        """Backoff never exceeds failure_backoff_max."""
+        collector = GlobalMessageCollector(
+            failure_backoff_base=60,
+            failure_backoff_max=300,
+            quarantine_after_failures=100,
+        )
+        channel = make_channel(consecutive_failures=10)
+
+        collector._register_failure(channel, ValueError("boom"), now=NOW)
+
+        assert channel.next_poll_at == NOW + timedelta(seconds=300)
+
+    def test_quarantine_after_consecutive_failures(self, collector):
+        """After N failures the channel is quarantined and probed rarely."""
+        channel = make_channel(consecutive_failures=2)
+
+        collector._register_failure(channel, ValueError("boom"), now=NOW)
+
+        assert channel.quarantined_at == NOW
+        assert channel.next_poll_at == NOW + timedelta(seconds=21600)
+
+    def test_quarantine_start_is_kept(self, collector):
+        """A failed probe keeps the original quarantine timestamp."""
+        started = NOW - timedelta(days=1)
+        channel = make_channel(consecutive_failures=5, quarantined_at=started)
+
+        collector._register_failure(channel, ValueError("boom"), now=NOW)
+
+        assert channel.quarantined_at == started
+        assert channel.consecutive_failures == 6
+
+    def test_success_resets_failures(self, collector):
+        """A successful fetch closes the circuit breaker."""
+        channel = make_channel(
+            consecutive_failures=5,
+            last_error="ValueError: boom",
+            quarantined_at=NOW - timedelta(days=1),
+        )
+
+        collector._reset_failures(channel)
+
+        assert channel.consecutive_failures == 0
+        assert channel.last_error is None
+        assert channel.quarantined_at is None
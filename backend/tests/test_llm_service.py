@@ -0,0 +1,228 @@
+"""
+Tests for LLMService response parsing and batching.
+"""
+import json
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+from app.services.llm_service import LLMService
+
+
+@pytest.fixture
+def llm():
+    """LLM service with small batch limits."""
+    service = LLMService()
+    service.batch_max_messages = 3
+    service.batch_max_input_tokens = 1000
+    service.max_output_tokens = 16384
+    return service
+
+
+class TestPlanBatches:
+    """Test splitting messages into batch requests."""
+
+    def test_single_batch(self, llm):
+        """Few short messages go into one batch."""
+        assert llm._plan_batches(["a", "b"], "rule") == [[0, 1]]
+
+    def test_message_limit(self, llm):
+        """Batches hold at most batch_max_messages messages."""
+        batches = llm._plan_batches(["text"] * 7, "rule")
+
+        assert batches == [[0, 1, 2], [3, 4, 5], [6]]
+
+    def test_token_limit(self, llm):
+        """Batches are split when the estimated prompt exceeds the token budget."""
+        long_text = "x" * 900  # ~300 tokens
+
+        batches = llm._plan_batches([long_text] * 3, "rule")
+
+        assert batches == [[0], [1], [2]]
+
+    def test_oversized_message_gets_own_batch(self, llm):
+        """A message larger than the budget is still sent, alone."""
+        batches = llm._plan_batches(["short", "x" * 5000, "short"], "rule")
+
+        assert batches == [[0], [1], [2]]
+
+    def test_output_limit(self, llm):
+        """A full batch of matches with entities must fit into the response limit."""
+        llm.batch_max_messages = 30
+        llm.max_output_tokens = 2000
+
+        batches = llm._plan_batches(["text"] * 7, "rule")
+
+        assert [len(batch) for batch in batches] == [3, 3, 1]
+        assert llm._batch_response_tokens(3) <= 2000
+
+    def test_empty(self, llm):
+        assert llm._plan_batches([], "rule") == []
+
+
+class TestParseIndexedResults:
+    """Test parsing of numbered LLM results."""
+
+    def test_parses_results(self, llm):
+        response = json.dumps({"results": [
+            {"index": 1, "is_match": True, "confidence": 0.9, "reasoning": "yes",
+             "entities": {"contacts": ["@user"], "summary": "s"}},
+            {"index": 2, "is_match": False, "confidence": 0.1, "reasoning": "no", "entities": None},
+        ]})
+
+        parsed = llm._parse_indexed_results(response, 2, key="index")
+
+        assert parsed[1]["is_match"] is True
+        assert parsed[1]["confidence"] == 0.9
+        assert parsed[1]["entities"] == {
+            "contacts": ["@user"],
+            "keywords": [],
+            "budget": None,
+            "deadline": None,
+            "summary": "s",
+        }
+        assert parsed[2] == {"is_match": False, "confidence": 0.1, "reasoning": "no", "entities": None}
+
+    def test_skips_invalid_items(self, llm):
+        """Out-of-range, malformed and incomplete items are dropped."""
+        response = json.dumps({"results": [
+            {"index": 0, "is_match": True, "confidence": 0.9, "reasoning": "out of range"},
+            {"index": 3, "is_match": True, "confidence": 0.9, "reasoning": "out of range"},
+            {"index": "x", "is_match": True, "confidence": 0.9, "reasoning": "bad index"},
+            {"index": 1, "is_match": True, "reasoning": "no confidence"},
+            {"index": 2, "is_match": False, "confidence": 0.2, "reasoning": "ok"},
+        ]})
+
+        parsed = llm._parse_indexed_results(response, 2, key="index")
+
+        assert list(parsed) == [2]
+
+    def test_confidence_is_clamped(self, llm):
+        response = json.dumps({"results": [
+            {"index": 1, "is_match": False, "confidence": 1.5, "reasoning": ""},
+            {"index": 2, "is_match": False, "confidence": -1, "reasoning": ""},
+        ]})
+
+        parsed = llm._parse_indexed_results(response, 2, key="index")
+
+        assert parsed[1]["confidence"] == 1.0
+        assert parsed[2]["confidence"] == 0.0
+
+    def test_shared_entities(self, llm):
+        """Multi-rule responses carry one top-level entities object for matches."""
+        response = json.dumps({
+            "results": [
+                {"criterion": 1, "is_match": True, "confidence": 0.8, "reasoning": ""},
+                {"criterion": 2, "is_match": False, "confidence": 0.2, "reasoning": ""},
+            ],
+            "entities": {"summary": "shared"},
+        })
+
+        parsed = llm._parse_indexed_results(response, 2, key="criterion")
+
+        assert parsed[1]["entities"]["summary"] == "shared"
+        assert parsed[2]["entities"] is None
+
+    def test_bare_list(self, llm):
+        """A bare JSON list is accepted as the results array."""
+        response = json.dumps([{"index": 1, "is_match": True, "confidence": 0.7, "reasoning": ""}])
+
+        parsed = llm._parse_indexed_results(response, 1, key="index")
+
+        assert parsed[1]["is_match"] is True
+
+    def test_invalid_json_raises(self, llm):
+        with pytest.raises(json.JSONDecodeError):
+            llm._parse_indexed_results("not json", 1, key="index")
+
+    def test_string_booleans_are_parsed_strictly(self, llm):
+        """String "false" is not a match; values that are not booleans drop the item."""
+        response = json.dumps({"results": [
+            {"index": 1, "is_match": "false", "confidence": 0.9, "reasoning": ""},
+            {"index": 2, "is_match": "False", "confidence": 0.9, "reasoning": ""},
+            {"index": 3, "is_match": " TRUE ", "confidence": 0.9, "reasoning": ""},
+            {"index": 4, "is_match": "yes", "confidence": 0.9, "reasoning": ""},
+            {"index": 5, "is_match": 1, "confidence": 0.9, "reasoning": ""},
+        ]})
+
+        parsed = llm._parse_indexed_results(response, 5, key="index")
+
+        assert parsed[1]["is_match"] is False
+        assert parsed[2]["is_match"] is False
+        assert parsed[3]["is_match"] is True
+        assert list(parsed) == [1, 2, 3]
+
+
+class TestAnalyzeMessage:
+    """Test single-message analysis."""
+
+    @pytest.mark.asyncio
+    async def test_string_false_is_not_a_match(self, llm):
+        async def call_llm(**kwargs):
+            return json.dumps({"is_match": "false", "confidence": 0.9, "reasoning": "", "entities": {}})
+
+        with patch.object(llm, "_call_llm", call_llm):
+            result = await llm.analyze_message("text", "rule")
+
+        assert result["is_match"] is False
+        assert result["entities"] is None
+
+
+class TestAnalyzeMessagesBatch:
+    """Test batched analysis when one batch request fails."""
+
+    @staticmethod
+    def verdict(text):
+        return {"is_match": text.startswith("lead"), "confidence": 0.9, "reasoning": "", "entities": None}
+
+    @pytest.mark.asyncio
+    async def test_failed_batch_keeps_finished_siblings(self, llm):
+        """A failed batch falls back to per-message requests; the other batches are kept."""
+        texts = ["lead 1", "other 2", "lead 3", "broken 4", "broken 5", "other 6"]
+        batch_calls, single_calls = [], []
+
+        async def analyze_batch(message_texts, rule_description):
+            batch_calls.append(message_texts)
+            if message_texts[0].startswith("broken"):
+                raise httpx.ReadTimeout("timeout")
+            return {number: self.verdict(text) for number, text in enumerate(message_texts, start=1)}
+
+        async def analyze_message(message_text, rule_description):
+            single_calls.append(message_text)
+            return self.verdict(message_text)
+
+        with patch.object(llm, "_analyze_batch", analyze_batch), \
+                patch.object(llm, "analyze_message", analyze_message):
+            results = await llm.analyze_messages_batch(texts, "rule")
+
+        assert len(batch_calls) == 2
+        assert single_calls == ["broken 4", "broken 5", "other 6"]
+        assert [result["is_match"] for result in results] == [True, False, True, False, False, False]
+
+    @pytest.mark.asyncio
+    async def test_messages_that_still_fail_are_none(self, llm):
+        texts = ["lead 1", "other 2", "lead 3", "broken 4", "broken 5"]
+
+        async def analyze_batch(message_texts, rule_description):
+            if message_texts[0].startswith("broken"):
+                raise httpx.ReadTimeout("timeout")
+            return {number: self.verdict(text) for number, text in enumerate(message_texts, start=1)}
+
+        async def analyze_message(message_text, rule_description):
+            raise httpx.ReadTimeout("timeout")
+
+        with patch.object(llm, "_analyze_batch", analyze_batch), \
+                patch.object(llm, "analyze_message", analyze_message):
+            results = await llm.analyze_messages_batch(texts, "rule")
+
+        assert [result and result["is_match"] for result in results] == [True, False, True, None, None]
+
+    @pytest.mark.asyncio
+    async def test_raises_when_nothing_succeeded(self, llm):
+        async def fail(*args):
+            raise httpx.ConnectError("LLM is down")
+
+        with patch.object(llm, "_analyze_batch", fail), patch.object(llm, "analyze_message", fail):
+            with pytest.raises(httpx.ConnectError):
+                await llm.analyze_messages_batch(["a", "b", "c", "d"], "rule")
@@ -0,0 +1,100 @@
+"""
+Tests for the pipelined collection job of MessageCollectorWorkerV2.
+"""
+from unittest.mock import patch
+
+import pytest
+
+from app.workers import message_collector_v2 as worker_module
+from app.workers.message_collector_v2 import MessageCollectorWorkerV2
+
+
+class FakeSession:
+    def close(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+def processing_result(channels, leads=1):
+    return {
+        "messages_analyzed": 2 * channels,
+        "leads_created": leads,
+        "prefilter_skipped": 1,
+        "lead_ids": ["lead"] * leads,
+        "errors": [],
+        "tenants": {
+            "tenant": {
+                "tenant_id": "tenant",
+                "rules_processed": 1,
+                "messages_analyzed": 2 * channels,
+                "leads_created": leads,
+                "prefilter_skipped": {"rule": 1},
+                "lead_ids": ["lead"] * leads,
+                "errors": [],
+            }
+        },
+    }
+
+
+@pytest.fixture
+def run_job():
+    """Runs collect_and_analyze_job with collector and rule processor replaced by fakes."""
+    async def run(collect, process):
+        with patch.object(worker_module, "get_session_local", lambda: FakeSession), \
+                patch.object(worker_module.global_message_collector, "collect_global_messages", collect), \
+                patch.object(worker_module.rule_processor_v2, "process_new_messages", process):
+            return await MessageCollectorWorkerV2().collect_and_analyze_job()
+    return run
+
+
+class TestPipeline:
+    """Test collection -> classification pipeline."""
+
+    @pytest.mark.asyncio
+    async def test_collected_channels_are_classified_and_swept(self, run_job):
+        calls = []
+
+        async def collect(db, exclude_channel_ids=None, collected_queue=None):
+            for channel_id in range(1, 6):
+                await collected_queue.put(channel_id)
+            return {"channels_processed": 5, "messages_collected": 20, "errors": []}
+
+        async def process(db, channel_ids=None, exclude_channel_ids=None):
+            calls.append((channel_ids, exclude_channel_ids))
+            if channel_ids and 5 in channel_ids:
+                raise RuntimeError("LLM unavailable")
+            return processing_result(len(channel_ids or ()))
+
+        result = await run_job(collect, process)
+
+        classified = set().union(*(channel_ids for channel_ids, _ in calls if channel_ids))
+        sweep_exclude = [exclude for channel_ids, exclude in calls if channel_ids is None]
+
+        assert classified == {1, 2, 3, 4, 5}
+        # Channels of the failed batch are left for the final sweep
+        assert len(sweep_exclude) == 1
+        assert 5 not in sweep_exclude[0]
+        assert result["global_messages_collected"] == 20
+        assert result["errors"] == ["Pipeline: error processing rules: LLM unavailable"]
+        assert result["tenants_stats"][0]["prefilter_skipped"]["rule"] == len(calls) - 1
+        assert result["total_leads_created"] == len(calls) - 1
+
+    @pytest.mark.asyncio
+    async def test_error_result_has_the_same_keys(self, run_job):
+        async def collect(db, exclude_channel_ids=None, collected_queue=None):
+            return {"channels_processed": 0, "messages_collected": 0, "errors": []}
+
+        async def process(db, channel_ids=None, exclude_channel_ids=None):
+            return processing_result(0, leads=0)
+
+        async def broken_collect(db, exclude_channel_ids=None, collected_queue=None):
+            raise RuntimeError("database is down")
+
+        success = await run_job(collect, process)
+        failure = await run_job(broken_collect, process)
+
+        assert set(failure) == set(success)
+        assert failure["errors"] == ["database is down"]
+        assert failure["total_prefilter_skipped"] == 0
@@ -0,0 +1,279 @@
+"""
+Tests for NotificationDispatcher (notification outbox delivery).
+"""
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Query, Session
+
+from app.services import notification_dispatcher as dispatcher_module
+from app.services.notification_dispatcher import NotificationDispatcher
+from app.services.notification_service import DeliverySkipped, PermanentDeliveryError
+
+
+class RecordingQuery(Query):
+    """Query that returns prepared rows and records statements instead of executing them."""
+
+    def all(self):
+        self.session.info["statements"].append(self.statement)
+        return self.session.info["rows"]
+
+    def update(self, values, synchronize_session="auto", update_args=None):
+        self.session.info["updates"].append((self.statement, values))
+        return self.session.info.get("update_rowcount", 1)
+
+
+def make_session(rows=None):
+    session = Session(query_cls=RecordingQuery)
+    session.info.update(rows=rows or [], statements=[], updates=[])
+    return session
+
+
+def compile_sql(statement) -> str:
+    return str(statement.compile(dialect=postgresql.dialect()))
+
+
+def make_entry(attempts=0, error=None, final_status=None):
+    return {
+        "id": uuid.uuid4(),
+        "idempotency_key": f"new_lead:{uuid.uuid4()}",
+        "channel": "email",
+        "payload": {},
+        "attempts": attempts,
+        "locked_until": datetime(2026, 1, 1, 12, 5),
+        "error": error,
+        "final_status": final_status,
+    }
+
+
+@pytest.fixture
+def dispatcher():
+    return NotificationDispatcher(
+        batch_size=10,
+        concurrency=2,
+        max_attempts=3,
+        retry_base=30,
+        retry_max=100,
+        lease=60,
+    )
+
+
+class TestClaim:
+    """Test claiming due outbox records."""
+
+    def test_claims_due_rows_with_lease(self, dispatcher):
+        row = SimpleNamespace(
+            id=uuid.uuid4(),
+            idempotency_key="new_lead:1",
+            channel="telegram",
+            payload={"chat_id": "1"},
+            attempts=1,
+            locked_until=None,
+        )
+        db = make_session([row])
+
+        before = datetime.utcnow()
+        entries = dispatcher._claim(db)
+
+        assert entries == [{
+            "id": row.id,
+            "idempotency_key": "new_lead:1",
+            "channel": "telegram",
+            "payload": {"chat_id": "1"},
+            "attempts": 1,
+            "locked_until": row.locked_until,
+        }]
+        assert row.locked_until >= before + timedelta(seconds=60)
+
+    def test_claim_query(self, dispatcher):
+        """Due pending rows without a live lease, oldest first, locked with SKIP LOCKED."""
+        db = make_session()
+
+        assert dispatcher._claim(db) == []
+
+        sql = compile_sql(db.info["statements"][0])
+        assert "notification_outbox.status = %(status_1)s" in sql
+        assert "notification_outbox.next_attempt_at <= %(next_attempt_at_1)s" in sql
+        assert "notification_outbox.locked_until IS NULL OR notification_outbox.locked_until <" in sql
+        assert "ORDER BY notification_outbox.next_attempt_at ASC" in sql
+        assert "LIMIT %(param_1)s" in sql
+        assert sql.endswith("FOR UPDATE SKIP LOCKED")
+
+
+class TestRenewLease:
+    """Test lease renewal right before a delivery."""
+
+    def test_renews_only_own_lease(self, dispatcher):
+        entry = make_entry()
+        claimed_until = entry["locked_until"]
+        db = make_session()
+
+        before = datetime.utcnow()
+        assert dispatcher._renew_lease(db, entry) is True
+
+        (statement, values), = db.info["updates"]
+        sql = compile_sql(statement)
+        assert "notification_outbox.status = %(status_1)s" in sql
+        assert "notification_outbox.locked_until = %(locked_until_1)s" in sql
+        assert statement.compile().params["locked_until_1"] == claimed_until
+        assert values["locked_until"] >= before + timedelta(seconds=60)
+        assert entry["locked_until"] == values["locked_until"]
+
+    def test_lost_lease(self, dispatcher):
+        entry = make_entry()
+        claimed_until = entry["locked_until"]
+        db = make_session()
+        db.info["update_rowcount"] = 0
+
+        assert dispatcher._renew_lease(db, entry) is False
+        assert entry["locked_until"] == claimed_until
+
+
+class TestRecordResults:
+    """Test delivery status updates."""
+
+    def record(self, dispatcher, entry):
+        db = make_session()
+        before = datetime.utcnow()
+        dispatcher._record_results(db, [entry])
+        (_, values), = db.info["updates"]
+        return values, before
+
+    def test_sent(self, dispatcher):
+        values, before = self.record(dispatcher, make_entry())
+
+        assert values["status"] == "sent"
+        assert values["attempts"] == 1
+        assert values["locked_until"] is None
+        assert values["last_error"] is None
+        assert values["sent_at"] >= before
+
+    def test_retry_with_exponential_backoff(self, dispatcher):
+        first, before = self.record(dispatcher, make_entry(attempts=0, error="OSError: timeout"))
+        second, _ = self.record(dispatcher, make_entry(attempts=1, error="OSError: timeout"))
+
+        assert "status" not in first
+        assert first["last_error"] == "OSError: timeout"
+        assert first["next_attempt_at"] - before >= timedelta(seconds=30)
+        assert first["next_attempt_at"] - before < timedelta(seconds=60)
+        assert second["next_attempt_at"] - before >= timedelta(seconds=60)
+
+    def test_backoff_is_capped(self):
+        dispatcher = NotificationDispatcher(max_attempts=20, retry_base=30, retry_max=100)
+        db = make_session()
+
+        before = datetime.utcnow()
+        dispatcher._record_results(db, [make_entry(attempts=10, error="OSError: timeout")])
+        (_, values), = db.info["updates"]
+
+        assert values["next_attempt_at"] - before < timedelta(seconds=101)
+
+    def test_failed_after_max_attempts(self, dispatcher):
+        values, _ = self.record(dispatcher, make_entry(attempts=2, error="OSError: timeout"))
+
+        assert values["status"] == "failed"
+        assert values["attempts"] == 3
+        assert "next_attempt_at" not in values
+
+    def test_updates_only_rows_under_own_lease(self, dispatcher):
+        db = make_session()
+
+        dispatcher._record_results(db, [make_entry(), make_entry(final_status="lease_lost")])
+
+        (statement, _), = db.info["updates"]
+        sql = compile_sql(statement)
+        assert "notification_outbox.status = %(status_1)s" in sql
+        assert "notification_outbox.locked_until = %(locked_until_1)s" in sql
+
+    def test_final_status_is_not_retried(self, dispatcher):
+        skipped, _ = self.record(
+            dispatcher, make_entry(error="SMTP is not configured", final_status="skipped")
+        )
+        failed, _ = self.record(
+            dispatcher, make_entry(error="SMTPRecipientsRefused", final_status="failed")
+        )
+
+        assert skipped["status"] == "skipped"
+        assert skipped["last_error"] == "SMTP is not configured"
+        assert failed["status"] == "failed"
+        assert "next_attempt_at" not in failed
+
+
+class TestDispatchOnce:
+    """Test one dispatch pass."""
+
+    @pytest.mark.asyncio
+    async def test_delivers_with_bounded_concurrency(self, dispatcher):
+        entries = [make_entry() for _ in range(5)]
+        entries[1]["channel"] = "skip"
+        entries[2]["channel"] = "permanent"
+        entries[3]["channel"] = "retry"
+
+        in_flight = 0
+        max_in_flight = 0
+
+        async def deliver(entry):
+            nonlocal in_flight, max_in_flight
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            if entry["channel"] == "skip":
+                raise DeliverySkipped("SMTP is not configured")
+            if entry["channel"] == "permanent":
+                raise PermanentDeliveryError("SMTPRecipientsRefused")
+            if entry["channel"] == "retry":
+                raise OSError("timeout")
+
+        recorded = []
+        with patch.object(dispatcher_module, "get_session_local", lambda: make_session), \
+                patch.object(dispatcher, "_claim", lambda db: entries), \
+                patch.object(dispatcher, "_renew_lease", lambda db, entry: True), \
+                patch.object(dispatcher, "_deliver", deliver), \
+                patch.object(dispatcher, "_record_results", lambda db, results: recorded.extend(results)):
+            processed = await dispatcher.dispatch_once()
+
+        assert processed == 5
+        assert max_in_flight == 2
+        assert [(entry["error"], entry["final_status"]) for entry in recorded] == [
+            (None, None),
+            ("SMTP is not configured", "skipped"),
+            ("SMTPRecipientsRefused", "failed"),
+            ("OSError: timeout", None),
+            (None, None),
+        ]
+
+    @pytest.mark.asyncio
+    async def test_lost_lease_and_timeout(self, dispatcher):
+        """Rows whose lease was taken over are not sent; slow sends are cut off by send_timeout."""
+        dispatcher.send_timeout = 0.01
+        lost, slow = make_entry(), make_entry()
+        delivered = []
+
+        async def deliver(entry):
+            if entry is slow:
+                await asyncio.sleep(1)
+            delivered.append(entry)
+
+        recorded = []
+        with patch.object(dispatcher_module, "get_session_local", lambda: make_session), \
+                patch.object(dispatcher, "_claim", lambda db: [lost, slow]), \
+                patch.object(dispatcher, "_renew_lease", lambda db, entry: entry is not lost), \
+                patch.object(dispatcher, "_deliver", deliver), \
+                patch.object(dispatcher, "_record_results", lambda db, results: recorded.extend(results)):
+            await dispatcher.dispatch_once()
+
+        assert delivered == []
+        assert lost["final_status"] == "lease_lost"
+        assert slow["final_status"] is None
+        assert slow["error"].startswith("TimeoutError")
+
+    def test_send_timeout_is_under_the_lease(self):
+        dispatcher = NotificationDispatcher(lease=60, send_timeout=300)
+
+        assert dispatcher.send_timeout == 30
@@ -0,0 +1,143 @@
+"""
+Tests for the lexical prefilter.
+"""
+import uuid
+
+from app.services.prefilter_service import KeywordAutomaton, RulePrefilterIndex, derive_keywords
+
+
+def make_target(prefilter, prompt="Ищу python разработчика для стартапа"):
+    return {"rule_id": uuid.uuid4(), "prompt": prompt, "prefilter": prefilter}
+
+
+class TestKeywordAutomaton:
+    """Test Aho-Corasick keyword search."""
+
+    def test_finds_all_keywords(self):
+        automaton = KeywordAutomaton(["he", "she", "his", "hers"])
+
+        found = {automaton.keywords[i] for i in automaton.search("ushers")}
+
+        assert found == {"he", "she", "hers"}
+
+    def test_overlapping_and_suffix_matches(self):
+        """Keywords that are suffixes of other keywords are found through fail links."""
+        automaton = KeywordAutomaton(["abcd", "bc", "c"])
+
+        found = {automaton.keywords[i] for i in automaton.search("xabcx")}
+
+        assert found == {"bc", "c"}
+
+    def test_no_match(self):
+        automaton = KeywordAutomaton(["python"])
+
+        assert automaton.search("ищу java разработчика") == set()
+
+    def test_keywords_are_normalized(self):
+        """Keywords are lowercased and ё is folded to е."""
+        automaton = KeywordAutomaton(["  Ёлка "])
+
+        assert automaton.keywords == ["елка"]
+        assert automaton.search("купить елку") == set()
+        assert automaton.search("новая елка") == {0}
+
+
+class TestDeriveKeywords:
+    def test_stems_and_stopwords(self):
+        keywords = derive_keywords("Ищу Python разработчика, нужен разработчик")
+
+        assert keywords == ["python", "разраб"]
+
+
+class TestRulePrefilterIndex:
+    """Test per-rule prefilter decisions."""
+
+    def test_rule_without_prefilter_passes(self):
+        target = make_target(None)
+        index = RulePrefilterIndex([target])
+
+        assert index.is_empty
+        assert index.rejected("anything", [target["rule_id"]]) == set()
+
+    def test_include_keywords(self):
+        target = make_target({"include_keywords": ["python", "django"]})
+        index = RulePrefilterIndex([target])
+
+        assert index.rejected("Нужен PYTHON developer") == set()
+        assert index.rejected("Нужен java developer") == {target["rule_id"]}
+
+    def test_exclude_keywords(self):
+        target = make_target({"exclude_keywords": ["вакансия закрыта"]})
+        index = RulePrefilterIndex([target])
+
+        assert index.rejected("Python, вакансия закрыта") == {target["rule_id"]}
+        assert index.rejected("Python developer") == set()
+
+    def test_include_patterns(self):
+        target = make_target({"include_patterns": [r"\d+\s*(k|тыс)"]})
+        index = RulePrefilterIndex([target])
+
+        assert index.rejected("бюджет 100 тыс") == set()
+        assert index.rejected("бюджет обсуждается") == {target["rule_id"]}
+
+    def test_keyword_or_pattern_includes(self):
+        """Include keywords and include patterns are alternatives."""
+        target = make_target({"include_keywords": ["python"], "include_patterns": [r"\bgo(lang)?\b"]})
+        index = RulePrefilterIndex([target])
+
+        assert index.rejected("golang developer") == set()
+        assert index.rejected("python developer") == set()
+        assert index.rejected("java developer") == {target["rule_id"]}
+
+    def test_exclude_patterns(self):
+        target = make_target({"exclude_patterns": [r"^#реклама"]})
+        index = RulePrefilterIndex([target])
+
+        assert index.rejected("#реклама python курсы") == {target["rule_id"]}
+
+    def test_inline_flag_patterns(self):
+        """Patterns with inline flags are valid on their own and are not joined into one regex."""
+        target = make_target({"include_patterns": ["(?i)python", "(?i)django"]})
+        index = RulePrefilterIndex([target])
+
+        assert index.rejected("Django project") == set()
+        assert index.rejected("Rails project") == {target["rule_id"]}
+
+    def test_invalid_include_pattern_fails_open(self):
+        """An invalid include pattern disables the include check instead of rejecting everything."""
+        broken = make_target({"include_patterns": ["(unclosed"]})
+        other = make_target({"include_keywords": ["python"]})
+        index = RulePrefilterIndex([broken, other])
+
+        assert index.rejected("java developer") == {other["rule_id"]}
+        assert index.rejected("java developer", [broken["rule_id"]]) == set()
+
+    def test_invalid_exclude_pattern_fails_open(self):
+        target = make_target({"exclude_patterns": ["(unclosed"], "include_keywords": ["python"]})
+        index = RulePrefilterIndex([target])
+
+        assert index.rejected("python (unclosed") == set()
+        assert index.rejected("java") == {target["rule_id"]}
+
+    def test_derive_from_prompt(self):
+        target = make_target({"derive_from_prompt": True})
+        index = RulePrefilterIndex([target])
+
+        assert index.rejected("Нужны разработчики на Python") == set()
+        assert index.rejected("Продам велосипед") == {target["rule_id"]}
+
+    def test_shared_keywords_between_rules(self):
+        """One keyword can include for one rule and exclude for another."""
+        include = make_target({"include_keywords": ["python"]})
+        exclude = make_target({"exclude_keywords": ["python"]})
+        index = RulePrefilterIndex([include, exclude])
+
+        assert index.rejected("python developer") == {exclude["rule_id"]}
+        assert index.rejected("java developer") == {include["rule_id"]}
+
+    def test_rule_ids_limit_candidates(self):
+        first = make_target({"include_keywords": ["python"]})
+        second = make_target({"include_keywords": ["java"]})
+        index = RulePrefilterIndex([first, second])
+
+        assert index.rejected("ruby developer", [first["rule_id"]]) == {first["rule_id"]}
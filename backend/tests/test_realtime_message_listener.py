@@ -0,0 +1,130 @@
+"""
+Tests for RealtimeMessageListener ingestion ordering.
+"""
+import uuid
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+from app.services import realtime_message_listener as listener_module
+from app.services.realtime_message_listener import RealtimeMessageListener
+
+
+CHANNEL_TG_ID = 12345
+
+
+class FakeSession:
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeChannelStore:
+    """Channel cursor and stored messages, standing in for global_channels / global_messages."""
+
+    def __init__(self, channel_id, last_message_id):
+        self.channel_id = channel_id
+        self.last_message_id = last_message_id
+        self.messages = []
+
+    def advance_cursor(self, channel_id, message_id, db):
+        if self.last_message_id != message_id - 1:
+            return False
+        self.last_message_id = message_id
+        return True
+
+    def is_gap(self, channel_id, message_id, db):
+        return self.last_message_id is None or message_id > self.last_message_id + 1
+
+    def insert_messages(self, channel_id, telegram_messages, db):
+        self.messages.extend(message["id"] for message in telegram_messages)
+        return [uuid.uuid4() for _ in telegram_messages]
+
+    async def collect_global_messages(self, db, channel_ids=None):
+        """Catch-up: collects everything after the cursor in order."""
+        backfill = list(range(self.last_message_id + 1, 14))
+        self.messages.extend(backfill)
+        self.last_message_id = 13
+        return {"messages_collected": len(backfill), "errors": []}
+
+
+def make_event(message_id):
+    return SimpleNamespace(chat_id=CHANNEL_TG_ID, message=message_id)
+
+
+@pytest.fixture
+def setup():
+    channel_id = uuid.uuid4()
+    store = FakeChannelStore(channel_id, last_message_id=10)
+    listener = RealtimeMessageListener()
+    listener._channels = {CHANNEL_TG_ID: channel_id}
+    listener._synced_channels = {channel_id}
+
+    def message_to_dict(message_id):
+        return {"id": message_id, "text": "text"}
+
+    with patch.object(listener_module, "get_session_local", lambda: FakeSession), \
+            patch.object(listener_module.telegram_service, "message_to_dict", message_to_dict), \
+            patch.object(listener_module.global_message_collector, "insert_messages", store.insert_messages), \
+            patch.object(listener_module.global_message_collector, "collect_global_messages",
+                         store.collect_global_messages), \
+            patch.object(listener, "_advance_cursor", store.advance_cursor), \
+            patch.object(listener, "_is_gap", store.is_gap):
+        yield listener, store, channel_id
+
+
+class TestOnNewMessage:
+    """Test that realtime events never overtake messages that were not collected yet."""
+
+    @pytest.mark.asyncio
+    async def test_contiguous_message_is_saved_and_dispatched(self, setup):
+        listener, store, channel_id = setup
+
+        await listener._on_new_message(make_event(11))
+
+        assert store.messages == [11]
+        assert store.last_message_id == 11
+        assert listener._pending_channels == {channel_id}
+
+    @pytest.mark.asyncio
+    async def test_gap_then_backfill(self, setup):
+        """A message after a gap is dropped; catch-up collects the gap and the message in order."""
+        listener, store, channel_id = setup
+
+        await listener._on_new_message(make_event(12))
+
+        assert store.messages == []
+        assert store.last_message_id == 10
+        assert channel_id not in listener._synced_channels
+        assert listener._pending_channels == set()
+
+        # Events of an unsynced channel are dropped as well
+        await listener._on_new_message(make_event(13))
+        assert store.messages == []
+
+        await listener._catch_up({channel_id}, FakeSession())
+
+        assert store.messages == [11, 12, 13]
+        assert channel_id in listener._synced_channels
+        assert listener._pending_channels == {channel_id}
+
+        await listener._on_new_message(make_event(14))
+
+        assert store.messages == [11, 12, 13, 14]
+        assert store.last_message_id == 14
+
+    @pytest.mark.asyncio
+    async def test_duplicate_keeps_channel_synced(self, setup):
+        listener, store, channel_id = setup
+
+        await listener._on_new_message(make_event(10))
+
+        assert store.messages == []
+        assert channel_id in listener._synced_channels
+        assert listener._pending_channels == set()
@@ -0,0 +1,324 @@
+"""
+Tests for the RuleProcessorV2 core: channel index, window processing, progress and lead writes.
+"""
+import asyncio
+import re
+import uuid
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Query, Session
+
+from app.services import rule_processor_v2 as processor_module
+from app.services.rule_processor_v2 import RuleProcessorV2
+
+
+T0 = datetime(2026, 1, 1, 12, 0, 0)
+TENANT_ID = uuid.uuid4()
+CHANNEL_ID = uuid.uuid4()
+
+
+class RecordingQuery(Query):
+    """Query that returns prepared rows instead of executing."""
+
+    def all(self):
+        return self.session.info["rows"]
+
+
+def statement_rows(statement):
+    """Rows of a (multi-values) INSERT, rebuilt from its compiled parameters."""
+    rows = {}
+    for name, value in statement.compile(dialect=postgresql.dialect()).params.items():
+        match = re.fullmatch(r"(.+)_m(\d+)", name)
+        column, row = (match.group(1), int(match.group(2))) if match else (name, 0)
+        rows.setdefault(row, {})[column] = value
+    return [rows[row] for row in sorted(rows)]
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def all(self):
+        return self.rows
+
+
+class FakeSession:
+    """Records lead inserts and progress upserts; leads in `conflicts` already exist."""
+
+    def __init__(self, conflicts=()):
+        self.conflicts = set(conflicts)
+        self.leads = []
+        self.progress = []
+        self.commits = 0
+
+    def execute(self, statement):
+        rows = statement_rows(statement)
+        if statement.table.name == "leads":
+            inserted = [row for row in rows if (row["rule_id"], row["global_message_id"]) not in self.conflicts]
+            self.leads.extend(inserted)
+            return FakeResult([(row["id"], row["rule_id"], row["global_message_id"]) for row in inserted])
+        self.progress.extend(rows)
+        return FakeResult([])
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        pass
+
+
+def make_target(name, threshold=0.5):
+    return {
+        "rule_id": uuid.uuid4(),
+        "name": name,
+        "tenant_id": TENANT_ID,
+        "prompt": f"prompt {name}",
+        "prompt_hash": f"hash {name}",
+        "prompt_version": 1,
+        "prefilter": None,
+        "threshold": threshold,
+        "channel_ids": frozenset(),
+    }
+
+
+def make_message(minutes, tg_id, text="Ищу python разработчика"):
+    return {"id": uuid.uuid4(), "position": (T0 + timedelta(minutes=minutes), tg_id), "text": text}
+
+
+def make_pair(target, cursor=(T0 - timedelta(days=1), 0)):
+    return {"target": target, "cursor": cursor, "progress": RuleProcessorV2._empty_progress()}
+
+
+def analysis(is_match, confidence=0.9):
+    return {"is_match": is_match, "confidence": confidence, "reasoning": "", "entities": None}
+
+
+@pytest.fixture
+def processor():
+    return RuleProcessorV2(prefilter_enabled=False)
+
+
+@pytest.fixture
+def run_window(processor):
+    """Runs _process_window with LLM results from `results` ({(rule_id, message_id): analysis})."""
+    async def run(batch, pairs, results, db=None, existing_leads=()):
+        db = db or FakeSession()
+        requested = []
+
+        async def classify(work):
+            requested.extend((target["rule_id"], item["id"]) for target, item in work)
+            return {key: results[key] for key in requested if key in results}
+
+        working_set = {
+            "recipients": {TENANT_ID: SimpleNamespace(id=uuid.uuid4())},
+            "channels": {CHANNEL_ID: {"title": "Channel", "username": "channel", "tg_id": 1}},
+            "existing_leads": set(existing_leads),
+        }
+        stats = {"tenants": {str(TENANT_ID): processor._empty_tenant_stats(TENANT_ID)}}
+        notifications = []
+
+        with patch.object(processor, "_classify", classify), \
+                patch.object(processor_module.message_analysis_service, "load", lambda db, **kwargs: {}), \
+                patch.object(processor_module.message_analysis_service, "store", lambda db, fresh, model: None), \
+                patch.object(processor_module.rule_verdict_service, "store", lambda db, verdicts: None), \
+                patch.object(processor_module.notification_service, "add_new_lead_notifications",
+                             lambda db, items: notifications.extend(items)), \
+                patch.object(processor_module.notification_service, "enqueue_new_lead_deliveries",
+                             lambda db, items: None), \
+                patch.object(processor_module.notification_dispatcher, "wake", lambda: None):
+            await processor._process_window(
+                CHANNEL_ID, batch, pairs, None, db, asyncio.Lock(), working_set, stats
+            )
+
+        return SimpleNamespace(
+            db=db,
+            requested=requested,
+            stats=stats["tenants"][str(TENANT_ID)],
+            notifications=notifications,
+            existing_leads=working_set["existing_leads"],
+        )
+    return run
+
+
+class TestChannelLocks:
+    """Per-channel locks are kept only while in use."""
+
+    @pytest.mark.asyncio
+    async def test_lock_is_dropped_after_release(self, processor):
+        async with processor._channel_lock(CHANNEL_ID):
+            assert CHANNEL_ID in processor._channel_locks
+
+        assert processor._channel_locks == {}
+
+    @pytest.mark.asyncio
+    async def test_waiters_share_the_lock(self, processor):
+        order = []
+
+        async def hold(name):
+            async with processor._channel_lock(CHANNEL_ID):
+                order.append(f"{name} start")
+                await asyncio.sleep(0.01)
+                order.append(f"{name} end")
+
+        await asyncio.gather(hold("first"), hold("second"))
+
+        assert order == ["first start", "first end", "second start", "second end"]
+        assert processor._channel_locks == {}
+
+    @pytest.mark.asyncio
+    async def test_lock_is_dropped_after_error(self, processor):
+        with pytest.raises(RuntimeError):
+            async with processor._channel_lock(CHANNEL_ID):
+                raise RuntimeError("boom")
+
+        assert processor._channel_locks == {}
+
+
+class TestBuildChannelIndex:
+    """Test the channel -> rules index."""
+
+    def test_rule_channel_filter(self, processor):
+        other_channel = uuid.uuid4()
+        all_channels = SimpleNamespace(
+            id=uuid.uuid4(), name="all", tenant_id=TENANT_ID, prompt="a", prompt_version=1,
+            prefilter=None, threshold=0.7, channel_ids=None,
+        )
+        one_channel = SimpleNamespace(
+            id=uuid.uuid4(), name="one", tenant_id=TENANT_ID, prompt="b", prompt_version=2,
+            prefilter={"include_keywords": ["python"]}, threshold=0.5, channel_ids=[CHANNEL_ID],
+        )
+        db = Session(query_cls=RecordingQuery)
+        db.info["rows"] = [
+            (all_channels, CHANNEL_ID),
+            (all_channels, other_channel),
+            (one_channel, CHANNEL_ID),
+            (one_channel, other_channel),
+        ]
+
+        index = processor._build_channel_index(db)
+
+        assert {channel_id: [t["name"] for t in targets] for channel_id, targets in index.items()} == {
+            CHANNEL_ID: ["all", "one"],
+            other_channel: ["all"],
+        }
+        # One target dict per rule, shared by all its channels
+        assert index[CHANNEL_ID][0] is index[other_channel][0]
+        assert index[CHANNEL_ID][1]["threshold"] == 0.5
+        assert index[CHANNEL_ID][1]["prefilter"] == {"include_keywords": ["python"]}
+
+
+class TestProcessWindow:
+    """Test classification, lead creation and cursor advancement for one window."""
+
+    @pytest.mark.asyncio
+    async def test_each_rule_sees_only_messages_after_its_cursor(self, run_window):
+        first, second, no_text = make_message(1, 101), make_message(2, 102), make_message(3, 103, text="")
+        behind, ahead = make_target("behind"), make_target("ahead")
+        pairs = [make_pair(behind), make_pair(ahead, cursor=first["position"])]
+        results = {
+            (behind["rule_id"], first["id"]): analysis(False, 0.1),
+            (behind["rule_id"], second["id"]): analysis(True, 0.9),
+            (ahead["rule_id"], second["id"]): analysis(False, 0.2),
+        }
+
+        result = await run_window([first, second, no_text], pairs, results)
+
+        assert sorted(result.requested) == sorted(results)
+        assert [(lead["rule_id"], lead["global_message_id"]) for lead in result.db.leads] == [
+            (behind["rule_id"], second["id"])
+        ]
+        assert result.stats["leads_created"] == 1
+        assert len(result.notifications) == 1
+
+        # Both cursors end on the last message of the window and are flushed in one upsert
+        assert [pair["cursor"] for pair in pairs] == [no_text["position"]] * 2
+        progress = {row["rule_id"]: row for row in result.db.progress}
+        assert progress[behind["rule_id"]]["last_sent_at"] == no_text["position"][0]
+        assert progress[behind["rule_id"]]["last_tg_message_id"] == 103
+        assert progress[behind["rule_id"]]["messages_analyzed"] == 3
+        assert progress[behind["rule_id"]]["leads_created"] == 1
+        assert progress[ahead["rule_id"]]["messages_analyzed"] == 2
+        assert progress[ahead["rule_id"]]["leads_created"] == 0
+        assert all(pair["progress"]["messages_analyzed"] == 0 for pair in pairs)
+
+    @pytest.mark.asyncio
+    async def test_llm_failure_stops_the_cursor_in_message_order(self, run_window):
+        """A later message classified fine does not move the cursor over an earlier failed one."""
+        first, failed, later = make_message(1, 101), make_message(2, 102), make_message(3, 103)
+        target = make_target("rule")
+        pairs = [make_pair(target)]
+        results = {
+            (target["rule_id"], first["id"]): analysis(False, 0.1),
+            (target["rule_id"], later["id"]): analysis(True, 0.9),
+        }
+
+        result = await run_window([first, failed, later], pairs, results)
+
+        assert pairs[0]["stalled"]
+        assert pairs[0]["cursor"] == first["position"]
+        assert result.db.leads == []
+        (progress,) = result.db.progress
+        assert progress["last_tg_message_id"] == 101
+
+    @pytest.mark.asyncio
+    async def test_existing_leads_are_not_reclassified_or_duplicated(self, run_window):
+        known, raced = make_message(1, 101), make_message(2, 102)
+        target = make_target("rule")
+        pairs = [make_pair(target)]
+        results = {(target["rule_id"], raced["id"]): analysis(True, 0.9)}
+        # Lead for `raced` was created by another process after the working set was loaded
+        db = FakeSession(conflicts={(target["rule_id"], raced["id"])})
+
+        result = await run_window(
+            [known, raced], pairs, results, db=db, existing_leads={(target["rule_id"], known["id"])}
+        )
+
+        assert result.requested == [(target["rule_id"], raced["id"])]
+        assert result.db.leads == []
+        assert result.stats["leads_created"] == 0
+        assert result.notifications == []
+        assert (target["rule_id"], raced["id"]) in result.existing_leads
+        assert pairs[0]["cursor"] == raced["position"]
+
+
+class TestWriteLeads:
+    """Test bulk lead insert with deduplication."""
+
+    def test_only_inserted_leads_are_counted_and_notified(self, processor):
+        target = make_target("rule")
+        pair = make_pair(target)
+        new, duplicate = make_message(1, 101), make_message(2, 102)
+        db = FakeSession(conflicts={(target["rule_id"], duplicate["id"])})
+        working_set = {
+            "recipients": {TENANT_ID: SimpleNamespace(id=uuid.uuid4())},
+            "channels": {CHANNEL_ID: {"title": "Channel", "username": "channel", "tg_id": 1}},
+            "existing_leads": set(),
+        }
+        stats = {"tenants": {str(TENANT_ID): processor._empty_tenant_stats(TENANT_ID)}}
+        new_leads = [
+            {"pair": pair, "item": new, "analysis": analysis(True, 0.876)},
+            {"pair": pair, "item": duplicate, "analysis": analysis(True, 0.9)},
+        ]
+
+        with patch.object(processor_module.notification_service, "add_new_lead_notifications",
+                          lambda db, items: None), \
+                patch.object(processor_module.notification_service, "enqueue_new_lead_deliveries",
+                             lambda db, items: None):
+            notifications = processor._write_leads(CHANNEL_ID, new_leads, db, working_set, stats)
+
+        (lead,) = db.leads
+        assert lead["global_message_id"] == new["id"]
+        assert str(lead["score"]) == "0.88"
+        assert pair["progress"]["leads_created"] == 1
+        assert stats["tenants"][str(TENANT_ID)]["lead_ids"] == [lead["id"]]
+        assert working_set["existing_leads"] == {
+            (target["rule_id"], new["id"]),
+            (target["rule_id"], duplicate["id"]),
+        }
+        ((payload, _),) = notifications
+        assert payload["lead_id"] == str(lead["id"])
+        assert payload["message_link"] == "https://t.me/channel/101"
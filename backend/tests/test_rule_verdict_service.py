@@ -0,0 +1,162 @@
+"""
+Tests for re-applying a rule threshold to stored verdicts.
+"""
+import uuid
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Query, Session
+
+from app.models.rule import Rule
+from app.services import rule_verdict_service as verdict_module
+from app.services.llm_service import fallback_entities
+from app.services.rule_verdict_service import RuleVerdictService, THRESHOLD_ARCHIVE_REASON
+
+
+class RecordingQuery(Query):
+    """Query that returns prepared results and records statements instead of executing them."""
+
+    def all(self):
+        self.session.info["statements"].append(self.statement)
+        return self.session.info["results"].pop(0)
+
+    def first(self):
+        return self.session.info["recipient"]
+
+    def update(self, values, synchronize_session="auto", update_args=None):
+        self.session.info["updates"].append((self.statement, values))
+        return self.session.info["update_counts"].pop(0)
+
+
+class RecordingSession(Session):
+    def execute(self, statement, *args, **kwargs):
+        self.info["executed"].append(statement)
+        return SimpleNamespace(all=lambda: self.info["inserted"])
+
+
+def make_session(results=(), update_counts=(), inserted=(), recipient=None):
+    session = RecordingSession(query_cls=RecordingQuery)
+    session.info.update(
+        results=list(results),
+        update_counts=list(update_counts),
+        inserted=list(inserted),
+        recipient=recipient,
+        statements=[],
+        updates=[],
+        executed=[],
+    )
+    return session
+
+
+def compile_sql(statement) -> str:
+    return str(statement.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+
+
+@pytest.fixture
+def rule():
+    return Rule(
+        id=uuid.uuid4(),
+        tenant_id=uuid.uuid4(),
+        name="rule",
+        prompt="Ищу python разработчика",
+        prompt_version=3,
+        threshold=Decimal("0.60"),
+    )
+
+
+@pytest.fixture
+def service():
+    return RuleVerdictService()
+
+
+class TestApplyThreshold:
+    """Restore, create and archive transitions keyed on archive_reason."""
+
+    def test_transitions(self, service, rule):
+        db = make_session(update_counts=[2, 5])
+        calls = []
+
+        def create(db, rule, current, passes, now):
+            # Leads are created after threshold-archived leads are restored, before archiving
+            calls.append(len(db.info["updates"]))
+            return 4
+
+        with patch.object(service, "_create_passing_leads", create):
+            result = service.apply_threshold(db, rule)
+
+        assert result == {"leads_created": 4, "leads_restored": 2, "leads_archived": 5}
+        assert calls == [1]
+
+        (restore, restore_values), (archive, archive_values) = db.info["updates"]
+
+        restore_sql = compile_sql(restore)
+        assert "leads.status = 'archived'" in restore_sql
+        assert f"leads.archive_reason = '{THRESHOLD_ARCHIVE_REASON}'" in restore_sql
+        assert "rule_verdicts.prompt_version = 3" in restore_sql
+        assert "rule_verdicts.is_match = true AND rule_verdicts.confidence >= 0.6" in restore_sql
+        assert restore_values["status"] == "new"
+        assert restore_values["archive_reason"] is None
+
+        archive_sql = compile_sql(archive)
+        # Only untouched leads are archived: user-archived and worked-on leads keep their status
+        assert "leads.status = 'new'" in archive_sql
+        assert "leads.archive_reason" not in archive_sql.split("WHERE", 1)[1]
+        assert "rule_verdicts.is_match = false OR rule_verdicts.confidence < 0.6" in archive_sql
+        assert archive_values["status"] == "archived"
+        assert archive_values["archive_reason"] == THRESHOLD_ARCHIVE_REASON
+
+
+class TestCreatePassingLeads:
+    """Leads created by a threshold change get entities and notifications."""
+
+    def test_creates_leads_and_notifies(self, service, rule):
+        first, second = uuid.uuid4(), uuid.uuid4()
+        created_lead = SimpleNamespace(id=uuid.uuid4())
+        recipient = SimpleNamespace(id=uuid.uuid4())
+        db = make_session(
+            results=[
+                [
+                    (first, 0.876, "match", "text", {"summary": "stored"}),
+                    (second, 0.9, "match", "Пишите @user", None),
+                ],
+                [created_lead],
+            ],
+            # The second lead was created concurrently by the rule processor
+            inserted=[(created_lead.id,)],
+            recipient=recipient,
+        )
+        notified, enqueued = [], []
+
+        with patch.object(verdict_module.notification_service, "new_lead_payload",
+                          lambda lead: {"lead_id": str(lead.id)}), \
+                patch.object(verdict_module.notification_service, "add_new_lead_notifications",
+                             lambda db, items: notified.extend(items)), \
+                patch.object(verdict_module.notification_service, "enqueue_new_lead_deliveries",
+                             lambda db, items: enqueued.extend(items)):
+            created = service._create_passing_leads(db, rule, [], [], now=None)
+
+        assert created == 1
+
+        verdicts_sql = compile_sql(db.info["statements"][0])
+        assert "LEFT OUTER JOIN message_analysis" in verdicts_sql
+        assert "NOT (EXISTS (SELECT" in verdicts_sql
+
+        (insert,) = db.info["executed"]
+        rows = insert.compile(dialect=postgresql.dialect()).params
+        assert rows["extracted_entities_m0"] == {"summary": "stored"}
+        assert rows["extracted_entities_m1"] == fallback_entities("Пишите @user")
+        assert rows["score_m0"] == Decimal("0.88")
+        assert "ON CONFLICT ON CONSTRAINT uq_lead_tenant_message_rule DO NOTHING" in str(
+            insert.compile(dialect=postgresql.dialect())
+        )
+
+        assert notified == enqueued == [({"lead_id": str(created_lead.id)}, recipient)]
+
+    def test_nothing_to_create(self, service, rule):
+        db = make_session(results=[[]])
+
+        assert service._create_passing_leads(db, rule, [], [], now=None) == 0
+        assert db.info["executed"] == []
@@ -0,0 +1,145 @@
+"""
+Tests for rule update side effects (prompt vs threshold changes) and rule statistics.
+"""
+import uuid
+from datetime import datetime
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Query, Session
+
+from app.api.v1 import rules as rules_module
+from app.models.rule import Rule
+from app.models.rule_analysis_progress import RuleAnalysisProgress
+from app.schemas.rule import RuleUpdate
+
+
+class RecordingQuery(Query):
+    """Query that returns prepared results and records statements instead of executing them."""
+
+    def first(self):
+        return self.session.info["rule"]
+
+    def scalar(self):
+        return 0
+
+    def all(self):
+        self.session.info["statements"].append(self.statement)
+        return self.session.info["rows"]
+
+    def delete(self, synchronize_session="auto", delete_args=None):
+        self.session.info["deleted"].append(self.column_descriptions[0]["entity"])
+        return 2
+
+
+class RecordingSession(Session):
+    def commit(self):
+        self.info["commits"] += 1
+
+    def refresh(self, instance, *args, **kwargs):
+        pass
+
+
+def make_session(rule=None, rows=()):
+    session = RecordingSession(query_cls=RecordingQuery)
+    session.info.update(rule=rule, rows=list(rows), statements=[], deleted=[], commits=0)
+    return session
+
+
+@pytest.fixture
+def rule():
+    now = datetime(2026, 1, 1)
+    return Rule(
+        id=uuid.uuid4(),
+        tenant_id=uuid.uuid4(),
+        name="rule",
+        prompt="Ищу python разработчика",
+        prompt_version=2,
+        threshold=Decimal("0.70"),
+        is_active=True,
+        schedule={"always": True},
+        classifier_samples=500,
+        classifier_agreement=0.98,
+        classifier_trained_at=now,
+        created_at=now,
+        updated_at=now,
+    )
+
+
+async def update(rule, db, **fields):
+    applied = []
+    with patch.object(rules_module.rule_verdict_service, "apply_threshold",
+                      lambda db, rule: applied.append(rule)):
+        response = await rules_module.update_rule(
+            rule_id=rule.id,
+            rule_update=RuleUpdate(**fields),
+            current_tenant=SimpleNamespace(id=rule.tenant_id),
+            current_user=None,
+            db=db,
+        )
+    return response, applied
+
+
+class TestUpdateRule:
+    """Prompt changes re-analyze messages, threshold-only changes reuse stored verdicts."""
+
+    @pytest.mark.asyncio
+    async def test_threshold_only_reapplies_verdicts(self, rule):
+        db = make_session(rule)
+
+        response, applied = await update(rule, db, threshold=Decimal("0.50"))
+
+        assert applied == [rule]
+        assert rule.prompt_version == 2
+        assert rule.classifier_samples == 500
+        assert db.info["deleted"] == []
+        assert db.info["commits"] == 1
+        assert response.threshold == Decimal("0.50")
+
+    @pytest.mark.asyncio
+    async def test_prompt_change_bumps_version_and_resets_progress(self, rule):
+        db = make_session(rule)
+
+        _, applied = await update(rule, db, prompt="Ищу golang разработчика", threshold=Decimal("0.50"))
+
+        # Verdicts of the old prompt version are not re-applied
+        assert applied == []
+        assert rule.prompt_version == 3
+        assert rule.classifier_samples is None
+        assert rule.classifier_agreement is None
+        assert rule.classifier_trained_at is None
+        assert db.info["deleted"] == [RuleAnalysisProgress]
+        assert db.info["commits"] == 1
+
+    @pytest.mark.asyncio
+    async def test_unchanged_values_have_no_side_effects(self, rule):
+        db = make_session(rule)
+
+        _, applied = await update(rule, db, prompt=rule.prompt, threshold=Decimal("0.70"), name="renamed")
+
+        assert applied == []
+        assert rule.prompt_version == 2
+        assert db.info["deleted"] == []
+        assert rule.name == "renamed"
+
+
+class TestCountPrefiltered:
+    def test_one_grouped_query(self):
+        first, second = uuid.uuid4(), uuid.uuid4()
+        db = make_session(rows=[(first, 7)])
+
+        counts = rules_module._count_prefiltered([first, second], db)
+
+        assert counts == {first: 7}
+        (statement,) = db.info["statements"]
+        sql = str(statement.compile(dialect=postgresql.dialect()))
+        assert "GROUP BY rule_analysis_progress.rule_id" in sql
+
+    def test_no_rules(self):
+        db = make_session()
+
+        assert rules_module._count_prefiltered([], db) == {}
+        assert db.info["statements"] == []
@@ -0,0 +1,79 @@
+"""
+Tests for TelegramClientPool idle eviction.
+"""
+import asyncio
+
+import pytest
+
+from app.services.telegram_service import TelegramClientPool, _PooledClient
+
+
+class FakeClient:
+    def __init__(self):
+        self.disconnected = False
+
+    async def disconnect(self):
+        self.disconnected = True
+
+
+def add_entry(pool, account_key, idle_for=0.0, pinned=False):
+    entry = _PooledClient(b"session", max_concurrent_requests=1)
+    entry.client = FakeClient()
+    entry.pinned = pinned
+    entry.last_used_at -= idle_for
+    pool._entries[account_key] = entry
+    return entry
+
+
+@pytest.fixture
+def pool():
+    return TelegramClientPool(api_id=1, api_hash="hash", idle_timeout=10, eviction_interval=0.01)
+
+
+class TestIdleEviction:
+    """Idle clients are disconnected without any acquire() calls."""
+
+    @pytest.mark.asyncio
+    async def test_background_eviction(self, pool):
+        idle = add_entry(pool, "idle", idle_for=60)
+        busy = add_entry(pool, "busy", idle_for=60)
+        busy.in_use = 1
+        pinned = add_entry(pool, "pinned", idle_for=60, pinned=True)
+        recent = add_entry(pool, "recent")
+        idle_client = idle.client
+
+        pool.start()
+        await asyncio.sleep(0.05)
+
+        assert set(pool._entries) == {"busy", "pinned", "recent"}
+        assert idle_client.disconnected
+        assert not busy.client.disconnected
+        assert not pinned.client.disconnected
+        assert not recent.client.disconnected
+
+        await pool.close_all()
+
+    @pytest.mark.asyncio
+    async def test_close_all_stops_eviction(self, pool):
+        pool.start()
+        task = pool._eviction_task
+        entry = add_entry(pool, "account")
+        client = entry.client
+
+        await pool.close_all()
+        await asyncio.sleep(0)
+
+        assert task.cancelled()
+        assert pool._eviction_task is None
+        assert pool._entries == {}
+        assert client.disconnected
+
+    @pytest.mark.asyncio
+    async def test_start_is_idempotent(self, pool):
+        pool.start()
+        task = pool._eviction_task
+
+        pool.start()
+
+        assert pool._eviction_task is task
+        await pool.close_all()